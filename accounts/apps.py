@@ -4,3 +4,10 @@ from django.apps import AppConfig
 class AuthConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'accounts'
+
+    def ready(self):
+        from backend.derivatives import track_image_field
+        from .models import Profile
+
+        track_image_field(Profile, 'image')
+        from . import signals  # noqa: F401
@@ -0,0 +1,59 @@
+from django.contrib.auth.models import User
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
+from rest_framework_simplejwt.settings import api_settings
+
+from .models import TokenPrincipal
+from .tokens import AccessToken, USERNAME_CLAIM, ROLE_CLAIM, PROFILE_ID_CLAIM
+
+
+class ClaimsJWTAuthentication(JWTAuthentication):
+    """
+    Authenticates the Bearer token (set from the ``access_token`` cookie by
+    ``CookieToAuthorizationMiddleware``) and builds ``request.user`` from its
+    claims instead of loading the User and Profile rows.
+    """
+
+    def get_user(self, validated_token):
+        if ROLE_CLAIM not in validated_token:
+            # Tokens issued before role claims existed: fall back to the DB
+            return super().get_user(validated_token)
+
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError as e:
+            raise InvalidToken("Token contained no recognizable user identification") from e
+
+        return principal_from_token(validated_token, user_id)
+
+
+def principal_from_token(validated_token, user_id):
+    # simplejwt serializes the id claim as a string; keep pk comparisons working
+    user_id = User._meta.pk.to_python(user_id)
+    principal = TokenPrincipal(id=user_id, username=validated_token.get(USERNAME_CLAIM, ''))
+    # Behave like a row loaded from the DB (FK assignment, equality, filters)
+    principal._state.adding = False
+    principal._state.db = User.objects.db
+    principal.role = validated_token[ROLE_CLAIM]
+    principal.profile_id = validated_token.get(PROFILE_ID_CLAIM)
+    return principal
+
+
+def principal_from_access_token(raw_token):
+    """
+    The claims principal for a raw access token, or None if it is invalid,
+    expired or revoked. Never queries the database: tokens issued before
+    role claims existed are refused rather than looked up. The principal
+    keeps the token's ``exp``, ``jti`` and ``iat`` so long-lived sockets can recheck it.
+    """
+    try:
+        validated_token = AccessToken(raw_token)
+    except TokenError:
+        return None
+    if ROLE_CLAIM not in validated_token or api_settings.USER_ID_CLAIM not in validated_token:
+        return None
+    principal = principal_from_token(validated_token, validated_token[api_settings.USER_ID_CLAIM])
+    principal.token_exp = validated_token['exp']
+    principal.token_jti = validated_token[api_settings.JTI_CLAIM]
+    principal.token_iat = validated_token.get('iat')
+    return principal
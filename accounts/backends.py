@@ -0,0 +1,33 @@
+from django.contrib.auth.backends import ModelBackend
+from django.contrib.auth.models import User
+
+
+class EmailBackend(ModelBackend):
+    """
+    Authenticates with email + password in a single query. The user and their
+    profile come back together (``select_related``) and the case-insensitive
+    lookup is served by the ``UPPER(email)`` index on ``auth_user``.
+    """
+
+    def get_users_by_email(self, email):
+        # Two rows are enough to tell "unique" from "ambiguous"
+        return list(
+            User._default_manager
+            .select_related('profile')
+            .filter(email__iexact=email)[:2]
+        )
+
+    def authenticate(self, request, email=None, password=None, **kwargs):
+        if email is None or password is None:
+            return None
+
+        users = self.get_users_by_email(email)
+        if len(users) != 1:
+            # Run the hasher anyway so unknown emails take as long as wrong passwords
+            User().set_password(password)
+            return None
+
+        user = users[0]
+        if user.check_password(password) and self.user_can_authenticate(user):
+            return user
+        return None
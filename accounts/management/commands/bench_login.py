@@ -0,0 +1,90 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+
+from accounts.models import Profile
+from backend.benchmarks import isolated_database, percentile, format_ms
+
+PASSWORD = 'bench-Passw0rd!'
+
+
+class Command(BaseCommand):
+    help = "Measure queries per email login and login latency under concurrency (uses a throwaway test DB)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=200)
+        parser.add_argument('--logins', type=int, default=400)
+        parser.add_argument('--concurrency', type=int, default=16)
+        parser.add_argument(
+            '--fast-hasher', action='store_true',
+            help="Use MD5 password hashing so the numbers show query overhead rather than PBKDF2 cost.",
+        )
+
+    def handle(self, *args, **options):
+        hashers = ['django.contrib.auth.hashers.MD5PasswordHasher'] if options['fast_hasher'] else None
+        # Every bench login comes from one IP; measure the view, not the rate limit
+        with isolated_database(), override_settings(THROTTLE_RATES={**settings.THROTTLE_RATES, 'login': None}):
+            if hashers:
+                with override_settings(PASSWORD_HASHERS=hashers):
+                    self.run(options)
+            else:
+                self.run(options)
+
+    def run(self, options):
+        self.seed(options['users'])
+        emails = [f'resident{i}@bench.local' for i in range(options['users'])]
+
+        # Queries per login (single connection so every query is captured)
+        client = Client(HTTP_HOST='localhost')
+        with CaptureQueriesContext(connection) as ctx:
+            self.login(client, emails[0])
+        self.stdout.write(f"queries per login: {len(ctx.captured_queries)}")
+        for query in ctx.captured_queries:
+            self.stdout.write(f"  {query['sql'][:120]}")
+
+        def worker(i):
+            c = Client(HTTP_HOST='localhost')
+            started = time.perf_counter()
+            self.login(c, emails[i % len(emails)])
+            connection.close()
+            return time.perf_counter() - started
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options['concurrency']) as pool:
+            latencies = list(pool.map(worker, range(options['logins'])))
+        elapsed = time.perf_counter() - started
+
+        self.stdout.write(
+            f"{options['logins']} logins, concurrency {options['concurrency']}: "
+            f"{options['logins'] / elapsed:.1f} logins/s, "
+            f"p50 {format_ms(percentile(latencies, 50))}, "
+            f"p99 {format_ms(percentile(latencies, 99))}"
+        )
+
+    def seed(self, count):
+        hashed = make_password(PASSWORD)  # hash once, seeding is not what we measure
+        User.objects.bulk_create(
+            User(username=f'resident{i}', email=f'resident{i}@bench.local', password=hashed)
+            for i in range(count)
+        )
+        Profile.objects.bulk_create(
+            Profile(
+                user=user, name=user.username, contact_number='09170000000', houseNum=i,
+                address='Sindalan', civil_status='single', birthdate='1990-01-01', role='resident',
+            )
+            for i, user in enumerate(User.objects.filter(email__endswith='@bench.local'))
+        )
+
+    def login(self, client, email):
+        response = client.post(
+            '/api/token/', {'email': email, 'password': PASSWORD}, content_type='application/json',
+        )
+        if response.status_code != 200:
+            raise RuntimeError(f"login failed for {email}: {response.status_code} {response.content[:200]}")
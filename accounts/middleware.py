@@ -1,6 +1,11 @@
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import AnonymousUser
+from django.http.cookie import parse_cookie
 from django.utils.deprecation import MiddlewareMixin
 import logging
 
+from .authentication import principal_from_access_token
+
 logger = logging.getLogger(__name__)
 
 class CookieToAuthorizationMiddleware(MiddlewareMixin):
@@ -13,3 +18,25 @@ class CookieToAuthorizationMiddleware(MiddlewareMixin):
             logger.debug("Authorization header set from cookie")
         else:
             logger.debug("No access token cookie or Authorization header already set")
+
+
+class CookieJWTAuthMiddleware:
+    """
+    Channels counterpart of ``CookieToAuthorizationMiddleware``: sets
+    ``scope["user"]`` from the ``access_token`` cookie, built from the token
+    claims without a DB query. No cookie, or a bad one, gives AnonymousUser.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        cookies = {}
+        for name, value in scope.get("headers", []):
+            if name == b"cookie":
+                cookies.update(parse_cookie(value.decode("latin1")))
+        user = None
+        if cookies.get("access_token"):
+            # Not thread-sensitive: the revocation check may wait on Redis, never on the ORM
+            user = await sync_to_async(principal_from_access_token, thread_sensitive=False)(cookies["access_token"])
+        return await self.app(dict(scope, user=user or AnonymousUser()), receive, send)
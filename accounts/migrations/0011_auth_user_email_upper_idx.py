@@ -0,0 +1,20 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    """
+    Case-insensitive index for the email login lookup (``email__iexact``
+    compiles to ``UPPER(email) = UPPER(%s)`` on PostgreSQL).
+    """
+
+    dependencies = [
+        ('accounts', '0010_tokenprincipal'),
+        ('auth', '0012_alter_user_first_name_max_length'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            sql='CREATE INDEX IF NOT EXISTS auth_user_email_upper_idx ON auth_user (UPPER(email));',
+            reverse_sql='DROP INDEX IF EXISTS auth_user_email_upper_idx;',
+        ),
+    ]
@@ -0,0 +1,16 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0011_auth_user_email_upper_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='profile',
+            name='image_derivatives',
+            field=models.BooleanField(default=False, editable=False),
+        ),
+    ]
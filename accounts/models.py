@@ -1,6 +1,8 @@
-from datetime import timezone
 from django.contrib.auth.models import User
 from django.db import models
+from django.db.models import Case, ExpressionWrapper, IntegerField, Q, Value, When
+from django.db.models.functions import ExtractYear
+from django.utils import timezone
 from emergency.storages import SupabaseStorage
 
 supabase_storage = SupabaseStorage()
@@ -21,6 +23,8 @@ class Profile(models.Model):
     civil_status = models.CharField(max_length=100)
     birthdate = models.DateField()
     image = models.ImageField(storage=supabase_storage,upload_to='profile_pics/', blank=True, null=True)
+    # Set once image's thumbnails are stored (see backend.derivatives)
+    image_derivatives = models.BooleanField(default=False, editable=False)
     email = models.EmailField(max_length=254, blank=True, null=True)
     role = models.CharField(max_length=20, choices=ROLE_CHOICES)
 
@@ -35,3 +39,40 @@ class Profile(models.Model):
         return today.year - self.birthdate.year - (
             (today.month, today.day) < (self.birthdate.month, self.birthdate.day)
         )
+
+
+def age_expression(birthdate_field, today=None):
+    """
+    Whole years between ``birthdate_field`` (a lookup path such as
+    ``'user__profile__birthdate'``) and today, computed in the database with
+    the same rule as ``Profile.age``. NULL when there is no birthdate.
+    """
+    today = today or timezone.localdate()
+    had_birthday = (
+        Q(**{f'{birthdate_field}__month__lt': today.month})
+        | Q(**{f'{birthdate_field}__month': today.month, f'{birthdate_field}__day__lte': today.day})
+    )
+    return ExpressionWrapper(
+        Value(today.year)
+        - ExtractYear(birthdate_field)
+        - Case(When(had_birthday, then=Value(0)), default=Value(1)),
+        output_field=IntegerField(),
+    )
+
+
+class TokenPrincipal(User):
+    """
+    Request-scoped user built from access-token claims by
+    ``accounts.authentication.ClaimsJWTAuthentication``. Only ``id``,
+    ``username``, ``role`` and ``profile_id`` are populated, so it must never
+    be written back to the database.
+    """
+
+    class Meta:
+        proxy = True
+
+    def save(self, *args, **kwargs):
+        raise TypeError("TokenPrincipal is built from token claims and cannot be saved.")
+
+    def delete(self, *args, **kwargs):
+        raise TypeError("TokenPrincipal is built from token claims and cannot be deleted.")
@@ -0,0 +1,29 @@
+from rest_framework.permissions import BasePermission
+
+from .models import TokenPrincipal
+
+ADMIN_ROLES = ('admin', 'staff')
+
+
+def get_role(user):
+    """
+    Role of ``user``. Token-authenticated requests read it from the JWT claims;
+    session users (e.g. Django admin) fall back to the Profile row.
+    """
+    if user is None or not user.is_authenticated:
+        return None
+    if isinstance(user, TokenPrincipal):
+        return user.role
+    profile = getattr(user, 'profile', None)
+    return profile.role if profile else None
+
+
+def is_admin_or_staff(user):
+    return get_role(user) in ADMIN_ROLES
+
+
+class IsAdminOrStaff(BasePermission):
+    message = "Forbidden: Only admin or staff can access this endpoint."
+
+    def has_permission(self, request, view):
+        return is_admin_or_staff(request.user)
@@ -0,0 +1,149 @@
+"""
+Token revocation list keyed by ``jti``, plus per-user cutoffs: every token a
+user was issued up to the cutoff is revoked (see ``revoke_user``).
+
+Entries only need to live until the token would have expired anyway, so both
+stores evict by the token's ``exp``. Membership checks are O(1): dict lookups
+for the local store, a local positive cache plus one pipelined round trip for
+Redis.
+"""
+import heapq
+import logging
+import threading
+import time
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+USER_KEY_PREFIX = 'user:'
+
+
+def user_key(user_id):
+    return f'{USER_KEY_PREFIX}{user_id}'
+
+
+class LocalRevocationStore:
+    """Per-process store. Used in tests and when no Redis is configured."""
+
+    def __init__(self):
+        self._revoked = {}  # jti -> exp (epoch seconds)
+        self._user_cutoffs = {}  # user id -> (cutoff, until)
+        self._expiry_heap = []  # (exp, jti or user key), earliest expiry first
+        self._lock = threading.Lock()
+
+    def revoke(self, jti, exp):
+        now = time.time()
+        if exp <= now:
+            return
+        with self._lock:
+            if jti not in self._revoked:
+                heapq.heappush(self._expiry_heap, (exp, jti))
+            self._revoked[jti] = exp
+            self._evict(now)
+
+    def revoke_user(self, user_id, until, cutoff=None):
+        """Revoke ``user_id``'s tokens issued up to ``cutoff`` (now); kept until ``until``."""
+        now = time.time()
+        if until <= now:
+            return
+        with self._lock:
+            heapq.heappush(self._expiry_heap, (until, user_key(user_id)))
+            self._user_cutoffs[str(user_id)] = (now if cutoff is None else cutoff, until)
+            self._evict(now)
+
+    def is_revoked(self, jti, user_id=None, issued_at=None):
+        now = time.time()
+        exp = self._revoked.get(jti)
+        if exp is not None and exp > now:
+            return True
+        if user_id is None:
+            return False
+        cutoff, until = self._user_cutoffs.get(str(user_id), (0, 0))
+        return until > now and (issued_at or 0) <= cutoff
+
+    def _evict(self, now):
+        while self._expiry_heap and self._expiry_heap[0][0] <= now:
+            _, key = heapq.heappop(self._expiry_heap)
+            if key.startswith(USER_KEY_PREFIX):
+                user_id = key[len(USER_KEY_PREFIX):]
+                if self._user_cutoffs.get(user_id, (None, now + 1))[1] <= now:
+                    del self._user_cutoffs[user_id]
+            else:
+                self._revoked.pop(key, None)
+
+    def __len__(self):
+        return len(self._revoked)
+
+
+class RedisRevocationStore:
+    """
+    Shared store on the ``REDIS_URL`` used by the channel layer. Keys expire
+    with the token; revoked jtis seen by this process are cached locally so
+    replays of a revoked token never reach Redis.
+    """
+
+    key_prefix = 'revoked-jti:'
+    user_key_prefix = 'revoked-user:'
+
+    def __init__(self, url=None):
+        import redis
+
+        self._redis_error = redis.RedisError
+        self._client = redis.Redis.from_url(url or settings.REDIS_URL, socket_timeout=0.5)
+        self._local = LocalRevocationStore()
+
+    def revoke(self, jti, exp):
+        ttl = int(exp - time.time())
+        if ttl <= 0:
+            return
+        self._local.revoke(jti, exp)
+        try:
+            self._client.set(self.key_prefix + jti, 1, ex=ttl)
+        except self._redis_error:
+            logger.exception("Could not store revoked token %s in Redis", jti)
+
+    def revoke_user(self, user_id, until):
+        now = time.time()
+        ttl = int(until - now)
+        if ttl <= 0:
+            return
+        self._local.revoke_user(user_id, until, now)
+        try:
+            self._client.set(self.user_key_prefix + str(user_id), now, ex=ttl)
+        except self._redis_error:
+            logger.exception("Could not store the token cutoff of user %s in Redis", user_id)
+
+    def is_revoked(self, jti, user_id=None, issued_at=None):
+        if self._local.is_revoked(jti, user_id, issued_at):
+            return True
+        try:
+            with self._client.pipeline(transaction=False) as pipe:
+                pipe.pttl(self.key_prefix + jti)
+                if user_id is not None:
+                    pipe.get(self.user_key_prefix + str(user_id))
+                ttl_ms, *cutoff = pipe.execute()
+        except self._redis_error:
+            # Fail open: an unreachable Redis should not log every user out
+            logger.warning("Revocation check skipped, Redis unavailable")
+            return False
+        if ttl_ms > 0:
+            self._local.revoke(jti, time.time() + ttl_ms / 1000)
+            return True
+        # Cutoff hits aren't cached: only deactivated users have one, and they can't refresh
+        return bool(cutoff and cutoff[0] is not None and float(cutoff[0]) >= (issued_at or 0))
+
+
+@lru_cache(maxsize=None)
+def get_revocation_store():
+    return import_string(settings.TOKEN_REVOCATION_STORE)()
+
+
+@receiver(setting_changed)
+def _reset_store(setting, **kwargs):
+    if setting == 'TOKEN_REVOCATION_STORE':
+        get_revocation_store.cache_clear()
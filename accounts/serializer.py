@@ -3,7 +3,12 @@ from django.contrib.auth.models import User
 from .models import Profile
 from django.contrib.auth.password_validation import validate_password
 from django.contrib.auth import authenticate
-from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.serializers import TokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings
+from .tokens import RefreshToken
+from .backends import EmailBackend
+from backend.derivatives import thumbnail_url, srcset
 from datetime import date
 import logging
 
@@ -40,6 +45,12 @@ class RegisterSerializer(serializers.ModelSerializer):
             'image',
         )
 
+    def validate_email(self, value):
+        # Email is the login identifier, so keep it unique (case-insensitive)
+        if value and User.objects.filter(email__iexact=value).exists():
+            raise serializers.ValidationError("An account with this email already exists.")
+        return value
+
     def validate(self, attrs):
         if attrs['password'] != attrs['confirm_password']:
             raise serializers.ValidationError({"confirm_password": "Password fields didn't match."})
@@ -82,6 +93,8 @@ class RegisterSerializer(serializers.ModelSerializer):
 # --------------------------
 class ProfileSerializer(serializers.ModelSerializer):
     image = serializers.FileField(required=False, allow_null=True)  # Updated
+    image_thumb = serializers.SerializerMethodField()
+    image_srcset = serializers.SerializerMethodField()
 
     class Meta:
         model = Profile
@@ -94,8 +107,16 @@ class ProfileSerializer(serializers.ModelSerializer):
             'birthdate',
             'role',
             'image',
+            'image_thumb',
+            'image_srcset',
         ]
 
+    def get_image_thumb(self, obj):
+        return thumbnail_url(obj.image)
+
+    def get_image_srcset(self, obj):
+        return srcset(obj.image)
+
 # --------------------------
 # User Serializer
 # --------------------------
@@ -106,6 +127,14 @@ class UserSerializer(serializers.ModelSerializer):
         model = User
         fields = ['id', 'username', 'email', 'profile']
 
+    def __init__(self, *args, **kwargs):
+        # Optional projection, e.g. UserSerializer(users, fields=['id', 'username'])
+        fields = kwargs.pop('fields', None)
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
     def to_internal_value(self, data):
         # Handle flat dotted keys (e.g., "profile.name") and convert to nested
         nested_data = {}
@@ -167,22 +196,20 @@ class CustomTokenObtainPairSerializer(serializers.Serializer):
         email = attrs.get("email")
         password = attrs.get("password")
 
-        users = User.objects.filter(email=email)
-
-        if not users.exists():
-            raise serializers.ValidationError({"email": "No user found with this email."})
-
-        if users.count() > 1:
-            raise serializers.ValidationError(
-                {"email": "Multiple accounts use this email. Please use username instead."}
-            )
-
-        user = users.first()
-        user = authenticate(username=user.username, password=password)
+        # One query on success: EmailBackend loads user + profile together
+        user = authenticate(self.context.get("request"), email=email, password=password)
         if not user:
+            # Failure path only: work out which message to show
+            users = EmailBackend().get_users_by_email(email)
+            if not users:
+                raise serializers.ValidationError({"email": "No user found with this email."})
+            if len(users) > 1:
+                raise serializers.ValidationError(
+                    {"email": "Multiple accounts use this email. Please use username instead."}
+                )
             raise serializers.ValidationError({"password": "Incorrect password."})
 
-        refresh = TokenObtainPairSerializer.get_token(user)
+        refresh = RefreshToken.for_user(user)
         profile = getattr(user, "profile", None)
 
         return {
@@ -201,6 +228,34 @@ class CustomTokenObtainPairSerializer(serializers.Serializer):
                     "birthdate": profile.birthdate if profile else None,
                     "role": profile.role if profile else None,
                     "image": profile.image.name if profile and profile.image else None,
+                    "image_thumb": thumbnail_url(profile.image) if profile else None,
                 } if profile else None,
             },
         }
+
+
+# --------------------------
+# Token Refresh Serializer
+# --------------------------
+class CustomTokenRefreshSerializer(TokenRefreshSerializer):
+    # Rejects revoked refresh tokens and revokes the old one on rotation
+    token_class = RefreshToken
+
+    def validate(self, attrs):
+        refresh = self.token_class(attrs["refresh"])
+
+        # One query: the role and profile may have changed since the token was signed
+        user = User.objects.select_related("profile").filter(pk=refresh.get(api_settings.USER_ID_CLAIM)).first()
+        if user is None or not api_settings.USER_AUTHENTICATION_RULE(user):
+            raise AuthenticationFailed(self.error_messages["no_active_account"], "no_active_account")
+        refresh.set_user_claims(user)
+
+        data = {"access": str(refresh.access_token)}
+        if api_settings.ROTATE_REFRESH_TOKENS:
+            if api_settings.BLACKLIST_AFTER_ROTATION:
+                refresh.blacklist()
+            refresh.set_jti()
+            refresh.set_exp()
+            refresh.set_iat()
+            data["refresh"] = str(refresh)
+        return data
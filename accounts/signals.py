@@ -0,0 +1,13 @@
+from django.contrib.auth.models import User
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from .tokens import revoke_user_tokens
+
+
+@receiver(post_save, sender=User)
+def revoke_tokens_of_inactive_user(sender, instance, **kwargs):
+    # Access tokens are trusted from their claims, so a deactivated account would
+    # otherwise keep working until they expire. QuerySet.update() skips this.
+    if not instance.is_active:
+        revoke_user_tokens(instance.pk)
@@ -0,0 +1,300 @@
+import time
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient, APIRequestFactory
+
+from backend.testing import api_client_for, make_blotter, make_complaint, make_user
+from backend.throttling import get_bucket_store
+from blotter.models import BlotterReport
+from .authentication import ClaimsJWTAuthentication, principal_from_access_token
+from .models import Profile, TokenPrincipal
+from .revocation import LocalRevocationStore, get_revocation_store
+from .serializer import CustomTokenObtainPairSerializer, CustomTokenRefreshSerializer
+from .tokens import ROLE_CLAIM, AccessToken, RefreshToken
+from .views import TokenRefreshView
+
+
+class EmailLoginTests(TestCase):
+    def setUp(self):
+        get_bucket_store.cache_clear()
+        self.user = make_user("resident")  # resident@example.com, password "x"
+
+    def login(self, email, password="x"):
+        return APIClient(HTTP_HOST="localhost").post("/api/token/", {"email": email, "password": password}, format="json")
+
+    def test_email_casing_does_not_matter(self):
+        response = self.login("Resident@EXAMPLE.com")
+
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(response.data["user"]["id"], self.user.pk)
+        self.assertEqual(response.data["user"]["profile"]["role"], "resident")
+
+    def test_success_is_one_query(self):
+        serializer = CustomTokenObtainPairSerializer(data={"email": "resident@example.com", "password": "x"})
+
+        with self.assertNumQueries(1):  # the user joined with the profile
+            self.assertTrue(serializer.is_valid())
+
+    def test_failure_messages(self):
+        self.assertEqual(self.login("nobody@example.com").data, {"email": ["No user found with this email."]})
+        self.assertEqual(self.login("resident@example.com", "wrong").data, {"password": ["Incorrect password."]})
+
+        User.objects.create_user(username="twin", email="RESIDENT@example.com", password="x")
+        response = self.login("resident@example.com")
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data, {"email": ["Multiple accounts use this email. Please use username instead."]})
+
+    def test_registration_rejects_an_email_differing_only_in_case(self):
+        response = APIClient(HTTP_HOST="localhost").post("/api/register/", {
+            "name": "Juan", "username": "juan", "email": "RESIDENT@Example.com", "password": "Sindalan-2025!",
+            "confirm_password": "Sindalan-2025!", "contact_number": "09170000000", "address": "Sindalan",
+            "civil_status": "single", "birthdate": "1990-01-01",
+        }, format="json")
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data, {"email": ["An account with this email already exists."]})
+        self.assertFalse(User.objects.filter(username="juan").exists())
+
+
+class ClaimsAuthenticationTests(TestCase):
+    def setUp(self):
+        self.resident = make_user("resident")
+        self.other = make_user("other")
+        self.staff = make_user("staff", role="staff")
+
+    def authenticate(self, token):
+        request = APIRequestFactory().get("/", HTTP_AUTHORIZATION=f"Bearer {token}")
+        return ClaimsJWTAuthentication().authenticate(request)
+
+    def test_principal_comes_from_claims_without_queries(self):
+        token = RefreshToken.for_user(self.resident).access_token
+
+        with self.assertNumQueries(0):
+            principal, _ = self.authenticate(token)
+
+        self.assertIsInstance(principal, TokenPrincipal)
+        # simplejwt puts user_id in the token as a string; the principal's pk is the model's type
+        self.assertEqual(principal.pk, self.resident.pk)
+        self.assertEqual(principal, self.resident)
+        self.assertEqual((principal.username, principal.role), ("resident", "resident"))
+        self.assertEqual(principal.profile_id, self.resident.profile.id)
+
+    def test_tokens_without_role_claim_load_the_user(self):
+        token = RefreshToken.for_user(self.resident).access_token
+        del token[ROLE_CLAIM]
+
+        with self.assertNumQueries(1):
+            user, _ = self.authenticate(token)
+
+        self.assertNotIsInstance(user, TokenPrincipal)
+        self.assertEqual(user.pk, self.resident.pk)
+
+    def test_complaint_owner_check(self):
+        complaint = make_complaint(self.resident)
+        url = f"/api/complaints/{complaint.id}/"
+
+        with self.assertNumQueries(1):  # the complaint; none for the requester or the owner
+            response = api_client_for(self.resident).get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(api_client_for(self.other).get(url).status_code, 403)
+
+    def test_blotter_owner_check(self):
+        report = make_blotter(self.resident)
+        url = f"/api/blotters/{report.report_number}/"
+
+        response = api_client_for(self.resident).patch(url, {"status": "resolved"}, format="json")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(api_client_for(self.staff).patch(url, {"status": "pending"}, format="json").status_code, 200)
+        self.assertEqual(api_client_for(self.other).patch(url, {"status": "closed"}, format="json").status_code, 404)
+
+    def test_blotter_created_by_principal_is_owned_by_the_user(self):
+        client = api_client_for(self.resident)
+        response = client.post("/api/blotters/", {
+            "complainant_name": "Juan", "incident_type": "Theft/Burglary", "incident_date": "2025-01-01",
+            "incident_time": "12:00", "location": "Sindalan", "agree_terms": True,
+        }, format="json")
+
+        self.assertEqual(response.status_code, 201, response.content)
+        report = BlotterReport.objects.get()
+        self.assertEqual(report.filed_by_id, self.resident.pk)
+        self.assertEqual(client.get(f"/api/blotters/{report.report_number}/").status_code, 200)
+
+    def test_anonymous_is_refused(self):
+        complaint = make_complaint(self.resident)
+        self.assertEqual(APIClient().get(f"/api/complaints/{complaint.id}/").status_code, 401)
+
+
+class TokenClaimsFreshnessTests(TestCase):
+    def setUp(self):
+        get_revocation_store.cache_clear()
+        self.user = make_user("staff", role="staff")
+        self.refresh = RefreshToken.for_user(self.user)
+
+    def refresh_tokens(self):
+        return APIClient().post("/api/token/refresh/", {"refresh": str(self.refresh)}, format="json")
+
+    def test_refresh_reads_the_current_role(self):
+        Profile.objects.filter(user=self.user).update(role="resident")
+
+        serializer = CustomTokenRefreshSerializer(data={"refresh": str(self.refresh)})
+        with self.assertNumQueries(1):
+            serializer.is_valid(raise_exception=True)
+
+        access = AccessToken(serializer.validated_data["access"])
+        self.assertEqual(access[ROLE_CLAIM], "resident")
+        self.assertEqual(RefreshToken(serializer.validated_data["refresh"])[ROLE_CLAIM], "resident")
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f"Bearer {access}")
+        self.assertEqual(client.get("/api/users/").status_code, 403)
+
+    def test_deactivated_user_loses_access_at_once(self):
+        client = api_client_for(self.user)
+        self.assertEqual(client.get("/api/users/").status_code, 200)
+
+        self.user.is_active = False
+        self.user.save()
+
+        self.assertEqual(client.get("/api/users/").status_code, 401)
+        self.assertEqual(self.refresh_tokens().status_code, 401)
+        self.assertIsNone(principal_from_access_token(str(self.refresh.access_token)))
+
+    def test_deleted_user_cannot_refresh(self):
+        self.user.delete()
+
+        self.assertEqual(self.refresh_tokens().status_code, 401)
+
+    def test_user_cutoffs_expire(self):
+        store = LocalRevocationStore()
+        now = time.time()
+        store.revoke_user(7, now + 10)
+
+        self.assertTrue(store.is_revoked("jti", 7, int(now)))
+        self.assertTrue(store.is_revoked("jti", "7", int(now) - 60))
+        self.assertFalse(store.is_revoked("jti", 7, now + 1))
+        self.assertFalse(store.is_revoked("jti", 8, int(now)))
+        with mock.patch("accounts.revocation.time.time", return_value=now + 11):
+            self.assertFalse(store.is_revoked("jti", 7, int(now)))
+            store.revoke("later", now + 30)  # evicts whatever has expired
+        self.assertEqual(store._user_cutoffs, {})
+
+
+class TokenRevocationTests(TestCase):
+    def setUp(self):
+        get_revocation_store.cache_clear()
+        self.user = make_user("resident")
+        self.refresh = RefreshToken.for_user(self.user)
+
+    def test_logged_out_access_token_is_rejected(self):
+        access = str(self.refresh.access_token)
+        client = APIClient(HTTP_HOST="localhost")
+        client.credentials(HTTP_AUTHORIZATION=f"Bearer {access}")
+        client.cookies["refresh_token"] = str(self.refresh)
+        self.assertEqual(client.get("/api/auth/user/").status_code, 200)
+
+        self.assertEqual(client.post("/api/logout/").status_code, 205)
+
+        self.assertEqual(client.get("/api/auth/user/").status_code, 401)
+        refreshed = APIClient().post("/api/token/refresh/", {"refresh": str(self.refresh)}, format="json")
+        self.assertEqual(refreshed.status_code, 401)
+
+    def test_rotated_refresh_token_cannot_be_reused(self):
+        client = APIClient()
+
+        first = client.post("/api/token/refresh/", {"refresh": str(self.refresh)}, format="json")
+        self.assertEqual(first.status_code, 200)
+        self.assertNotEqual(first.data["refresh"], str(self.refresh))
+
+        self.assertEqual(client.post("/api/token/refresh/", {"refresh": str(self.refresh)}, format="json").status_code, 401)
+        rotated = client.post("/api/token/refresh/", {"refresh": first.data["refresh"]}, format="json")
+        self.assertEqual(rotated.status_code, 200)
+
+    def test_cookie_refresh_view_rotates_too(self):
+        def refresh_with(token):
+            request = APIRequestFactory().post("/api/token/refresh/")
+            request.COOKIES["refresh_token"] = token
+            return TokenRefreshView.as_view()(request)
+
+        response = refresh_with(str(self.refresh))
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response.cookies["refresh_token"].value, str(self.refresh))
+        self.assertEqual(refresh_with(str(self.refresh)).status_code, 401)
+
+    def test_local_store_entries_expire_with_the_token(self):
+        store = LocalRevocationStore()
+        now = time.time()
+        store.revoke("short", now + 10)
+        store.revoke("long", now + 20)
+        store.revoke("already-expired", now - 1)
+        self.assertEqual(len(store), 2)
+
+        with mock.patch("accounts.revocation.time.time", return_value=now + 15):
+            self.assertFalse(store.is_revoked("short"))
+            self.assertTrue(store.is_revoked("long"))
+            store.revoke("later", now + 30)  # evicts whatever has expired
+            self.assertEqual(len(store), 2)
+            self.assertFalse(store.is_revoked("already-expired"))
+        with mock.patch("accounts.revocation.time.time", return_value=now + 20):
+            self.assertFalse(store.is_revoked("long"))
+
+
+class UserDirectoryTests(TestCase):
+    url = "/api/users/"
+
+    def setUp(self):
+        self.staff = make_user("staff", role="staff")
+        self.client = api_client_for(self.staff)
+        for i, (role, civil_status, house) in enumerate([
+            ("resident", "single", 1), ("resident", "Married", 2), ("admin", "married", 2),
+            ("resident", "widowed", 3), ("user", "single", 4),
+        ]):
+            user = make_user(f"user{i}", role=role)
+            Profile.objects.filter(user=user).update(civil_status=civil_status, houseNum=house)
+
+    def usernames(self, response):
+        self.assertEqual(response.status_code, 200, response.content)
+        return [user["username"] for user in response.data["results"]]
+
+    def test_cursor_pages_cover_everyone_once(self):
+        seen, url = [], f"{self.url}?page_size=2"
+        while url:
+            response = self.client.get(url)
+            seen += self.usernames(response)
+            url = response.data["next"]
+
+        self.assertEqual(seen, list(User.objects.order_by("id").values_list("username", flat=True)))
+        self.assertIsNotNone(response.data["previous"])
+
+    def test_filters(self):
+        self.assertEqual(self.usernames(self.client.get(self.url, {"role": "resident"})), ["user0", "user1", "user3"])
+        self.assertEqual(self.usernames(self.client.get(self.url, {"civil_status": "MARRIED"})), ["user1", "user2"])
+        self.assertEqual(self.usernames(self.client.get(self.url, {"houseNum": "2", "role": "admin"})), ["user2"])
+
+        response = self.client.get(self.url, {"houseNum": "two"})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("houseNum", response.data)
+
+    def test_fields_projection_skips_the_profile(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url, {"fields": "id,username"})
+
+        self.assertEqual(set(response.data["results"][0]), {"id", "username"})
+        self.assertEqual(len(queries), 1)
+        self.assertNotIn("accounts_profile", queries[0]["sql"])
+
+    def test_query_count_does_not_grow_with_the_page(self):
+        with self.assertNumQueries(1):  # users joined with profiles; none for the requester
+            small = self.client.get(self.url, {"page_size": 2})
+        with self.assertNumQueries(1):
+            full = self.client.get(self.url, {"page_size": 50})
+
+        self.assertEqual(len(small.data["results"]), 2)
+        self.assertEqual(len(full.data["results"]), 6)
+        self.assertEqual(full.data["results"][1]["profile"]["civil_status"], "single")
+
+    def test_staff_only(self):
+        response = api_client_for(User.objects.get(username="user0")).get(self.url)
+        self.assertEqual(response.status_code, 403)
@@ -0,0 +1,66 @@
+import time
+
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import (
+    AccessToken as BaseAccessToken,
+    RefreshToken as BaseRefreshToken,
+)
+
+from .revocation import get_revocation_store
+
+# Claims copied into every access token minted from a refresh token
+USERNAME_CLAIM = 'username'
+ROLE_CLAIM = 'role'
+PROFILE_ID_CLAIM = 'profile_id'
+
+
+class RevocableTokenMixin:
+    """
+    Checks the token's ``jti`` (and its user's cutoff, see
+    ``revoke_user_tokens``) against the revocation store on every
+    verification, and implements simplejwt's ``blacklist()`` on top of it so
+    refresh rotation and logout actually invalidate tokens.
+    """
+
+    def verify(self):
+        super().verify()
+        if get_revocation_store().is_revoked(
+            self[api_settings.JTI_CLAIM], self.get(api_settings.USER_ID_CLAIM), self.get('iat'),
+        ):
+            raise TokenError("Token is blacklisted")
+
+    def blacklist(self):
+        get_revocation_store().revoke(self[api_settings.JTI_CLAIM], self['exp'])
+
+
+class AccessToken(RevocableTokenMixin, BaseAccessToken):
+    pass
+
+
+class RefreshToken(RevocableTokenMixin, BaseRefreshToken):
+    """
+    Refresh token that signs the user's role and profile id into its claims.
+    Access tokens inherit them, so role checks need no Profile query.
+    """
+
+    access_token_class = AccessToken
+
+    @classmethod
+    def for_user(cls, user):
+        token = super().for_user(user)
+        token.set_user_claims(user)
+        return token
+
+    def set_user_claims(self, user):
+        profile = getattr(user, 'profile', None)
+
+        self[USERNAME_CLAIM] = user.username
+        self[ROLE_CLAIM] = profile.role if profile else None
+        self[PROFILE_ID_CLAIM] = profile.id if profile else None
+
+
+def revoke_user_tokens(user_id):
+    """Revoke every token issued to ``user_id`` so far (access and refresh alike)."""
+    until = time.time() + api_settings.REFRESH_TOKEN_LIFETIME.total_seconds()
+    get_revocation_store().revoke_user(user_id, until)
@@ -1,31 +1,27 @@
-from rest_framework.decorators import api_view, permission_classes, parser_classes
+from rest_framework.decorators import api_view, permission_classes, parser_classes, throttle_classes
 from rest_framework.response import Response
 from rest_framework import status
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.views import APIView
+from rest_framework.pagination import CursorPagination
 from django.contrib.auth.models import User
-from rest_framework_simplejwt.tokens import RefreshToken
 from rest_framework_simplejwt.exceptions import TokenError
-from .serializer import RegisterSerializer, UserSerializer, CustomTokenObtainPairSerializer
+from .serializer import RegisterSerializer, UserSerializer, CustomTokenObtainPairSerializer, CustomTokenRefreshSerializer
+from .tokens import RefreshToken
+from .permissions import is_admin_or_staff
+from backend.derivatives import thumbnail_url
 from django.views.decorators.csrf import csrf_exempt
 from rest_framework.parsers import MultiPartParser, FormParser
 from datetime import timedelta
 from django.conf import settings
-
-# ✅ Helper function to check roles
-def is_admin_or_staff(user):
-    # if you’re using a related profile with role, adjust to user.profile.role
-    role = getattr(user, "profile", None)
-    if role:
-        return role.role in ["admin", "staff"]
-    return False
-
+from backend.throttling import LoginThrottle, scoped_throttle
 
 # -----------------------------
 # REGISTER (public)
 # -----------------------------
 @api_view(['POST'])
 @permission_classes([AllowAny])
+@throttle_classes([scoped_throttle('register')])
 def register(request):
     serializer = RegisterSerializer(data=request.data)
     if serializer.is_valid():
@@ -37,6 +33,14 @@ def register(request):
 # -----------------------------
 # GET ALL USERS (admin/staff only)
 # -----------------------------
+class UserDirectoryPagination(CursorPagination):
+    # Keyset pagination on the primary key: each page is an indexed range scan
+    ordering = 'id'
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 200
+
+
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def get_all_users(request):
@@ -46,9 +50,32 @@ def get_all_users(request):
             status=status.HTTP_403_FORBIDDEN
         )
 
+    fields = None
+    if request.query_params.get('fields'):
+        fields = [f.strip() for f in request.query_params['fields'].split(',') if f.strip()]
+
     users = User.objects.all()
-    serializer = UserSerializer(users, many=True, context={'request': request})
-    return Response(serializer.data)
+    if fields is None or 'profile' in fields:
+        users = users.select_related('profile')
+
+    # Server-side filters on the profile
+    role = request.query_params.get('role')
+    if role:
+        users = users.filter(profile__role=role)
+    civil_status = request.query_params.get('civil_status')
+    if civil_status:
+        users = users.filter(profile__civil_status__iexact=civil_status)
+    house_num = request.query_params.get('houseNum')
+    if house_num:
+        try:
+            users = users.filter(profile__houseNum=int(house_num))
+        except ValueError:
+            return Response({"houseNum": ["Must be an integer."]}, status=status.HTTP_400_BAD_REQUEST)
+
+    paginator = UserDirectoryPagination()
+    page = paginator.paginate_queryset(users, request)
+    serializer = UserSerializer(page, many=True, fields=fields, context={'request': request})
+    return paginator.get_paginated_response(serializer.data)
 
 
 # -----------------------------
@@ -57,7 +84,8 @@ def get_all_users(request):
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def current_user(request):
-    user = request.user
+    # request.user only carries token claims; load the full row and profile in one query
+    user = User.objects.select_related('profile').get(pk=request.user.pk)
     profile = getattr(user, 'profile', None)
 
     if profile is None:
@@ -69,6 +97,7 @@ def current_user(request):
             "birthdate": None,
             "role": "",
             "image": None,
+            "image_thumb": None,
         }
     else:
         profile_data = {
@@ -79,6 +108,7 @@ def current_user(request):
             "birthdate": profile.birthdate,
             "role": profile.role,
             "image": profile.image.url if profile.image else None,
+            "image_thumb": thumbnail_url(profile.image),
         }
 
     data = {
@@ -146,9 +176,10 @@ def user_detail(request, user_id):
 # -----------------------------
 class CustomEmailLoginView(APIView):
     permission_classes = [AllowAny]
+    throttle_classes = [LoginThrottle]
 
     def post(self, request):
-        serializer = CustomTokenObtainPairSerializer(data=request.data)
+        serializer = CustomTokenObtainPairSerializer(data=request.data, context={'request': request})
         if serializer.is_valid():
             data = serializer.validated_data
             secure_cookie = not settings.DEBUG  # Only True in production
@@ -198,9 +229,11 @@ class TokenRefreshView(APIView):
             return Response({"refresh": ["This field is required."]}, status=status.HTTP_400_BAD_REQUEST)
 
         try:
-            refresh = RefreshToken(refresh_token)
-            new_access_token = str(refresh.access_token)
-            new_refresh_token = str(refresh)
+            # Verifies the token isn't revoked and revokes it on rotation
+            serializer = CustomTokenRefreshSerializer(data={"refresh": refresh_token})
+            serializer.is_valid(raise_exception=True)
+            new_access_token = serializer.validated_data["access"]
+            new_refresh_token = serializer.validated_data.get("refresh", refresh_token)
 
             secure_cookie = not settings.DEBUG
 
@@ -246,10 +279,13 @@ def logout_view(request):
     refresh_token = request.COOKIES.get('refresh_token')
     if refresh_token:
         try:
-            token = RefreshToken(refresh_token)
-            token.blacklist()
-        except Exception:
-            pass
+            RefreshToken(refresh_token).blacklist()
+        except TokenError:
+            pass  # already expired or revoked
+
+    # The access token stays valid until it expires unless revoked too
+    if request.auth is not None:
+        request.auth.blacklist()
 
     response = Response({"message": "Successfully logged out"}, status=status.HTTP_205_RESET_CONTENT)
     response.delete_cookie('access_token', path='/')
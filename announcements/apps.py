@@ -4,3 +4,9 @@ from django.apps import AppConfig
 class AnnouncementsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'announcements'
+
+    def ready(self):
+        from backend.derivatives import track_image_field
+        from .models import Announcement
+
+        track_image_field(Announcement, 'image')
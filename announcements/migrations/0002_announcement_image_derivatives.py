@@ -0,0 +1,16 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('announcements', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='announcement',
+            name='image_derivatives',
+            field=models.BooleanField(default=False, editable=False),
+        ),
+    ]
@@ -16,6 +16,8 @@ class Announcement(models.Model):
     upload_to='announcements/',
     null=True, blank=True
 )
+    # Set once image's thumbnails are stored (see backend.derivatives)
+    image_derivatives = models.BooleanField(default=False, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
 
     def __str__(self):
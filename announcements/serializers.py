@@ -1,7 +1,17 @@
 from rest_framework import serializers
+from backend.derivatives import thumbnail_url, srcset
 from .models import Announcement
 
 class AnnouncementSerializer(serializers.ModelSerializer):
+    image_thumb = serializers.SerializerMethodField()
+    image_srcset = serializers.SerializerMethodField()
+
     class Meta:
         model = Announcement
-        fields = '__all__'
+        exclude = ['image_derivatives']
+
+    def get_image_thumb(self, obj):
+        return thumbnail_url(obj.image)
+
+    def get_image_srcset(self, obj):
+        return srcset(obj.image)
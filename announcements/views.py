@@ -4,14 +4,7 @@ from rest_framework.response import Response
 from rest_framework import status
 from .models import Announcement
 from .serializers import AnnouncementSerializer
-
-
-# ✅ Helper: check if user is admin or staff
-def is_admin_or_staff(user):
-    profile = getattr(user, "profile", None)
-    if profile:
-        return profile.role in ["admin", "staff"]
-    return False
+from accounts.permissions import is_admin_or_staff
 
 
 # -----------------------------
@@ -2,6 +2,8 @@
 ASGI config for backend project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+HTTP goes to Django (async views such as the chatbot run natively on the
+event loop), websockets to Channels.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
@@ -13,18 +15,20 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
 
-application = get_asgi_application()
+# Set up Django before importing anything that touches models
+django_asgi_app = get_asgi_application()
 
-import os
-from django.core.asgi import get_asgi_application
-from channels.routing import ProtocolTypeRouter, URLRouter
-import emergency.routing  # your app routing
-
-os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
+from channels.routing import ProtocolTypeRouter, URLRouter  # noqa: E402
+from channels.security.websocket import OriginValidator  # noqa: E402
+from django.conf import settings  # noqa: E402
+from accounts.middleware import CookieJWTAuthMiddleware  # noqa: E402
+import emergency.routing  # noqa: E402
 
 application = ProtocolTypeRouter({
-    "http": get_asgi_application(),
-    "websocket": URLRouter(
+    "http": django_asgi_app,
+    # Sockets authenticate with the same access_token cookie as the API, so
+    # like the API they only accept the frontend's origins
+    "websocket": OriginValidator(CookieJWTAuthMiddleware(URLRouter(
         emergency.routing.websocket_urlpatterns
-    ),
+    )), settings.CORS_ALLOWED_ORIGINS),
 })
@@ -0,0 +1,50 @@
+"""
+Helpers shared by the ``bench_*`` management commands.
+
+Benchmarks run against a throwaway test database so they never touch the
+configured (production) one.
+"""
+import math
+import os
+import sys
+from contextlib import contextmanager
+
+from django.db import connection
+
+
+@contextmanager
+def isolated_database(verbosity=0):
+    old_name = connection.creation.create_test_db(verbosity=verbosity, autoclobber=True)
+    try:
+        yield
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=verbosity)
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of ``values`` (``pct`` in 0-100)."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, math.ceil(pct / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+def format_ms(seconds):
+    return f"{seconds * 1000:.1f} ms"
+
+
+def rss_bytes():
+    """Resident memory of this process (peak resident memory where /proc is unavailable)."""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        import resource
+
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == 'darwin' else peak * 1024  # macOS reports bytes, Linux KiB
+
+
+def format_mb(size):
+    return f"{size / 2**20:.1f} MB"
@@ -0,0 +1,192 @@
+"""
+Thumbnail / WebP derivatives for uploaded images.
+
+When a tracked image field receives a new upload, the original is decoded once
+(while it is still in memory, before it goes to Supabase) and re-encoded into
+small, EXIF-free derivatives. They are stored next to the original under
+predictable names, so their URLs can be built from the original's name without
+any extra DB column:
+
+    profile_pics/<uuid>.jpg
+    profile_pics/<uuid>_thumb.jpg    160x160 crop
+    profile_pics/<uuid>_thumb.webp
+    profile_pics/<uuid>_md.jpg       fits 640x640
+    profile_pics/<uuid>_md.webp
+
+Each tracked field has a ``<field>_derivatives`` flag on its model, set once
+the derivatives are stored. Until then (a failed render or upload, or a file
+not yet backfilled by ``generate_image_derivatives``) URLs point at the
+original instead.
+"""
+import io
+import logging
+
+from django.core.files.base import ContentFile
+from django.db.models.signals import pre_save, post_save
+
+logger = logging.getLogger(__name__)
+
+IMAGE_EXTENSIONS = {'jpg', 'jpeg', 'png', 'webp', 'gif', 'bmp', 'tif', 'tiff'}
+
+# (label, pixel size, crop to square)
+SIZES = (
+    ('thumb', 160, True),
+    ('md', 640, False),
+)
+FORMATS = (
+    ('jpg', 'JPEG', 'image/jpeg', {'quality': 82, 'optimize': True, 'progressive': True}),
+    ('webp', 'WEBP', 'image/webp', {'quality': 80, 'method': 4}),
+)
+
+# model class -> field names whose uploads get derivatives
+_tracked_fields = {}
+
+
+def is_image_name(name):
+    return bool(name) and name.rsplit('.', 1)[-1].lower() in IMAGE_EXTENSIONS
+
+
+def derivative_name(name, label, ext):
+    stem = name.rsplit('.', 1)[0]
+    return f"{stem}_{label}.{ext}"
+
+
+def flag_name(field_name):
+    return f'{field_name}_derivatives'
+
+
+def has_derivatives(field_file):
+    return bool(getattr(field_file.instance, flag_name(field_file.field.name), False))
+
+
+def mark_derivatives(instance, field_name, stored):
+    """Record whether ``instance.<field_name>`` has derivatives, without re-saving the row."""
+    flag = flag_name(field_name)
+    setattr(instance, flag, stored)
+    type(instance)._default_manager.filter(pk=instance.pk).update(**{flag: stored})
+
+
+def render_derivatives(fileobj):
+    """
+    Decode ``fileobj`` and return ``[(label, ext, content_type, bytes), ...]``.
+    Derivatives are encoded from pixels only, so EXIF (GPS, device) is dropped;
+    orientation is applied first so nothing ends up sideways.
+    """
+    from PIL import Image, ImageOps
+
+    fileobj.seek(0)
+    with Image.open(fileobj) as original:
+        image = ImageOps.exif_transpose(original)
+        if image.mode in ('RGBA', 'LA', 'P'):
+            # JPEG has no alpha: flatten onto white
+            image = image.convert('RGBA')
+            background = Image.new('RGB', image.size, (255, 255, 255))
+            background.paste(image, mask=image.getchannel('A'))
+            image = background
+        elif image.mode != 'RGB':
+            image = image.convert('RGB')
+
+        rendered = []
+        for label, size, crop in SIZES:
+            if crop:
+                resized = ImageOps.fit(image, (size, size), Image.Resampling.LANCZOS)
+            else:
+                resized = image.copy()
+                resized.thumbnail((size, size), Image.Resampling.LANCZOS)
+            for ext, pil_format, content_type, options in FORMATS:
+                buffer = io.BytesIO()
+                resized.save(buffer, pil_format, **options)
+                rendered.append((label, ext, content_type, buffer.getvalue()))
+    fileobj.seek(0)
+    return rendered
+
+
+def store_derivatives(storage, name, rendered):
+    for label, ext, content_type, data in rendered:
+        target = derivative_name(name, label, ext)
+        if hasattr(storage, 'save_derivative'):
+            storage.save_derivative(target, data, content_type)
+        else:
+            # Plain Django storages rename on collision, so clear the slot first
+            if storage.exists(target):
+                storage.delete(target)
+            storage.save(target, ContentFile(data))
+
+
+def thumbnail_url(field_file):
+    """
+    URL of the 160px JPEG thumbnail (the original's while it has none), or
+    None for empty / non-image files.
+    """
+    if not field_file or not is_image_name(field_file.name):
+        return None
+    if not has_derivatives(field_file):
+        return field_file.url
+    return field_file.storage.url(derivative_name(field_file.name, 'thumb', 'jpg'))
+
+
+def srcset(field_file):
+    """
+    ``srcset`` string of the WebP derivatives, for ``<source type="image/webp">``;
+    None when there are none.
+    """
+    if not field_file or not is_image_name(field_file.name) or not has_derivatives(field_file):
+        return None
+    storage = field_file.storage
+    return ', '.join(
+        f"{storage.url(derivative_name(field_file.name, label, 'webp'))} {size}w"
+        for label, size, _crop in SIZES
+    )
+
+
+def tracked_fields():
+    return [(model, name) for model, names in _tracked_fields.items() for name in names]
+
+
+def track_image_field(model, field_name):
+    """
+    Generate derivatives whenever ``model.<field_name>`` gets a new upload.
+    The model needs a ``<field_name>_derivatives`` BooleanField.
+    """
+    model._meta.get_field(flag_name(field_name))  # FieldDoesNotExist early, not on the first upload
+    _tracked_fields.setdefault(model, []).append(field_name)
+    pre_save.connect(_render_pending, sender=model, dispatch_uid=f'derivatives-pre-{model._meta.label}')
+    post_save.connect(_store_pending, sender=model, dispatch_uid=f'derivatives-post-{model._meta.label}')
+
+
+def _render_pending(sender, instance, update_fields=None, **kwargs):
+    pending = {}
+    for field_name in _tracked_fields.get(sender, ()):
+        if update_fields is not None and field_name not in update_fields:
+            continue
+        field_file = getattr(instance, field_name)
+        # Uncommitted means a fresh upload still held in memory / temp file
+        if not field_file or field_file._committed:
+            continue
+        # None: the new file gets no derivatives, so the old ones must not be used
+        pending[field_name] = None
+        if not is_image_name(field_file.name):
+            continue
+        try:
+            pending[field_name] = render_derivatives(field_file.file)
+        except Exception:
+            logger.warning("Could not render derivatives for %s.%s", sender.__name__, field_name, exc_info=True)
+    instance._pending_derivatives = pending
+
+
+def _store_pending(sender, instance, **kwargs):
+    pending = getattr(instance, '_pending_derivatives', None)
+    if not pending:
+        return
+    instance._pending_derivatives = {}
+    for field_name, rendered in pending.items():
+        field_file = getattr(instance, field_name)
+        stored = False
+        if rendered is not None:
+            try:
+                store_derivatives(field_file.storage, field_file.name, rendered)
+                stored = True
+            except Exception:
+                # The original is saved; missing derivatives can be backfilled later
+                logger.exception("Could not store derivatives for %s", field_file.name)
+        mark_derivatives(instance, field_name, stored)
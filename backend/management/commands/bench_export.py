@@ -0,0 +1,64 @@
+import tempfile
+import time
+import tracemalloc
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from backend.benchmarks import isolated_database
+from backend.exports import SHEETS, write_workbook
+from emergency.models import EmergencyReport
+
+SEED_BATCH = 5000
+
+
+class Command(BaseCommand):
+    help = "Measure peak Python memory and time of the Excel export as the emergencies table grows (throwaway test DB)."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--rows', default='1000,10000,100000',
+            help="Comma-separated cumulative row counts, e.g. 1000,10000,100000,1000000",
+        )
+
+    def handle(self, *args, **options):
+        targets = sorted(int(n) for n in options['rows'].split(','))
+        sheets = [spec for spec in SHEETS if spec.model is EmergencyReport]
+
+        with isolated_database():
+            seeded = 0
+            for target in targets:
+                self.seed(target - seeded)
+                seeded = target
+
+                tracemalloc.start()
+                started = time.perf_counter()
+                with tempfile.TemporaryFile() as tmp:
+                    write_workbook(tmp, sheets)
+                    size = tmp.tell()
+                elapsed = time.perf_counter() - started
+                _, peak = tracemalloc.get_traced_memory()
+                tracemalloc.stop()
+
+                self.stdout.write(
+                    f"{target:>9} rows: {elapsed:7.2f} s, peak {peak / 2**20:6.1f} MiB, file {size / 2**20:6.1f} MiB"
+                )
+
+    def seed(self, count):
+        now = timezone.now()
+        while count > 0:
+            batch = min(count, SEED_BATCH)
+            EmergencyReport.objects.bulk_create(
+                EmergencyReport(
+                    name=f"Reporter {i}",
+                    incident_type='flood',
+                    description="Water rising along the creek near the chapel.",
+                    latitude=15.0,
+                    longitude=120.6,
+                    location_text="Purok 3, Sindalan",
+                    contact_number="09170000000",
+                    submitted_at=now,
+                )
+                for i in range(batch)
+            )
+            count -= batch
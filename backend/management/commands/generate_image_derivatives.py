@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand
+
+from backend.derivatives import (
+    flag_name, is_image_name, mark_derivatives, render_derivatives, store_derivatives, tracked_fields,
+)
+
+
+class Command(BaseCommand):
+    help = "Backfill thumbnail/WebP derivatives for images uploaded before derivatives existed."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true')
+
+    def handle(self, *args, **options):
+        for model, field_name in tracked_fields():
+            done = failed = 0
+            queryset = (
+                model.objects.exclude(**{field_name: ''}).exclude(**{f'{field_name}__isnull': True})
+                .filter(**{flag_name(field_name): False})
+                .only('pk', field_name)
+            )
+            for instance in queryset.iterator(chunk_size=200):
+                field_file = getattr(instance, field_name)
+                if not is_image_name(field_file.name):
+                    continue
+                if options['dry_run']:
+                    done += 1
+                    continue
+                try:
+                    with field_file.storage.open(field_file.name) as original:
+                        rendered = render_derivatives(original)
+                    store_derivatives(field_file.storage, field_file.name, rendered)
+                    mark_derivatives(instance, field_name, True)
+                    done += 1
+                except Exception as e:
+                    failed += 1
+                    self.stderr.write(f"{model.__name__} {instance.pk}: {e}")
+            self.stdout.write(f"{model.__name__}.{field_name}: {done} processed, {failed} failed")
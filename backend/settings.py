@@ -49,21 +49,24 @@ INSTALLED_APPS = [
     'chatbot',
     'emergency',
     'blotter',
+    'exports',
     'backend',
 ]
 
 # REST Framework
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'accounts.authentication.ClaimsJWTAuthentication',
     ),
+    # Proxies in front of the app (Render's router); throttles key on the client IP they forward
+    'NUM_PROXIES': int(os.getenv('NUM_PROXIES', '1')),
 }
 
 # MIDDLEWARE
 MIDDLEWARE = [
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
-    'whitenoise.middleware.WhiteNoiseMiddleware',  # ← WHITENOISE
+    'backend.middleware.static.AsyncWhiteNoiseMiddleware',  # ← WHITENOISE (async-capable)
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -77,16 +80,35 @@ ROOT_URLCONF = 'backend.urls'
 WSGI_APPLICATION = 'backend.wsgi.application'
 ASGI_APPLICATION = 'backend.asgi.application'
 
+REDIS_URL = os.getenv('REDIS_URL', 'redis://127.0.0.1:6379')
+
 # CHANNEL LAYERS (Redis via env var)
 CHANNEL_LAYERS = {
     'default': {
         'BACKEND': 'channels_redis.core.RedisChannelLayer',
         'CONFIG': {
-            'hosts': [os.getenv('REDIS_URL', 'redis://127.0.0.1:6379')],
+            'hosts': [REDIS_URL],
         },
     },
 }
 
+# Cache (shared Redis in prod, per-process otherwise)
+if os.getenv('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        },
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            # Bounds total memory (e.g. chatbot conversations); oldest entries are culled first
+            'OPTIONS': {'MAX_ENTRIES': 5000},
+        },
+    }
+
 # CORS
 CORS_ALLOWED_ORIGINS = [
     'http://localhost:5173',
@@ -115,8 +137,16 @@ SIMPLE_JWT = {
     'AUTH_COOKIE_HTTP_ONLY': True,
     'AUTH_COOKIE_PATH': '/',
     'AUTH_COOKIE_SAMESITE': 'Lax',
+    'AUTH_TOKEN_CLASSES': ('accounts.tokens.AccessToken',),
+    'TOKEN_REFRESH_SERIALIZER': 'accounts.serializer.CustomTokenRefreshSerializer',
 }
 
+# Revoked token jti store (shared Redis in prod, per-process otherwise)
+TOKEN_REVOCATION_STORE = (
+    'accounts.revocation.RedisRevocationStore' if os.getenv('REDIS_URL')
+    else 'accounts.revocation.LocalRevocationStore'
+)
+
 # Templates
 TEMPLATES = [
     {
@@ -142,6 +172,12 @@ DATABASES = {
     )
 }
 
+# Authentication backends (email login first, username for Django admin)
+AUTHENTICATION_BACKENDS = [
+    'accounts.backends.EmailBackend',
+    'django.contrib.auth.backends.ModelBackend',
+]
+
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
     {'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator'},
@@ -165,4 +201,102 @@ MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
 # Default primary key
-DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
\ No newline at end of file
+DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+# Background export jobs (0 runs them inline, e.g. in tests)
+EXPORT_JOB_WORKERS = int(os.getenv('EXPORT_JOB_WORKERS', '2'))
+# A job still pending/running after this long is assumed lost (worker restart)
+EXPORT_JOB_TIMEOUT = timedelta(minutes=30)
+
+# Chatbot completions API (OpenAI-compatible; Groq by default)
+CHATBOT_API_BASE = os.getenv('CHATBOT_API_BASE', 'https://api.groq.com/openai/v1')
+CHATBOT_API_KEY = os.getenv('GROQ_API_KEY', '').strip()
+CHATBOT_MODEL = os.getenv('CHATBOT_MODEL', 'meta-llama/llama-4-scout-17b-16e-instruct')
+# Seconds; 'read' bounds the wait for the model's reply
+CHATBOT_TIMEOUT = {
+    'connect': float(os.getenv('CHATBOT_CONNECT_TIMEOUT', '5')),
+    'read': float(os.getenv('CHATBOT_READ_TIMEOUT', '15')),
+    'pool': 5.0,
+}
+# Per worker and provider: pooled keep-alive connections, completions in
+# flight, and how long a request may wait for a free slot before a 503
+CHATBOT_MAX_CONNECTIONS = int(os.getenv('CHATBOT_MAX_CONNECTIONS', '20'))
+CHATBOT_MAX_CONCURRENCY = int(os.getenv('CHATBOT_MAX_CONCURRENCY', '200'))
+CHATBOT_QUEUE_TIMEOUT = float(os.getenv('CHATBOT_QUEUE_TIMEOUT', '10'))
+
+# Providers in order of preference (see chatbot/providers.py). Keys are the
+# provider's constructor arguments, upper-cased.
+CHATBOT_PROVIDERS = [
+    {
+        'BACKEND': 'chatbot.providers.OpenAICompatibleProvider',
+        'NAME': 'groq',
+        'API_BASE': CHATBOT_API_BASE,
+        'API_KEY': CHATBOT_API_KEY,
+        'MODEL': CHATBOT_MODEL,
+        'FAILURE_THRESHOLD': 5,
+        'RESET_TIMEOUT': 30,
+    },
+]
+if os.getenv('CHATBOT_FALLBACK_API_BASE'):
+    CHATBOT_PROVIDERS.append({
+        'BACKEND': 'chatbot.providers.OpenAICompatibleProvider',
+        'NAME': 'fallback',
+        'API_BASE': os.getenv('CHATBOT_FALLBACK_API_BASE'),
+        'API_KEY': os.getenv('CHATBOT_FALLBACK_API_KEY', '').strip(),
+        'MODEL': os.getenv('CHATBOT_FALLBACK_MODEL', CHATBOT_MODEL),
+    })
+# None: no hedging; 'p95': re-send when a reply is slower than the provider's
+# observed p95; a number: re-send after that many seconds
+CHATBOT_HEDGE_AFTER = os.getenv('CHATBOT_HEDGE_AFTER') or None
+
+# Chatbot answer cache (per worker); fuzzy threshold is trigram Jaccard similarity, 0 disables
+CHATBOT_CACHE_MAX_ENTRIES = int(os.getenv('CHATBOT_CACHE_MAX_ENTRIES', '512'))
+CHATBOT_CACHE_TTL = int(os.getenv('CHATBOT_CACHE_TTL', '86400'))
+CHATBOT_CACHE_FUZZY_THRESHOLD = float(os.getenv('CHATBOT_CACHE_FUZZY_THRESHOLD', '0.75'))
+
+# Chatbot exchange log: rows are queued and bulk-inserted by a background thread
+# every CHATBOT_LOG_FLUSH_INTERVAL seconds (0: only on explicit flush / shutdown)
+CHATBOT_LOG_QUEUE_SIZE = int(os.getenv('CHATBOT_LOG_QUEUE_SIZE', '10000'))
+CHATBOT_LOG_BATCH_SIZE = 200
+CHATBOT_LOG_FLUSH_INTERVAL = float(os.getenv('CHATBOT_LOG_FLUSH_INTERVAL', '1'))
+
+# Chatbot grounding: announcement snippets added to the prompt
+CHATBOT_RETRIEVAL_TOP_K = 3
+CHATBOT_RETRIEVAL_MAX_CHARS = 1200
+CHATBOT_RETRIEVAL_REBUILD_INTERVAL = 600  # seconds; picks up other workers' edits
+
+# Chatbot conversation memory (in CACHES['default']); budgets are estimated tokens
+CHATBOT_MEMORY_TOKEN_BUDGET = 800
+CHATBOT_MEMORY_SUMMARY_TOKENS = 120
+CHATBOT_MEMORY_TTL = 30 * 60  # seconds of inactivity
+
+# Token-bucket rate limits per endpoint scope ("N/period", burst of N; None: unlimited).
+# Anonymous clients share an IP (mobile carriers use CGNAT), so keep IP limits generous;
+# emergency reports have their own bucket so other traffic can never starve them
+THROTTLE_STORE = (
+    'backend.throttling.RedisBucketStore' if os.getenv('REDIS_URL')
+    else 'backend.throttling.LocalBucketStore'
+)
+THROTTLE_RATES = {
+    'login': os.getenv('THROTTLE_LOGIN_RATE', '30/min'),
+    'register': os.getenv('THROTTLE_REGISTER_RATE', '20/hour'),
+    'chatbot': os.getenv('THROTTLE_CHATBOT_RATE', '30/min'),
+    'emergency': os.getenv('THROTTLE_EMERGENCY_RATE', '60/min'),
+}
+
+# ws/emergencies/ broadcasts: saves of a report within this many seconds are coalesced
+# and sent as one batch (0: broadcast each save immediately)
+EMERGENCY_BROADCAST_WINDOW = float(os.getenv('EMERGENCY_BROADCAST_WINDOW', '0.5'))
+# Events kept (in CACHES['default']) for clients resuming with their last seen seq;
+# older gaps get a snapshot of active reports instead
+EMERGENCY_HISTORY_SIZE = 1000
+EMERGENCY_HISTORY_TTL = 60 * 60
+
+# ws/emergencies/ slow clients: a socket whose queue of unsent reports stays above
+# EMERGENCY_SOCKET_MAX_PENDING for EMERGENCY_SOCKET_SLOW_GRACE seconds (or reaches
+# twice that) is disconnected and resumes later from its last seq
+EMERGENCY_SOCKET_MAX_PENDING = 100
+EMERGENCY_SOCKET_SLOW_GRACE = 10
+# Staff sockets are closed when their access token expires, and checked for
+# revocation this often (seconds)
+EMERGENCY_SOCKET_AUTH_RECHECK = 60
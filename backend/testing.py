@@ -0,0 +1,67 @@
+"""Fixtures shared by the apps' tests."""
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.test import override_settings
+from rest_framework.test import APIClient
+
+from accounts.models import Profile
+from accounts.tokens import RefreshToken
+from blotter.models import BlotterReport
+from certificates.models import CertificateRequest
+from complaints.models import Complaint
+from emergency.models import EmergencyReport
+
+
+def make_user(username, role="resident", birthdate="1990-01-01"):
+    user = User.objects.create_user(username=username, email=f"{username}@example.com", password="x")
+    Profile.objects.create(
+        user=user, name=username, contact_number="09170000000", houseNum=1,
+        address="Sindalan", civil_status="single", birthdate=birthdate, role=role,
+    )
+    return user
+
+
+def api_client_for(user):
+    client = APIClient(HTTP_HOST="localhost")
+    client.credentials(HTTP_AUTHORIZATION=f"Bearer {RefreshToken.for_user(user).access_token}")
+    return client
+
+
+def make_request(certificate_type="Certificate of Residency", **kwargs):
+    fields = dict(
+        certificate_type=certificate_type,
+        first_name="Juan",
+        last_name="Dela Cruz",
+        complete_address="Sindalan",
+        contact_number="09170000000",
+        email_address="juan@example.com",
+        purpose="Employment",
+        agree_terms=True,
+    )
+    fields.update(kwargs)
+    return CertificateRequest.objects.create(**fields)
+
+
+def make_complaint(user):
+    return Complaint.objects.create(
+        user=user, type="Noise", fullname="Juan", contact_number="09170000000", address="Sindalan",
+        email_address="juan@example.com", subject="Karaoke", detailed_description="Past midnight",
+        respondent_name="Pedro", respondent_address="Sindalan", latitude="15.0", longitude="120.6",
+    )
+
+
+def make_blotter(user):
+    return BlotterReport.objects.create(
+        filed_by=user, complainant_name="Juan", incident_type="Theft/Burglary", incident_date="2025-01-01",
+        incident_time="12:00", location="Sindalan", agree_terms=True,
+    )
+
+
+def make_report(**kwargs):
+    fields = dict(name="Juan", incident_type="fire", description="Smoke", location_text="Sindalan")
+    fields.update(kwargs)
+    return EmergencyReport.objects.create(**fields)
+
+
+def tight_rates(**rates):
+    return override_settings(THROTTLE_RATES={**settings.THROTTLE_RATES, **rates})
@@ -0,0 +1,299 @@
+import io
+import tempfile
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+from unittest import mock
+
+import openpyxl
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage
+from django.core.management import call_command
+from django.test import RequestFactory, TestCase
+from django.utils import timezone
+from PIL import Image
+from rest_framework.test import APIClient
+
+from certificates.models import BusinessPermit
+from complaints.models import Complaint
+from complaints.serializers import ComplaintSerializer
+from emergency.models import EmergencyReport
+from .derivatives import render_derivatives, srcset, thumbnail_url
+from .exports import SHEETS, SHEETS_BY_KEY, XLSX_CONTENT_TYPE, write_workbook
+from .testing import api_client_for, make_blotter, make_complaint, make_report, make_request, make_user, tight_rates
+from .throttling import LocalBucketStore, get_bucket_store
+
+ORIENTATION = 0x0112
+MAKE = 0x010F
+
+
+def jpeg_bytes(size=(300, 200), orientation=None):
+    exif = Image.Exif()
+    exif[MAKE] = "PhoneCo"
+    if orientation:
+        exif[ORIENTATION] = orientation
+    buffer = io.BytesIO()
+    Image.new("RGB", size, (200, 30, 30)).save(buffer, "JPEG", exif=exif)
+    return buffer.getvalue()
+
+
+class RenderDerivativesTests(TestCase):
+    def test_sizes_formats_and_no_exif(self):
+        # Orientation 6: stored landscape, shown portrait
+        rendered = render_derivatives(io.BytesIO(jpeg_bytes((300, 200), orientation=6)))
+
+        self.assertEqual(
+            [(label, ext, content_type) for label, ext, content_type, _ in rendered],
+            [("thumb", "jpg", "image/jpeg"), ("thumb", "webp", "image/webp"),
+             ("md", "jpg", "image/jpeg"), ("md", "webp", "image/webp")],
+        )
+        for label, ext, _, data in rendered:
+            with Image.open(io.BytesIO(data)) as image:
+                self.assertEqual(image.format, {"jpg": "JPEG", "webp": "WEBP"}[ext])
+                self.assertEqual(image.size, (160, 160) if label == "thumb" else (200, 300))
+                self.assertEqual(dict(image.getexif()), {})
+
+    def test_medium_fits_the_bounding_box(self):
+        rendered = render_derivatives(io.BytesIO(jpeg_bytes((1600, 900))))
+
+        with Image.open(io.BytesIO(rendered[2][3])) as medium:
+            self.assertEqual(medium.size, (640, 360))
+
+    def test_transparent_png_is_flattened(self):
+        buffer = io.BytesIO()
+        Image.new("RGBA", (50, 50), (0, 0, 0, 0)).save(buffer, "PNG")
+
+        _, _, _, data = render_derivatives(buffer)[0]
+
+        with Image.open(io.BytesIO(data)) as thumb:
+            self.assertEqual(thumb.mode, "RGB")
+            self.assertEqual(thumb.getpixel((80, 80)), (255, 255, 255))
+
+
+class UploadDerivativesTests(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.storage = FileSystemStorage(location=directory.name, base_url="/media/")
+        patcher = mock.patch.object(Complaint._meta.get_field("evidence"), "storage", self.storage)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def upload(self, complaint, name, data):
+        complaint.evidence = ContentFile(data, name=name)
+        complaint.save(update_fields=["evidence"])
+        return Complaint.objects.get(pk=complaint.pk)
+
+    def test_image_upload_stores_derivatives(self):
+        complaint = self.upload(make_complaint(None), "photo.jpg", jpeg_bytes())
+        stem = complaint.evidence.name.rsplit(".", 1)[0]
+
+        self.assertTrue(complaint.evidence_derivatives)
+        for suffix in ("_thumb.jpg", "_thumb.webp", "_md.jpg", "_md.webp"):
+            self.assertTrue(self.storage.exists(stem + suffix), suffix)
+        self.assertEqual(thumbnail_url(complaint.evidence), f"/media/{stem}_thumb.jpg")
+        self.assertEqual(srcset(complaint.evidence), f"/media/{stem}_thumb.webp 160w, /media/{stem}_md.webp 640w")
+        data = ComplaintSerializer(complaint, context={"request": RequestFactory().get("/")}).data
+        self.assertEqual(data["evidence_thumb"], f"/media/{stem}_thumb.jpg")
+
+    def test_non_image_upload_is_skipped(self):
+        complaint = self.upload(make_complaint(None), "statement.pdf", b"%PDF-1.4")
+
+        self.assertFalse(complaint.evidence_derivatives)
+        self.assertEqual(self.storage.listdir("complaint_evidence")[1], ["statement.pdf"])
+        self.assertIsNone(thumbnail_url(complaint.evidence))
+        self.assertIsNone(srcset(complaint.evidence))
+
+    def test_failed_render_falls_back_to_the_original(self):
+        complaint = self.upload(make_complaint(None), "photo.jpg", jpeg_bytes())
+
+        with self.assertLogs("backend.derivatives", "WARNING"):
+            complaint = self.upload(complaint, "broken.jpg", b"not really a jpeg")
+
+        # The first upload's derivatives are not this file's
+        self.assertFalse(complaint.evidence_derivatives)
+        self.assertEqual(thumbnail_url(complaint.evidence), complaint.evidence.url)
+        self.assertIsNone(srcset(complaint.evidence))
+
+    def test_backfill(self):
+        complaint = make_complaint(None)
+        name = self.storage.save("complaint_evidence/old.jpg", ContentFile(jpeg_bytes()))
+        Complaint.objects.filter(pk=complaint.pk).update(evidence=name)
+        self.assertEqual(thumbnail_url(Complaint.objects.get(pk=complaint.pk).evidence), f"/media/{name}")
+
+        call_command("generate_image_derivatives", stdout=io.StringIO())
+
+        complaint.refresh_from_db()
+        self.assertTrue(complaint.evidence_derivatives)
+        self.assertTrue(self.storage.exists("complaint_evidence/old_thumb.jpg"))
+        self.assertEqual(thumbnail_url(complaint.evidence), "/media/complaint_evidence/old_thumb.jpg")
+
+
+def as_cell(value):
+    """``value`` the way openpyxl reads it back from the workbook."""
+    if isinstance(value, datetime):
+        value = timezone.make_naive(value) if timezone.is_aware(value) else value
+        # Excel keeps milliseconds
+        value += timedelta(microseconds=500)
+        return value.replace(microsecond=value.microsecond // 1000 * 1000)
+    if isinstance(value, date):
+        return datetime.combine(value, time.min)
+    if isinstance(value, Decimal):
+        return float(value)
+    if value == "":
+        return None
+    return value
+
+
+class ExportWorkbookTests(TestCase):
+    def read(self, fileobj):
+        workbook = openpyxl.load_workbook(fileobj)
+        return {ws.title: [list(row) for row in ws.iter_rows(values_only=True)] for ws in workbook.worksheets}
+
+    def expected_row(self, spec, obj):
+        return [as_cell(getattr(obj, field)) for field, _ in spec.columns]
+
+    def test_streamed_export_matches_the_fixtures(self):
+        requester = make_user("requester")
+        certificate = make_request(user=requester)
+        walk_in = make_request("Certificate of Indigency")
+        permit = BusinessPermit.objects.create(
+            business_name="Sari-sari", business_type="Retail", owner_name="Maria", business_address="Sindalan",
+            contact_number="09170000000", owner_address="Sindalan",
+        )
+        complaint = make_complaint(requester)
+        report = make_report(latitude="15.000000", longitude="120.650000", contact_number="09170000000")
+        blotter = make_blotter(requester)
+
+        response = api_client_for(make_user("staff", role="staff")).get("/export-report/")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], XLSX_CONTENT_TYPE)
+        self.assertIn("attachment; filename=\"Consolidated_Reports_", response["Content-Disposition"])
+        sheets = self.read(io.BytesIO(b"".join(response.streaming_content)))
+
+        self.assertEqual(list(sheets), [spec.title for spec in SHEETS])
+        for spec in SHEETS:
+            self.assertEqual(sheets[spec.title][0], spec.headers, spec.title)
+
+        for key, objects in [
+            ("certificates", [certificate, walk_in]), ("business_permits", [permit]), ("complaints", [complaint]),
+            ("emergencies", [report]), ("blotter_reports", [blotter]),
+        ]:
+            spec = SHEETS_BY_KEY[key]
+            for obj in objects:
+                obj.refresh_from_db()
+            self.assertEqual(sheets[spec.title][1:], [self.expected_row(spec, obj) for obj in objects], spec.title)
+
+    def test_export_is_staff_only(self):
+        self.assertEqual(APIClient().get("/export-report/").status_code, 401)
+        self.assertEqual(api_client_for(make_user("resident")).get("/export-report/").status_code, 403)
+
+    def test_empty_tables_give_header_only_sheets(self):
+        with tempfile.TemporaryFile() as tmp:
+            write_workbook(tmp)
+            tmp.seek(0)
+            sheets = self.read(tmp)
+
+        self.assertEqual(sheets, {spec.title: [spec.headers] for spec in SHEETS})
+
+    def test_date_range_limits_every_sheet(self):
+        make_request()
+        make_report()
+
+        with tempfile.TemporaryFile() as tmp:
+            write_workbook(tmp, date_from=date(2000, 1, 1), date_to=date(2000, 12, 31))
+            tmp.seek(0)
+            sheets = self.read(tmp)
+
+        self.assertTrue(all(len(rows) == 1 for rows in sheets.values()))
+
+
+class EmergencyThrottleTests(TestCase):
+    def setUp(self):
+        get_bucket_store.cache_clear()
+        self.client = APIClient(HTTP_HOST="localhost")
+
+    def report(self, **extra):
+        return self.client.post("/api/emergencies/", {
+            "name": "Juan", "incident_type": "fire", "description": "Smoke",
+            "latitude": 14.9, "longitude": 120.7, "location_text": "Sindalan",
+        }, format="json", **extra)
+
+    def test_over_limit_is_429_with_retry_after(self):
+        with tight_rates(emergency="2/min"):
+            statuses = [self.report().status_code for _ in range(3)]
+            response = self.report()
+
+        self.assertEqual(statuses, [201, 201, 429])
+        self.assertEqual(response.status_code, 429)
+        self.assertGreaterEqual(int(response["Retry-After"]), 1)
+        self.assertLessEqual(int(response["Retry-After"]), 30)
+        self.assertEqual(EmergencyReport.objects.count(), 2)
+
+    def test_emergency_lane_is_separate_from_login(self):
+        with tight_rates(login="1/hour", emergency="2/min"):
+            for _ in range(3):
+                self.client.post("/api/token/", {"email": "x@example.com", "password": "x"}, format="json")
+            login = self.client.post("/api/token/", {"email": "x@example.com", "password": "x"}, format="json")
+            report = self.report()
+
+        self.assertEqual(login.status_code, 429)
+        self.assertEqual(report.status_code, 201)
+
+    def test_clients_are_keyed_by_ip(self):
+        with tight_rates(emergency="1/min"):
+            first = self.report(REMOTE_ADDR="10.0.0.1")
+            same_ip = self.report(REMOTE_ADDR="10.0.0.1")
+            other_ip = self.report(REMOTE_ADDR="10.0.0.2")
+
+        self.assertEqual([first.status_code, same_ip.status_code, other_ip.status_code], [201, 429, 201])
+
+    def test_listing_is_not_throttled(self):
+        with tight_rates(emergency="1/min"):
+            statuses = [self.client.get("/api/emergencies/").status_code for _ in range(3)]
+
+        self.assertEqual(statuses, [200, 200, 200])
+
+
+class LocalBucketStoreTests(TestCase):
+    def test_bucket_refills_over_time(self):
+        store = LocalBucketStore()
+
+        self.assertEqual([store.take("k", 10, 2)[0] for _ in range(3)], [True, True, False])
+        allowed, wait = store.take("k", 10, 2)
+        self.assertFalse(allowed)
+        self.assertAlmostEqual(wait, 0.1, delta=0.02)
+
+        tokens, updated_at = store._buckets["k"]
+        store._buckets["k"] = (tokens, updated_at - 0.2)  # 200ms later: two tokens back
+        self.assertEqual([store.take("k", 10, 2)[0] for _ in range(2)], [True, True])
+
+
+class LoginThrottleTests(TestCase):
+    def setUp(self):
+        get_bucket_store.cache_clear()
+        make_user("resident")
+
+    def login(self, email, ip):
+        return APIClient(HTTP_HOST="localhost").post(
+            "/api/token/", {"email": email, "password": "wrong"}, format="json", REMOTE_ADDR=ip,
+        )
+
+    def test_one_email_is_limited_across_ips(self):
+        with tight_rates(login="2/min"):
+            statuses = [
+                self.login(email, ip).status_code
+                for email, ip in [("resident@example.com", "10.0.0.1"), (" Resident@Example.COM", "10.0.0.2"),
+                                  ("resident@example.com", "10.0.0.3")]
+            ]
+            other_email = self.login("someone@example.com", "10.0.0.4")
+
+        self.assertEqual(statuses, [400, 400, 429])
+        self.assertEqual(other_email.status_code, 400)
+
+    def test_one_ip_is_limited_across_emails(self):
+        with tight_rates(login="2/min"):
+            statuses = [self.login(f"guess{i}@example.com", "10.0.0.1").status_code for i in range(3)]
+
+        self.assertEqual(statuses, [400, 400, 429])
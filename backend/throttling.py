@@ -0,0 +1,233 @@
+"""
+Token-bucket rate limiting shared by DRF views and plain (async) Django views.
+
+Each scope in ``THROTTLE_RATES`` ("login", "chatbot", ...) is a bucket per
+client: authenticated users are keyed by user id, everyone else by IP. A
+rate of ``"10/min"`` refills 10 tokens a minute and allows bursts of 10;
+``None`` disables the scope. Buckets of different scopes never share tokens,
+so the ``emergency`` lane cannot be drained by login or chatbot traffic.
+Logins also take from a bucket per email address (``LoginThrottle``), so
+guessing one account's password from many IPs is limited too.
+
+Buckets live in ``THROTTLE_STORE``: per-process memory, or Redis where the
+whole refill-and-take is one Lua script (one atomic round trip). If Redis is
+unreachable requests are let through rather than failing the endpoint.
+"""
+import logging
+import math
+import threading
+import time
+from functools import lru_cache, wraps
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.http import JsonResponse
+from django.utils.module_loading import import_string
+from rest_framework.throttling import BaseThrottle
+
+logger = logging.getLogger(__name__)
+
+PERIODS = {'s': 1, 'sec': 1, 'm': 60, 'min': 60, 'h': 3600, 'hour': 3600, 'd': 86400, 'day': 86400}
+
+
+def parse_rate(rate):
+    """``"10/min"`` -> ``(tokens per second, burst)``; None stays None."""
+    if rate is None:
+        return None
+    count, period = rate.split('/')
+    count = int(count)
+    return count / PERIODS[period], count
+
+
+class LocalBucketStore:
+    """Per-process buckets; used in tests and when no Redis is configured."""
+    blocking = False
+
+    def __init__(self):
+        self._buckets = {}  # key -> (tokens, updated_at)
+        self._lock = threading.Lock()
+        self._next_prune = 0.0
+
+    def take(self, key, rate, burst):
+        """Take one token; ``(allowed, seconds until one is available)``."""
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated_at = self._buckets.get(key, (burst, now))
+            tokens = min(burst, tokens + (now - updated_at) * rate)
+            if tokens >= 1:
+                self._buckets[key] = (tokens - 1, now)
+                allowed, wait = True, 0.0
+            else:
+                self._buckets[key] = (tokens, now)
+                allowed, wait = False, (1 - tokens) / rate
+            if now >= self._next_prune:
+                self._prune(now)
+        return allowed, wait
+
+    def _prune(self, now):
+        # A bucket untouched for an hour is full again; forgetting it changes nothing
+        self._buckets = {
+            key: state for key, state in self._buckets.items() if now - state[1] < 3600
+        }
+        self._next_prune = now + 60
+
+
+class RedisBucketStore:
+    blocking = True
+    key_prefix = 'throttle:'
+
+    # KEYS[1] bucket; ARGV rate (tokens/s), burst. Uses the server clock so all workers agree.
+    SCRIPT = """
+    local rate = tonumber(ARGV[1])
+    local burst = tonumber(ARGV[2])
+    local clock = redis.call('TIME')
+    local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+    local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+    local tokens = tonumber(state[1]) or burst
+    local ts = tonumber(state[2]) or now
+    tokens = math.min(burst, tokens + math.max(0, now - ts) * rate)
+    local allowed = 0
+    local wait = 0
+    if tokens >= 1 then
+        tokens = tokens - 1
+        allowed = 1
+    else
+        wait = (1 - tokens) / rate
+    end
+    redis.call('HSET', KEYS[1], 'tokens', tokens, 'ts', now)
+    redis.call('PEXPIRE', KEYS[1], math.ceil(burst / rate * 1000) + 1000)
+    return {allowed, tostring(wait)}
+    """
+
+    def __init__(self, url=None):
+        import redis
+
+        self._redis_error = redis.RedisError
+        self._client = redis.Redis.from_url(url or settings.REDIS_URL, socket_timeout=0.5)
+        self._script = self._client.register_script(self.SCRIPT)
+
+    def take(self, key, rate, burst):
+        try:
+            allowed, wait = self._script(keys=[self.key_prefix + key], args=[rate, burst])
+        except self._redis_error:
+            logger.warning("Throttle check skipped, Redis unavailable")
+            return True, 0.0
+        return bool(allowed), float(wait)
+
+
+@lru_cache(maxsize=None)
+def get_bucket_store():
+    return import_string(settings.THROTTLE_STORE)()
+
+
+@receiver(setting_changed)
+def _reset_store(setting, **kwargs):
+    if setting == 'THROTTLE_STORE':
+        get_bucket_store.cache_clear()
+
+
+def client_key(request, user=None):
+    """``user:<id>`` for an authenticated ``user``, else ``ip:<address>`` (honouring NUM_PROXIES)."""
+    if user is not None and user.is_authenticated:
+        return f"user:{user.pk}"
+    return f"ip:{BaseThrottle().get_ident(request)}"
+
+
+def email_key(request):
+    """``email:<address>`` for the (casefolded) email a login names, or None."""
+    email = request.data.get('email') if hasattr(request.data, 'get') else None
+    if not isinstance(email, str) or not email.strip():
+        return None
+    return f"email:{email.strip().casefold()}"
+
+
+def check(scope, key):
+    """``(allowed, retry_after_seconds)`` for one request of ``key`` in ``scope``."""
+    parsed = parse_rate(settings.THROTTLE_RATES.get(scope))
+    if parsed is None:
+        return True, 0.0
+    rate, burst = parsed
+    return get_bucket_store().take(f"{scope}:{key}", rate, burst)
+
+
+class TokenBucketThrottle(BaseThrottle):
+    """
+    DRF throttle over the shared buckets. The scope comes from the class
+    (see ``scoped_throttle``) or the view's ``throttle_scope``.
+    """
+    scope = None
+
+    def bucket_keys(self, request):
+        """The buckets a request takes from; all must have a token."""
+        return [client_key(request, request.user)]
+
+    def allow_request(self, request, view):
+        scope = self.scope or getattr(view, 'throttle_scope', None)
+        if scope is None:
+            return True
+        for key in self.bucket_keys(request):
+            if key is None:
+                continue
+            allowed, self.retry_after = check(scope, key)
+            if not allowed:
+                return False
+        return True
+
+    def wait(self):
+        # DRF turns this into the Retry-After header
+        return math.ceil(self.retry_after)
+
+
+class LoginThrottle(TokenBucketThrottle):
+    """``login`` buckets per client IP and per email address tried."""
+    scope = 'login'
+
+    def bucket_keys(self, request):
+        return super().bucket_keys(request) + [email_key(request)]
+
+
+def scoped_throttle(scope):
+    """A ``TokenBucketThrottle`` subclass bound to ``scope``, for function views."""
+    return type(f"{scope.title()}Throttle", (TokenBucketThrottle,), {'scope': scope})
+
+
+def throttled_response(retry_after):
+    seconds = max(1, math.ceil(retry_after))
+    return JsonResponse(
+        {"error": f"Too many requests, try again in {seconds} seconds."},
+        status=429,
+        headers={"Retry-After": str(seconds)},
+    )
+
+
+def throttle(scope, key_func=client_key):
+    """
+    Throttle a plain Django view (sync or async) by ``scope``; 429 with
+    Retry-After when over. ``key_func(request)`` names the bucket owner and
+    defaults to the client IP.
+    """
+
+    def decorator(view):
+        if iscoroutinefunction(view):
+            @wraps(view)
+            async def wrapper(request, *args, **kwargs):
+                key = await sync_to_async(key_func)(request)
+                if get_bucket_store().blocking:
+                    allowed, retry_after = await sync_to_async(check, thread_sensitive=False)(scope, key)
+                else:
+                    allowed, retry_after = check(scope, key)
+                if not allowed:
+                    return throttled_response(retry_after)
+                return await view(request, *args, **kwargs)
+        else:
+            @wraps(view)
+            def wrapper(request, *args, **kwargs):
+                allowed, retry_after = check(scope, key_func(request))
+                if not allowed:
+                    return throttled_response(retry_after)
+                return view(request, *args, **kwargs)
+        return wrapper
+
+    return decorator
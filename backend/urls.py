@@ -16,6 +16,7 @@ urlpatterns = [
     path('api/chatbot/', include('chatbot.urls')),
     path('api/emergencies/', include('emergency.urls')),
     path('api/blotters/', include('blotter.urls')),
+    path('api/exports/', include('exports.urls')),
     path('export-report/', views.export_all_reports_excel, name='export_report'),
 
 ]
@@ -0,0 +1,18 @@
+"""
+Gunicorn worker class for the Procfile.
+
+Same as ``uvicorn_worker.UvicornWorker`` but pinned to the ``websockets``
+protocol implementation with permessage-deflate, so emergency report
+payloads (JSON, highly repetitive) go out compressed to clients that
+negotiate it, and with a small incoming queue per socket.
+"""
+from uvicorn_worker import UvicornWorker as BaseUvicornWorker
+
+
+class UvicornWorker(BaseUvicornWorker):
+    CONFIG_KWARGS = {
+        **BaseUvicornWorker.CONFIG_KWARGS,
+        "ws": "websockets",
+        "ws_per_message_deflate": True,
+        "ws_max_queue": 16,  # clients only send small control messages
+    }
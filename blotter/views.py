@@ -2,6 +2,7 @@ from rest_framework import viewsets, permissions
 from rest_framework.response import Response
 from .models import BlotterReport
 from .serializers import BlotterReportSerializer
+from accounts.permissions import get_role
 
 
 class BlotterReportViewSet(viewsets.ModelViewSet):
@@ -10,7 +11,7 @@ class BlotterReportViewSet(viewsets.ModelViewSet):
 
     def get_queryset(self):
         user = self.request.user
-        role = getattr(user.profile, 'role', None)  # safely get role from profile
+        role = get_role(user)  # read from the token claims, no Profile query
 
         # ✅ Admin and staff can see all blotter reports
         if role in ['admin', 'staff']:
@@ -36,9 +37,9 @@ class BlotterReportViewSet(viewsets.ModelViewSet):
     class OwnershipPermission(permissions.BasePermission):
         def has_object_permission(self, request, _view, obj):
             user = request.user
-            role = getattr(user.profile, 'role', None)
+            role = get_role(user)
             # ✅ Allow if owner, or admin/staff
-            return obj.filed_by == user or role in ['admin', 'staff']
+            return obj.filed_by_id == user.pk or role in ['admin', 'staff']
 
     def update(self, request, *args, **kwargs):
         partial = kwargs.pop('partial', False)
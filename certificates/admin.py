@@ -1,6 +1,7 @@
 from django.contrib import admin
-from .models import CertificateRequest, BusinessPermit
+from .models import CertificateRequest, CertificateSummary, BusinessPermit
 # Register your models here.
 
 admin.site.register(CertificateRequest)
 admin.site.register(BusinessPermit)
+admin.site.register(CertificateSummary)
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from certificates.models import CertificateRequest, CertificateCounter
+
+
+class Command(BaseCommand):
+    help = "Sync CertificateCounter rows with the highest request number already issued per certificate type."
+
+    def handle(self, *args, **options):
+        types = (
+            CertificateRequest.objects
+            .values_list('certificate_type', flat=True)
+            .distinct()
+            .order_by('certificate_type')
+        )
+        for certificate_type in types:
+            with transaction.atomic():
+                counter, _ = (
+                    CertificateCounter.objects
+                    .select_for_update()
+                    .get_or_create(certificate_type=certificate_type)
+                )
+                highest = CertificateCounter.highest_issued(certificate_type)
+                # Never move a counter backwards
+                if highest > counter.last_number:
+                    counter.last_number = highest
+                    counter.save(update_fields=['last_number'])
+            self.stdout.write(f"{certificate_type}: last_number={counter.last_number}")
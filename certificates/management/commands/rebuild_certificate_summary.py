@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from certificates.models import CertificateSummary
+
+
+class Command(BaseCommand):
+    help = "Recount CertificateSummary from the certificate requests (run after bulk updates or deletes)."
+
+    def handle(self, *args, **options):
+        CertificateSummary.rebuild()
+        for row in CertificateSummary.objects.order_by('certificate_type', 'status'):
+            self.stdout.write(f"{row.certificate_type} / {row.status}: {row.total}")
@@ -0,0 +1,39 @@
+# Generated by Django 5.2.7 on 2026-10-18 10:02
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def populate_summary(apps, schema_editor):
+    CertificateRequest = apps.get_model('certificates', 'CertificateRequest')
+    CertificateSummary = apps.get_model('certificates', 'CertificateSummary')
+    counts = (
+        CertificateRequest.objects
+        .values('certificate_type', 'status')
+        .annotate(total=Count('id'))
+        .order_by()
+    )
+    CertificateSummary.objects.bulk_create(CertificateSummary(**row) for row in counts)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('certificates', '0014_certificaterequest_business_name'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CertificateSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('certificate_type', models.CharField(max_length=50)),
+                ('status', models.CharField(max_length=20)),
+                ('total', models.IntegerField(default=0)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('certificate_type', 'status'), name='unique_certificate_summary')],
+            },
+        ),
+        migrations.RunPython(populate_summary, migrations.RunPython.noop),
+    ]
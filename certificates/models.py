@@ -1,7 +1,23 @@
 from django.db import IntegrityError, models, transaction
+from django.db.models import Count, F
 from django.utils import timezone
 from django.contrib.auth.models import User
 
+class CertificateRequestQuerySet(models.QuerySet):
+    def with_requester_age(self):
+        """
+        Annotate ``requester_birthdate`` and ``requester_age`` from the
+        requester's profile in the same query, so serializing N requests
+        doesn't cost 2N user/profile lookups.
+        """
+        from accounts.models import age_expression
+
+        return self.annotate(
+            requester_birthdate=F('user__profile__birthdate'),
+            requester_age=age_expression('user__profile__birthdate'),
+        )
+
+
 class CertificateRequest(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="certificate_requests", null=True)
     certificate_type = models.CharField(max_length=50)
@@ -28,6 +44,8 @@ class CertificateRequest(models.Model):
     )
     created_at = models.DateTimeField(default=timezone.now)
 
+    objects = CertificateRequestQuerySet.as_manager()
+
     CERTIFICATE_PREFIXES = {
     "Certificate of Residency": "CR",
     "Certificate of Indigency": "CI",
@@ -42,21 +60,8 @@ class CertificateRequest(models.Model):
     def save(self, *args, **kwargs):
         if not self.request_number:
             prefix = self.CERTIFICATE_PREFIXES.get(self.certificate_type, self.certificate_type[:2].upper())
-            with transaction.atomic():
-                existing_numbers = (
-                    CertificateRequest.objects
-                    .filter(certificate_type=self.certificate_type)
-                    .values_list('request_number', flat=True)
-                )
-                
-                numbers = []
-                for rn in existing_numbers:
-                    try:
-                        numbers.append(int(rn.split('-')[1]))
-                    except (IndexError, ValueError):
-                        continue
-                next_number = max(numbers, default=0) + 1
-                self.request_number = f"{prefix}-{next_number:03d}"
+            next_number = CertificateCounter.allocate(self.certificate_type)
+            self.request_number = f"{prefix}-{next_number:03d}"
         super().save(*args, **kwargs)
 
     def __str__(self):
@@ -78,6 +83,90 @@ class CertificateCounter(models.Model):
     certificate_type = models.CharField(max_length=50, unique=True)
     last_number = models.PositiveIntegerField(default=0)
 
+    @classmethod
+    def allocate(cls, certificate_type):
+        """
+        Reserve the next request number for ``certificate_type``.
+
+        The increment is a single ``UPDATE ... SET last_number = last_number + 1``,
+        which row-locks the counter until this short transaction commits, so
+        concurrent creates are serialized without scanning existing requests.
+        """
+        with transaction.atomic():
+            counters = cls.objects.filter(certificate_type=certificate_type)
+            if not counters.update(last_number=F('last_number') + 1):
+                try:
+                    with transaction.atomic():
+                        cls.objects.create(
+                            certificate_type=certificate_type,
+                            last_number=cls.highest_issued(certificate_type) + 1,
+                        )
+                except IntegrityError:
+                    # Another request created the counter first
+                    counters.update(last_number=F('last_number') + 1)
+            return counters.values_list('last_number', flat=True).get()
+
+    @staticmethod
+    def highest_issued(certificate_type):
+        """Highest number already used by requests of this type (full scan, used for seeding only)."""
+        numbers = []
+        existing_numbers = (
+            CertificateRequest.objects
+            .filter(certificate_type=certificate_type)
+            .values_list('request_number', flat=True)
+        )
+        for rn in existing_numbers:
+            try:
+                numbers.append(int(rn.split('-')[1]))
+            except (IndexError, ValueError):
+                continue
+        return max(numbers, default=0)
+
+class CertificateSummary(models.Model):
+    """
+    Running count of certificate requests per (type, status), kept up to date
+    by the signals in ``certificates.signals`` so analytics never scan
+    CertificateRequest.
+    """
+    certificate_type = models.CharField(max_length=50)
+    status = models.CharField(max_length=20)
+    total = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['certificate_type', 'status'], name='unique_certificate_summary'),
+        ]
+
+    def __str__(self):
+        return f"{self.certificate_type} / {self.status}: {self.total}"
+
+    @classmethod
+    def adjust(cls, certificate_type, status, delta):
+        rows = cls.objects.filter(certificate_type=certificate_type, status=status)
+        if rows.update(total=F('total') + delta):
+            return
+        try:
+            with transaction.atomic():
+                cls.objects.create(certificate_type=certificate_type, status=status, total=delta)
+        except IntegrityError:
+            rows.update(total=F('total') + delta)
+
+    @classmethod
+    def rebuild(cls):
+        """
+        Recount from scratch (after bulk updates/deletes, which skip signals);
+        ``manage.py rebuild_certificate_summary``.
+        """
+        counts = (
+            CertificateRequest.objects
+            .values('certificate_type', 'status')
+            .annotate(total=Count('id'))
+            .order_by()
+        )
+        with transaction.atomic():
+            cls.objects.all().delete()
+            cls.objects.bulk_create(cls(**row) for row in counts)
+
 class BusinessPermit(models.Model):
     STATUS_CHOICES = [
         ('pending', 'Pending'),
@@ -0,0 +1,33 @@
+from django.db.models.signals import post_init, post_save, post_delete
+from django.dispatch import receiver
+
+from .models import CertificateRequest, CertificateSummary
+
+
+def _summary_key(instance):
+    # Read from __dict__ so deferred fields don't trigger a query
+    return instance.__dict__.get('certificate_type'), instance.__dict__.get('status')
+
+
+@receiver(post_init, sender=CertificateRequest)
+def remember_summary_key(sender, instance, **kwargs):
+    instance._summary_key = _summary_key(instance) if instance.pk else None
+
+
+@receiver(post_save, sender=CertificateRequest)
+def update_summary_on_save(sender, instance, created, **kwargs):
+    old_key = getattr(instance, '_summary_key', None)
+    new_key = _summary_key(instance)
+    if not created and old_key == new_key:
+        return
+    if not created and old_key and None not in old_key:
+        CertificateSummary.adjust(*old_key, -1)
+    CertificateSummary.adjust(*new_key, 1)
+    instance._summary_key = new_key
+
+
+@receiver(post_delete, sender=CertificateRequest)
+def update_summary_on_delete(sender, instance, **kwargs):
+    key = getattr(instance, '_summary_key', None) or _summary_key(instance)
+    if None not in key:
+        CertificateSummary.adjust(*key, -1)
@@ -1,3 +1,171 @@
-from django.test import TestCase
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+from io import StringIO
 
-# Create your tests here.
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, TransactionTestCase, skipUnlessDBFeature
+from django.test.utils import CaptureQueriesContext
+
+from django.urls import reverse
+from django.utils import timezone
+
+from backend.testing import api_client_for, make_request, make_user
+from .models import CertificateRequest, CertificateCounter, CertificateSummary
+
+
+class RequestNumberAllocationTests(TestCase):
+    def test_numbers_are_sequential_per_type(self):
+        numbers = [make_request().request_number for _ in range(3)]
+        other = make_request("Certificate of Indigency").request_number
+
+        self.assertEqual(numbers, ["CR-001", "CR-002", "CR-003"])
+        self.assertEqual(other, "CI-001")
+        self.assertEqual(
+            CertificateCounter.objects.get(certificate_type="Certificate of Residency").last_number, 3
+        )
+
+    def test_new_counter_continues_after_existing_requests(self):
+        make_request(request_number="CR-041")
+
+        self.assertEqual(make_request().request_number, "CR-042")
+
+    def test_allocation_does_not_scan_existing_requests(self):
+        make_request()
+        with CaptureQueriesContext(connection) as ctx:
+            CertificateCounter.allocate("Certificate of Residency")
+
+        statements = [q["sql"] for q in ctx.captured_queries if "SAVEPOINT" not in q["sql"]]
+        self.assertEqual(len(statements), 2)  # UPDATE counter, SELECT last_number
+        self.assertFalse(any("certificates_certificaterequest" in sql for sql in statements))
+
+    def test_backfill_moves_counters_forward_only(self):
+        make_request()
+        make_request(request_number="CR-090")
+        CertificateCounter.objects.create(certificate_type="Certificate of Indigency", last_number=7)
+        make_request("Certificate of Indigency", request_number="CI-003")
+
+        call_command("backfill_certificate_counters", stdout=StringIO())
+
+        self.assertEqual(CertificateCounter.objects.get(certificate_type="Certificate of Residency").last_number, 90)
+        self.assertEqual(CertificateCounter.objects.get(certificate_type="Certificate of Indigency").last_number, 7)
+
+
+class CertificateAnalyticsTests(TestCase):
+    def summary(self):
+        return {
+            (row.certificate_type, row.status): row.total
+            for row in CertificateSummary.objects.filter(total__gt=0)
+        }
+
+    def test_summary_follows_creates_status_changes_and_deletes(self):
+        first = make_request()
+        make_request()
+        make_request("Certificate of Indigency")
+
+        first.status = "approved"
+        first.save()
+        CertificateRequest.objects.get(request_number="CI-001").delete()
+
+        self.assertEqual(self.summary(), {
+            ("Certificate of Residency", "pending"): 1,
+            ("Certificate of Residency", "approved"): 1,
+        })
+
+    def test_rebuild_command_recounts_after_bulk_changes(self):
+        make_request()
+        make_request()
+        make_request("Certificate of Indigency")
+        CertificateRequest.objects.filter(certificate_type="Certificate of Residency").update(status="approved")
+        CertificateRequest.objects.filter(certificate_type="Certificate of Indigency").delete()
+        self.assertEqual(self.summary()[("Certificate of Residency", "pending")], 2)  # signals skipped
+
+        out = StringIO()
+        call_command("rebuild_certificate_summary", stdout=out)
+
+        self.assertEqual(self.summary(), {("Certificate of Residency", "approved"): 2})
+        self.assertIn("Certificate of Residency / approved: 2", out.getvalue())
+
+    def test_analytics_endpoint(self):
+        today = timezone.localdate()
+        admin = make_user("admin", role="admin")
+        older = make_user("older", birthdate=date(today.year - 40, 1, 1))
+        younger = make_user("younger", birthdate=date(today.year - 20, 1, 1))
+        make_request(user=older)
+        make_request(user=younger, status="approved")
+        make_request("Certificate of Indigency")
+
+        response = api_client_for(admin).get(reverse("certificate-analytics"))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["total_certificates"], 3)
+        self.assertEqual(response.data["by_type"][0], {"certificate_type": "Certificate of Residency", "total": 2})
+        self.assertEqual(
+            [(row["certificate_type"], float(row["average_age"])) for row in response.data["average_age_per_type"]],
+            [("Certificate of Residency", 30.0)],
+        )
+
+    def test_analytics_is_staff_only(self):
+        response = api_client_for(make_user("resident")).get(reverse("certificate-analytics"))
+
+        self.assertEqual(response.status_code, 403)
+
+
+class CertificateListQueryTests(TestCase):
+    def test_list_query_count_does_not_grow_with_rows(self):
+        admin = make_user("admin", role="admin")
+        requesters = [make_user(f"resident{i}") for i in range(10)]
+        CertificateRequest.objects.bulk_create(
+            CertificateRequest(
+                user=requesters[i % len(requesters)],
+                certificate_type="Certificate of Residency",
+                request_number=f"CR-{i + 1:03d}",
+                first_name="Juan",
+                last_name="Dela Cruz",
+                complete_address="Sindalan",
+                contact_number="09170000000",
+                email_address="juan@example.com",
+                purpose="Employment",
+                agree_terms=True,
+            )
+            for i in range(500)
+        )
+        client = api_client_for(admin)
+
+        with self.assertNumQueries(2):  # COUNT for the paginator + one SELECT with the profile join
+            response = client.get(reverse("certificate-list"), {"page_size": 500})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["count"], 500)
+        self.assertEqual(len(response.data["results"]), 500)
+        self.assertEqual(response.data["results"][0]["user_birthdate"], "1990-01-01")
+        self.assertIsNotNone(response.data["results"][0]["user_age"])
+
+    def test_list_is_paginated(self):
+        user = make_user("resident")
+        for _ in range(3):
+            make_request(user=user)
+
+        response = api_client_for(user).get(reverse("certificate-list"), {"page_size": 2})
+
+        self.assertEqual(response.data["count"], 3)
+        self.assertEqual(len(response.data["results"]), 2)
+        self.assertIsNotNone(response.data["next"])
+
+
+@skipUnlessDBFeature("has_select_for_update")
+class ConcurrentRequestNumberTests(TransactionTestCase):
+    # Needs a database with real row locks (PostgreSQL); SQLite serializes writers anyway
+
+    def test_parallel_creates_get_unique_contiguous_numbers(self):
+        def create(_):
+            try:
+                return make_request().request_number
+            finally:
+                connection.close()
+
+        with ThreadPoolExecutor(max_workers=32) as pool:
+            numbers = list(pool.map(create, range(300)))
+
+        self.assertEqual(len(set(numbers)), 300)
+        self.assertEqual(sorted(numbers), [f"CR-{n:03d}" for n in range(1, 301)])
@@ -6,7 +6,8 @@ from .views import (
     CertificateRequestUpdateView,
     CertificateRequestDeleteView,
     BusinessPermitListCreateView,
-    BusinessPermitRetrieveUpdateDestroyView
+    BusinessPermitRetrieveUpdateDestroyView,
+    CertificateAnalyticsView,
 )
 
 urlpatterns = [
@@ -15,6 +16,7 @@ urlpatterns = [
     path('<int:id>/', CertificateRequestDetailView.as_view(), name='certificate-detail'),  # GET /api/certificates/4/
     path('edit/<int:id>/', CertificateRequestUpdateView.as_view(), name='certificate-edit'),  # PUT /api/certificates/edit/4/
     path('delete/<int:id>/', CertificateRequestDeleteView.as_view(), name='certificate-delete'),  # DELETE /api/certificates/delete/4/
+    path('analytics/', CertificateAnalyticsView.as_view(), name='certificate-analytics'),  # GET /api/certificates/analytics/
     path('business-permits/', BusinessPermitListCreateView.as_view(), name='business-permit-list-create'),
     path('business-permits/<int:pk>/', BusinessPermitRetrieveUpdateDestroyView.as_view(), name='business-permit-detail'),
 ]
@@ -1,22 +1,36 @@
-from rest_framework import generics, permissions
-from .models import CertificateRequest, BusinessPermit
+from rest_framework import generics, permissions, status
+from rest_framework.response import Response
+from rest_framework.views import APIView
+from rest_framework.pagination import PageNumberPagination
+from django.db.models import Avg
+from .models import CertificateRequest, CertificateSummary, BusinessPermit
 from .serializers import CertificateRequestSerializer, BusinessPermitSerializer
+from accounts.models import age_expression
+from accounts.permissions import get_role, is_admin_or_staff
 import logging
 
 logger = logging.getLogger(__name__)
 
+class CertificatePagination(PageNumberPagination):
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 500
+
+
 class CertificateRequestListView(generics.ListAPIView):
     serializer_class = CertificateRequestSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = CertificatePagination
 
     def get_queryset(self):
         user = self.request.user
         if user.is_authenticated:
-            # Check the role from the profile model
-            if hasattr(user, 'profile') and user.profile.role == 'admin':
-                return CertificateRequest.objects.all()
+            queryset = CertificateRequest.objects.with_requester_age().order_by('-created_at', '-id')
+            # Role comes from the token claims
+            if get_role(user) == 'admin':
+                return queryset
             else:
-                return CertificateRequest.objects.filter(user=user)
+                return queryset.filter(user=user)
         return CertificateRequest.objects.none()
 
 class CertificateRequestCreateView(generics.CreateAPIView):
@@ -32,8 +46,9 @@ class CertificateRequestDetailView(generics.RetrieveAPIView):
     lookup_field = 'id'
 
     def get_queryset(self):
-        queryset = CertificateRequest.objects.filter(user=self.request.user)
-        logger.debug(f"Detail View - User: {self.request.user}, Queryset: {queryset.values('id', 'request_number')}")
+        queryset = CertificateRequest.objects.with_requester_age().filter(user=self.request.user)
+        # Lazy args: the queryset is only evaluated if debug logging is on
+        logger.debug("Detail View - User: %s, Queryset: %s", self.request.user, queryset.values('id', 'request_number'))
         return queryset
 
 class CertificateRequestUpdateView(generics.UpdateAPIView):
@@ -43,8 +58,8 @@ class CertificateRequestUpdateView(generics.UpdateAPIView):
 
     def get_queryset(self):
 
-        queryset = CertificateRequest.objects.all()
-        logger.debug(f"Authenticated User: {self.request.user}, Full Queryset: {queryset.values('id', 'request_number')}")
+        queryset = CertificateRequest.objects.with_requester_age()
+        logger.debug("Authenticated User: %s, Full Queryset: %s", self.request.user, queryset.values('id', 'request_number'))
         return queryset
     
     def patch(self, request, *args, **kwargs):
@@ -59,7 +74,7 @@ class CertificateRequestDeleteView(generics.DestroyAPIView):
 
     def get_queryset(self):
         user = self.request.user
-        role = getattr(user.profile, "role", None)
+        role = get_role(user)
 
         if role == "admin":
             return CertificateRequest.objects.all()
@@ -72,7 +87,7 @@ class BusinessPermitListCreateView(generics.ListCreateAPIView):
 
     def get_queryset(self):
         user = self.request.user
-        role = getattr(user.profile, "role", None)
+        role = get_role(user)
 
         logger.debug(f"[BusinessPermitListCreateView] User: {user.username} | Role: {role}")
 
@@ -94,7 +109,7 @@ class BusinessPermitRetrieveUpdateDestroyView(generics.RetrieveUpdateDestroyAPIV
 
     def get_queryset(self):
         user = self.request.user
-        role = getattr(user.profile, "role", None)
+        role = get_role(user)
 
         logger.debug(f"[BusinessPermitRetrieveUpdateDestroyView] User: {user.username} | Role: {role}")
 
@@ -102,3 +117,43 @@ class BusinessPermitRetrieveUpdateDestroyView(generics.RetrieveUpdateDestroyAPIV
             return BusinessPermit.objects.all()
 
         return BusinessPermit.objects.filter(user=user)
+
+
+class CertificateAnalyticsView(APIView):
+    """
+    Returns aggregated statistics and analytics for CertificateRequest.
+    Counts come from the CertificateSummary table; average age is one SQL
+    aggregate over the requesters' Profile.birthdate.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request):
+        if not is_admin_or_staff(request.user):
+            return Response(
+                {"detail": "Forbidden: Only admin or staff can view certificate analytics."},
+                status=status.HTTP_403_FORBIDDEN
+            )
+
+        per_type = {}
+        per_status = {}
+        for row in CertificateSummary.objects.filter(total__gt=0).values('certificate_type', 'status', 'total'):
+            per_type[row['certificate_type']] = per_type.get(row['certificate_type'], 0) + row['total']
+            per_status[row['status']] = per_status.get(row['status'], 0) + row['total']
+
+        age_data = (
+            CertificateRequest.objects
+            .filter(user__profile__birthdate__isnull=False)
+            .values('certificate_type')
+            .annotate(average_age=Avg(age_expression('user__profile__birthdate')))
+            .order_by('certificate_type')
+        )
+
+        return Response({
+            'total_certificates': sum(per_type.values()),
+            'by_type': [
+                {'certificate_type': t, 'total': n}
+                for t, n in sorted(per_type.items(), key=lambda item: -item[1])
+            ],
+            'by_status': [{'status': s, 'total': n} for s, n in per_status.items()],
+            'average_age_per_type': list(age_data),
+        })
@@ -0,0 +1,206 @@
+"""
+In-process cache of chatbot answers, keyed by a normalized question.
+
+Residents ask the same FAQ questions in slightly different words, so the key
+folds case, accents, punctuation and whitespace and drops English/Tagalog
+fillers: "Ano po ang requirements sa barangay clearance?" and "What are the
+requirements for a barangay clearance" share one entry. Other question
+words, negations and tense stay in the key (Tagalog ones spelled in
+English), so "Magkano ang barangay clearance?" and "Where is the barangay
+clearance?" do not. Lookups are a dict hit.
+With fuzzy matching on, a miss falls back to character-trigram similarity
+against the cached keys (via an inverted trigram index, not a full scan).
+
+Entries expire after ``CHATBOT_CACHE_TTL`` seconds and the least recently
+used one is evicted past ``CHATBOT_CACHE_MAX_ENTRIES``. ``invalidate()`` bumps
+a generation number in Django's cache, so every worker process drops its
+entries within ``GENERATION_CHECK_INTERVAL`` seconds: the async views await
+``arefresh()`` before using the cache, which reads the generation with
+``cache.aget``. ``get()`` and ``set()`` never leave the process.
+"""
+import re
+import threading
+import time
+import unicodedata
+from collections import Counter, OrderedDict
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+
+GENERATION_KEY = 'chatbot-answer-cache-generation'
+GENERATION_CHECK_INTERVAL = 1.0
+
+STOPWORDS = frozenset("""
+    a an the and or but if of to in on at by for with from about as into is are be been being am
+    do does have has i me my we our you your he she it its they them their this that these those
+    what can could would should shall might must please pls thanks thank hi hello there here just
+    also any some
+    ang ng nang mga sa si sina ni nina kay kina ay at o pero kung na pa po ho ba bang din rin lang
+    naman nga kasi daw raw yung iyong ito iyan iyon dito diyan doon ako ko akin ikaw ka mo iyo
+    siya niya kanya kami kita tayo natin namin kayo ninyo sila nila kanila ano oo opo salamat
+""".split())
+
+# What the question asks, so kept in the key; Tagalog spelled the English way. "What"
+# is dropped above: "What is X?" asks the same as "X?"
+INTENT_WORDS = {
+    'alin': 'which', 'sino': 'who', 'whom': 'who', 'paano': 'how', 'magkano': 'how much',
+    'kailan': 'when', 'saan': 'where', 'bakit': 'why', 'mayroon': 'may', 'meron': 'may',
+}
+INTENT_WORDS.update((word, word) for word in """
+    which who how when where why not no may wala hindi was were did had will
+""".split())
+
+_non_word = re.compile(r"[^\w\s]+")
+
+
+def normalize(question):
+    """Canonical cache key for ``question``; empty if nothing meaningful is left."""
+    text = unicodedata.normalize('NFKD', question.casefold())
+    text = ''.join(ch for ch in text if not unicodedata.combining(ch))
+    words = _non_word.sub(' ', text).split()
+    return ' '.join(INTENT_WORDS.get(word, word) for word in words if word not in STOPWORDS)
+
+
+def trigrams(key):
+    padded = f"  {key} "
+    return frozenset(padded[i:i + 3] for i in range(len(padded) - 2))
+
+
+class AnswerCache:
+    def __init__(self, max_entries=512, ttl=3600, fuzzy_threshold=0.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.fuzzy_threshold = fuzzy_threshold
+        self._entries = OrderedDict()  # key -> (answer, expires_at, trigrams); oldest use first
+        self._index = {}  # trigram -> set of keys
+        self._lock = threading.Lock()
+        self._generation = None
+        self._generation_checked = 0.0
+        self.hits = self.fuzzy_hits = self.misses = self.evictions = 0
+
+    def get(self, question):
+        key = normalize(question)
+        if not key:
+            return None
+        now = time.monotonic()
+        with self._lock:
+            answer = self._lookup(key, now)
+            if answer is not None:
+                self.hits += 1
+                return answer
+            if self.fuzzy_threshold > 0:
+                match = self._closest(key)
+                if match is not None:
+                    answer = self._lookup(match, now)
+                    if answer is not None:
+                        self.fuzzy_hits += 1
+                        return answer
+            self.misses += 1
+            return None
+
+    def set(self, question, answer):
+        key = normalize(question)
+        if not key:
+            return
+        now = time.monotonic()
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            grams = trigrams(key)
+            self._entries[key] = (answer, now + self.ttl, grams)
+            for gram in grams:
+                self._index.setdefault(gram, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._index.clear()
+
+    def invalidate(self):
+        """Drop every entry here and, via the shared generation, in every other worker."""
+        try:
+            generation = cache.incr(GENERATION_KEY)
+        except ValueError:
+            cache.add(GENERATION_KEY, 1, timeout=None)
+            generation = cache.incr(GENERATION_KEY)
+        self.clear()
+        self._generation = generation
+
+    async def arefresh(self):
+        """Drop the entries if another worker invalidated them (checked at most once an interval)."""
+        now = time.monotonic()
+        if now - self._generation_checked < GENERATION_CHECK_INTERVAL:
+            return
+        self._generation_checked = now
+        generation = await cache.aget(GENERATION_KEY)
+        if generation != self._generation:
+            if self._generation is not None:
+                self.clear()
+            self._generation = generation
+
+    def stats(self):
+        lookups = self.hits + self.fuzzy_hits + self.misses
+        return {
+            'entries': len(self._entries),
+            'hits': self.hits,
+            'fuzzy_hits': self.fuzzy_hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_rate': round((self.hits + self.fuzzy_hits) / lookups, 4) if lookups else 0.0,
+        }
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _lookup(self, key, now):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry[1] <= now:
+            self._remove(key)
+            return None
+        self._entries.move_to_end(key)
+        return entry[0]
+
+    def _closest(self, key):
+        grams = trigrams(key)
+        shared = Counter()
+        for gram in grams:
+            shared.update(self._index.get(gram, ()))
+        best, best_score = None, self.fuzzy_threshold
+        for candidate, overlap in shared.items():
+            # Jaccard similarity of the two trigram sets
+            score = overlap / (len(grams) + len(self._entries[candidate][2]) - overlap)
+            if score >= best_score:
+                best, best_score = candidate, score
+        return best
+
+    def _remove(self, key):
+        _, _, grams = self._entries.pop(key)
+        for gram in grams:
+            keys = self._index.get(gram)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._index[gram]
+
+
+@lru_cache(maxsize=None)
+def get_answer_cache():
+    return AnswerCache(
+        max_entries=settings.CHATBOT_CACHE_MAX_ENTRIES,
+        ttl=settings.CHATBOT_CACHE_TTL,
+        fuzzy_threshold=settings.CHATBOT_CACHE_FUZZY_THRESHOLD,
+    )
+
+
+@receiver(setting_changed)
+def _reset_cache(setting, **kwargs):
+    if setting.startswith('CHATBOT_CACHE_'):
+        get_answer_cache.cache_clear()
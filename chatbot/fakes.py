@@ -0,0 +1,61 @@
+"""
+Local stand-in for the completions API, for tests and benchmarks.
+
+``fake_completions_transport()`` returns an ``httpx.MockTransport`` that
+answers both plain and ``stream: true`` chat completion requests, with
+configurable time-to-first-token and per-token delay::
+
+    llm.use_transport(fake_completions_transport("Bukas po kami 8AM-5PM."))
+"""
+import asyncio
+import json
+
+import httpx
+
+
+def fake_completions_transport(reply=None, first_token_delay=0.0, token_delay=0.0, calls=None):
+    """
+    ``reply`` is a string, or a callable taking the request payload and
+    returning one (default: echo the question). Each word is one streamed
+    token. Request payloads are appended to ``calls`` if given.
+    """
+
+    def reply_for(payload):
+        if callable(reply):
+            return reply(payload)
+        if reply is not None:
+            return reply
+        return f"Sagot sa: {payload['messages'][-1]['content']}"
+
+    async def handler(request):
+        payload = json.loads(request.content)
+        if calls is not None:
+            calls.append(payload)
+        text = reply_for(payload)
+        tokens = [word + " " for word in text.split(" ")]
+        tokens[-1] = tokens[-1][:-1]
+        usage = {
+            "prompt_tokens": sum(len(m["content"].split()) for m in payload["messages"]),
+            "completion_tokens": len(tokens),
+        }
+
+        if not payload.get("stream"):
+            await asyncio.sleep(first_token_delay + token_delay * len(tokens))
+            return httpx.Response(200, json={
+                "choices": [{"message": {"role": "assistant", "content": text}}],
+                "usage": usage,
+            })
+
+        async def events():
+            await asyncio.sleep(first_token_delay)
+            for i, token in enumerate(tokens):
+                if i and token_delay:
+                    await asyncio.sleep(token_delay)
+                chunk = {"choices": [{"index": 0, "delta": {"content": token}}]}
+                yield f"data: {json.dumps(chunk)}\n\n".encode()
+            yield f"data: {json.dumps({'choices': [], 'usage': usage})}\n\n".encode()
+            yield b"data: [DONE]\n\n"
+
+        return httpx.Response(200, headers={"content-type": "text/event-stream"}, content=events())
+
+    return httpx.MockTransport(handler)
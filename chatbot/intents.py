@@ -0,0 +1,143 @@
+"""
+Reference-number status lookups, answered from the database without the LLM.
+
+"Ano na status ng CM-2025-000123?" or "approved na ba CR-014?" cannot be
+answered by the model, so ``answer()`` recognizes the reference formats the
+apps generate and replies from a single indexed lookup:
+
+    CM-YYYY-NNNNNN       Complaint.reference_number (unique)
+    CR-/CI-/BC-NNN       CertificateRequest.request_number (unique)
+    blotter #N           BlotterReport.report_number (primary key)
+
+Only the owner of a record (or admin/staff) is told its status; everyone
+else gets the same "not found" reply, so reference numbers can't be probed.
+"""
+import re
+from dataclasses import dataclass
+
+from asgiref.sync import sync_to_async
+from rest_framework.exceptions import AuthenticationFailed
+
+from accounts.authentication import ClaimsJWTAuthentication
+from accounts.permissions import is_admin_or_staff
+from blotter.models import BlotterReport
+from certificates.models import CertificateRequest
+from complaints.models import Complaint
+
+COMPLAINT_PATTERN = re.compile(r'\bCM-(\d{4})-(\d{1,6})\b', re.IGNORECASE)
+CERTIFICATE_PATTERN = re.compile(
+    r'\b(%s)-?(\d{1,6})\b' % '|'.join(sorted(set(CertificateRequest.CERTIFICATE_PREFIXES.values()))),
+    re.IGNORECASE,
+)
+BLOTTER_PATTERN = re.compile(
+    r'\bblotter(?:\s+(?:report|case))?\s*(?:no\.?|number|num\.?)?\s*#?\s*(\d{1,9})\b',
+    re.IGNORECASE,
+)
+
+NOT_FOUND = (
+    "I couldn't find {label} {reference} under your account. "
+    "Please check the number, and make sure you are logged in with the account that filed it."
+)
+
+
+@dataclass(frozen=True)
+class Lookup:
+    kind: str
+    label: str
+    reference: str
+
+
+def match(message):
+    """The first reference number in ``message`` as a ``Lookup``, or None."""
+    found = COMPLAINT_PATTERN.search(message)
+    if found:
+        year, number = found.groups()
+        return Lookup('complaint', "complaint", f"CM-{year}-{int(number):06d}")
+    found = CERTIFICATE_PATTERN.search(message)
+    if found:
+        prefix, number = found.groups()
+        return Lookup('certificate', "certificate request", f"{prefix.upper()}-{int(number):03d}")
+    found = BLOTTER_PATTERN.search(message)
+    if found:
+        return Lookup('blotter', "blotter report", f"#{int(found.group(1))}")
+    return None
+
+
+def status_label(value, choices=None):
+    return dict(choices or ()).get(value) or value.replace('_', ' ').capitalize()
+
+
+def fetch(lookup):
+    """``(owner_id, reply)`` for the record behind ``lookup``, or None."""
+    if lookup.kind == 'complaint':
+        row = (
+            Complaint.objects.filter(reference_number=lookup.reference)
+            .values('user_id', 'status', 'subject').first()
+        )
+        if row:
+            return row['user_id'], (
+                f"Your complaint {lookup.reference} (\"{row['subject']}\") is currently "
+                f"{status_label(row['status'])}."
+            )
+    elif lookup.kind == 'certificate':
+        row = (
+            CertificateRequest.objects.filter(request_number=lookup.reference)
+            .values('user_id', 'status', 'certificate_type').first()
+        )
+        if row:
+            status_field = CertificateRequest._meta.get_field('status')
+            return row['user_id'], (
+                f"Your {row['certificate_type']} request {lookup.reference} is currently "
+                f"{status_label(row['status'], status_field.choices)}."
+            )
+    elif lookup.kind == 'blotter':
+        row = (
+            BlotterReport.objects.filter(pk=int(lookup.reference[1:]))
+            .values('filed_by_id', 'status', 'incident_type').first()
+        )
+        if row:
+            return row['filed_by_id'], (
+                f"Blotter report {lookup.reference} ({row['incident_type']}) is currently "
+                f"{status_label(row['status'], BlotterReport.STATUS_CHOICES)}."
+            )
+    return None
+
+
+def authenticated_user(request):
+    """
+    The JWT user of ``request`` (claims only, no DB hit for current tokens), or
+    None. Resolved once per request and remembered on it. Sync: older tokens
+    load the user and the revocation check may go to Redis, so async views
+    call it through ``sync_to_async``.
+    """
+    if not hasattr(request, '_chatbot_user'):
+        try:
+            result = ClaimsJWTAuthentication().authenticate(request)
+        except AuthenticationFailed:
+            result = None
+        request._chatbot_user = result[0] if result else None
+    return request._chatbot_user
+
+
+def lookup_reply(lookup, request):
+    user = authenticated_user(request)
+    if user is None:
+        return NOT_FOUND.format(label=lookup.label, reference=lookup.reference)
+    found = fetch(lookup)
+    if found is None:
+        return NOT_FOUND.format(label=lookup.label, reference=lookup.reference)
+    owner_id, reply = found
+    if owner_id != user.pk and not is_admin_or_staff(user):
+        return NOT_FOUND.format(label=lookup.label, reference=lookup.reference)
+    return reply
+
+
+async def answer(message, request):
+    """
+    ``(kind, reply)`` if ``message`` asks about a reference number, else None
+    (the question goes on to the answer cache / LLM).
+    """
+    lookup = match(message)
+    if lookup is None:
+        return None
+    return lookup.kind, await sync_to_async(lookup_reply)(lookup, request)
@@ -0,0 +1,94 @@
+"""
+Chatbot entry points to the language model: prompt building, plus
+``complete()`` / ``stream()`` routed through the providers configured in
+``CHATBOT_PROVIDERS`` (see ``chatbot.providers`` for failover, hedging,
+circuit breaking and request coalescing).
+"""
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
+
+from .providers import (  # noqa: F401 (re-exported for views/tests)
+    LLMBusy,
+    LLMError,
+    LLMTimeout,
+    LLMUnavailable,
+    OpenAICompatibleProvider,
+    ProviderRouter,
+)
+
+SYSTEM_PROMPT = (
+    "You are a helpful Barangay Official of Barangay Sindalan. "
+    "If asked about a person or topic you don't have information on, "
+    "please respond politely that you don't have that information instead of guessing."
+    "Answer only about government services, complaints, permits, announcements, and community events."
+)
+
+# Overrides the network transport of HTTP providers (benchmarks, tests)
+_transport = None
+
+
+def use_transport(transport):
+    """Route HTTP providers through ``transport`` (e.g. ``httpx.MockTransport``); None restores the network."""
+    global _transport
+    _transport = transport
+    get_router.cache_clear()
+
+
+def build_provider(config):
+    options = {key.lower(): value for key, value in config.items() if key != 'BACKEND'}
+    provider = import_string(config['BACKEND'])(**options)
+    if isinstance(provider, OpenAICompatibleProvider) and _transport is not None:
+        provider.transport = _transport
+    return provider
+
+
+@lru_cache(maxsize=None)
+def get_router():
+    return ProviderRouter(
+        [build_provider(config) for config in settings.CHATBOT_PROVIDERS],
+        hedge_after=settings.CHATBOT_HEDGE_AFTER,
+    )
+
+
+def build_messages(user_message, context=(), history=()):
+    """
+    Chat payload for ``user_message``. ``context`` snippets are given to the
+    model as reference; ``history`` is earlier messages of the conversation.
+    """
+    messages = [{"role": "system", "content": SYSTEM_PROMPT}]
+    if context:
+        messages.append({
+            "role": "system",
+            "content": "Current barangay announcements (use them if relevant, do not invent others):\n"
+                       + "\n".join(f"- {snippet}" for snippet in context),
+        })
+    messages.extend(history)
+    messages.append({"role": "user", "content": user_message})
+    return messages
+
+
+async def complete(messages, temperature=0.7, usage=None):
+    """
+    Reply text for ``messages``. Token counts are written into the ``usage``
+    dict, if given.
+    """
+    return await get_router().complete(messages, temperature, usage)
+
+
+def stream(messages, temperature=0.7, usage=None):
+    """
+    Async iterator over the reply to ``messages``, piece by piece as the
+    provider generates it. Token counts, when the provider reports them, are
+    written into the ``usage`` dict.
+    """
+    return get_router().stream(messages, temperature, usage)
+
+
+@receiver(setting_changed)
+def _reset_router(setting, **kwargs):
+    if setting.startswith('CHATBOT_'):
+        get_router.cache_clear()
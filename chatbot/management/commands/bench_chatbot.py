@@ -0,0 +1,112 @@
+import asyncio
+import json
+import time
+
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.test.utils import override_settings
+
+from backend.benchmarks import isolated_database, percentile, format_ms
+from chatbot import llm
+from chatbot.fakes import fake_completions_transport
+from chatbot.message_log import get_chat_log
+
+REPLY = (
+    "Para sa barangay clearance, magdala po ng valid ID, cedula, at proof of residency. "
+    "Pumunta sa barangay hall mula Lunes hanggang Biyernes, 8AM hanggang 5PM, at magbayad ng 50 piso."
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Fire concurrent questions at the chatbot through the project's ASGI application, "
+        "against a local fake of the completions API (throwaway test DB)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=500)
+        parser.add_argument('--concurrency', type=int, default=200)
+        parser.add_argument('--first-token', type=float, default=0.3, help="Fake time to first token, seconds")
+        parser.add_argument('--token-delay', type=float, default=0.02, help="Fake delay between tokens, seconds")
+        parser.add_argument('--stream', action='store_true', help="Use the SSE endpoint instead of query/")
+
+    def handle(self, *args, **options):
+        path = '/api/chatbot/stream/' if options['stream'] else '/api/chatbot/query/'
+        llm.use_transport(fake_completions_transport(REPLY, options['first_token'], options['token_delay']))
+        try:
+            # Exact-match cache only: the numbered questions must all miss; no rate limit on the one bench IP
+            with override_settings(
+                CHATBOT_CACHE_FUZZY_THRESHOLD=0, THROTTLE_RATES={**settings.THROTTLE_RATES, 'chatbot': None},
+            ), isolated_database():
+                results, elapsed = (
+                    # async_to_sync keeps thread-sensitive ORM calls on this thread's test DB connection
+                    async_to_sync(self.run)(path, options['requests'], options['concurrency'])
+                )
+                chat_log = get_chat_log()
+                chat_log.close()
+        finally:
+            llm.use_transport(None)
+
+        statuses = [status for status, _, _ in results]
+        first_bytes = [first for _, first, _ in results]
+        totals = [total for _, _, total in results]
+        ok = statuses.count(200)
+        self.stdout.write(
+            f"{path}: {len(results)} requests, concurrency {options['concurrency']}\n"
+            f"  wall {elapsed:.2f} s, {len(results) / elapsed:.1f} req/s, {ok} OK, {len(statuses) - ok} errors\n"
+            f"  first byte p50 {format_ms(percentile(first_bytes, 50))}, p95 {format_ms(percentile(first_bytes, 95))}\n"
+            f"  complete   p50 {format_ms(percentile(totals, 50))}, p95 {format_ms(percentile(totals, 95))}, "
+            f"p99 {format_ms(percentile(totals, 99))}\n"
+            f"  exchanges logged {chat_log.written}, dropped {chat_log.dropped}"
+        )
+
+    async def run(self, path, total, concurrency):
+        from backend.asgi import application
+
+        gate = asyncio.Semaphore(concurrency)
+        results = []
+
+        async def ask(i):
+            async with gate:
+                results.append(await post_json(application, path, {
+                    "message": f"Paano kumuha ng barangay clearance? #{i}",
+                }))
+
+        started = time.perf_counter()
+        await asyncio.gather(*(ask(i) for i in range(total)))
+        return results, time.perf_counter() - started
+
+
+async def post_json(application, path, payload):
+    """
+    Drive one HTTP request through an ASGI app, as a server would. Returns
+    (status, seconds to first body bytes, seconds to end of response).
+    """
+    body = json.dumps(payload).encode()
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1",
+        "method": "POST", "scheme": "http", "path": path, "raw_path": path.encode(), "query_string": b"",
+        "headers": [(b"host", b"localhost"), (b"content-type", b"application/json")],
+        "client": ("127.0.0.1", 0), "server": ("localhost", 80),
+    }
+    started = time.perf_counter()
+    sent = False
+    status = first_byte = None
+
+    async def receive():
+        nonlocal sent
+        if not sent:
+            sent = True
+            return {"type": "http.request", "body": body, "more_body": False}
+        await asyncio.Event().wait()  # never disconnects
+
+    async def send(message):
+        nonlocal status, first_byte
+        if message["type"] == "http.response.start":
+            status = message["status"]
+        elif message["type"] == "http.response.body" and message.get("body") and first_byte is None:
+            first_byte = time.perf_counter() - started
+
+    await application(scope, receive, send)
+    return status, first_byte or 0.0, time.perf_counter() - started
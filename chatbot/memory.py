@@ -0,0 +1,151 @@
+"""
+Per-conversation chat memory with a hard token budget.
+
+A conversation is the list of recent (question, reply) turns plus a short
+summary of older ones, stored in Django's cache (Redis in prod) under the
+client's ``conversation_id`` and expiring after ``CHATBOT_MEMORY_TTL``
+seconds of inactivity. Keys are namespaced by the requester (the JWT user,
+or a signed guest cookie), so a leaked or guessed ``conversation_id`` does
+not reveal someone else's history.
+
+When the turns exceed ``CHATBOT_MEMORY_TOKEN_BUDGET`` the oldest are folded
+into the summary, which keeps only the most recent topics within
+``CHATBOT_MEMORY_SUMMARY_TOKENS``; a newest turn that is over the budget on
+its own is cut down. The history sent with each prompt is therefore bounded
+no matter how long the conversation runs. Token counts are estimated
+(~4 characters a token).
+"""
+import math
+import re
+import uuid
+from dataclasses import dataclass, field
+
+from django.conf import settings
+from django.core import signing
+from django.core.cache import cache
+
+KEY_PREFIX = 'chatbot-conversation:'
+GUEST_COOKIE = 'chatbot_guest'
+GUEST_COOKIE_SALT = 'chatbot.memory.guest'
+CONVERSATION_ID_PATTERN = re.compile(r'^[A-Za-z0-9_-]{8,64}$')
+# Longer replies are stored cut down; the model only needs the gist to follow up
+MAX_STORED_REPLY_CHARS = 600
+SUMMARY_TOPIC_CHARS = 80
+
+
+def estimate_tokens(text):
+    return math.ceil(len(text) / 4)
+
+
+def clip(text, max_chars):
+    if len(text) <= max_chars:
+        return text
+    if max_chars <= 0:
+        return ''
+    return text[:max_chars - 1].rstrip() + "…"
+
+
+def new_conversation_id():
+    return uuid.uuid4().hex
+
+
+def valid_conversation_id(value):
+    return isinstance(value, str) and bool(CONVERSATION_ID_PATTERN.match(value))
+
+
+def owner_for(request, user):
+    """
+    ``(owner, new_guest_id)``: the namespace of ``request``'s conversations.
+    Signed-in users own theirs by user id; guests by a random id kept in a
+    signed session cookie. ``new_guest_id`` is set when the guest had no valid
+    cookie yet and the response must send one (see ``set_guest_cookie``).
+    """
+    if user is not None:
+        return f'user:{user.pk}', None
+    try:
+        guest_id = request.get_signed_cookie(GUEST_COOKIE, salt=GUEST_COOKIE_SALT)
+    except (KeyError, signing.BadSignature):
+        guest_id = None
+    if guest_id and valid_conversation_id(guest_id):
+        return f'guest:{guest_id}', None
+    guest_id = new_conversation_id()
+    return f'guest:{guest_id}', guest_id
+
+
+def set_guest_cookie(response, guest_id):
+    if guest_id:
+        # No max_age: a browser-session cookie, like the memory it unlocks
+        response.set_signed_cookie(
+            GUEST_COOKIE, guest_id, salt=GUEST_COOKIE_SALT,
+            httponly=True, secure=not settings.DEBUG, samesite='Lax',
+        )
+    return response
+
+
+@dataclass
+class Conversation:
+    id: str
+    owner: str
+    turns: list = field(default_factory=list)  # [question, reply] pairs, oldest first
+    topics: list = field(default_factory=list)  # questions of turns folded out of ``turns``
+
+    def __bool__(self):
+        return bool(self.turns or self.topics)
+
+    def summary(self):
+        if not self.topics:
+            return ''
+        return "Earlier in this conversation the resident asked about: " + "; ".join(self.topics)
+
+    def messages(self):
+        """History as chat messages, ready to go between the system prompt and the new question."""
+        messages = []
+        summary = self.summary()
+        if summary:
+            messages.append({"role": "system", "content": summary})
+        for question, reply in self.turns:
+            messages.append({"role": "user", "content": question})
+            messages.append({"role": "assistant", "content": reply})
+        return messages
+
+    def last_question(self):
+        return self.turns[-1][0] if self.turns else ''
+
+    @property
+    def key(self):
+        return f'{KEY_PREFIX}{self.owner}:{self.id}'
+
+    def add_turn(self, question, reply, token_budget, summary_budget):
+        reply = clip(reply, min(MAX_STORED_REPLY_CHARS, token_budget * 4))
+        # Whatever the reply leaves of the budget; a pasted essay must not blow it
+        question = clip(question, (token_budget - estimate_tokens(reply)) * 4)
+        self.turns.append([question, reply])
+
+        # Fold the oldest turns into the summary until the turns fit; the newest always stays
+        while len(self.turns) > 1 and self._turn_tokens() > token_budget:
+            dropped_question, _ = self.turns.pop(0)
+            self.topics.append(dropped_question[:SUMMARY_TOPIC_CHARS])
+        while self.topics and estimate_tokens(self.summary()) > summary_budget:
+            self.topics.pop(0)
+
+    def _turn_tokens(self):
+        return sum(estimate_tokens(question) + estimate_tokens(reply) for question, reply in self.turns)
+
+
+async def load(owner, conversation_id):
+    conversation = Conversation(conversation_id, owner)
+    data = await cache.aget(conversation.key)
+    if data:
+        conversation.turns, conversation.topics = data['turns'], data['topics']
+    return conversation
+
+
+async def remember(conversation, question, reply):
+    conversation.add_turn(
+        question, reply, settings.CHATBOT_MEMORY_TOKEN_BUDGET, settings.CHATBOT_MEMORY_SUMMARY_TOKENS,
+    )
+    await cache.aset(
+        conversation.key,
+        {'turns': conversation.turns, 'topics': conversation.topics},
+        timeout=settings.CHATBOT_MEMORY_TTL,
+    )
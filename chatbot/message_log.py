@@ -0,0 +1,137 @@
+"""
+Write-behind logging of chatbot exchanges.
+
+Views call ``log_exchange()``, which only appends an unsaved ``ChatMessage``
+to a bounded in-memory queue; a daemon thread drains it every
+``CHATBOT_LOG_FLUSH_INTERVAL`` seconds (or as soon as a batch fills) with one
+``bulk_create``. The response path never touches the database. When the
+queue is full, new exchanges are dropped and counted rather than blocking a
+request. Whatever is still queued is flushed at interpreter shutdown.
+"""
+import atexit
+import logging
+import queue
+import threading
+import time
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.db import close_old_connections, connection
+from django.dispatch import receiver
+
+from .models import ChatMessage
+
+logger = logging.getLogger(__name__)
+
+
+class ChatLogWriter:
+    def __init__(self, max_queue=10000, batch_size=200, flush_interval=1.0):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._flush_lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._thread = None
+        self._thread_lock = threading.Lock()
+        self.written = self.dropped = 0
+
+    def record(self, **fields):
+        try:
+            self._queue.put_nowait(ChatMessage(**fields))
+        except queue.Full:
+            self.dropped += 1
+            if self.dropped % 1000 == 1:
+                logger.warning("Chat log queue full, %d exchanges dropped so far", self.dropped)
+            return
+        self._ensure_thread()
+
+    def flush(self):
+        """Write everything queued so far, in the calling thread."""
+        while self._write_batch():
+            pass
+
+    def close(self):
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+        self.flush()
+
+    def pending(self):
+        return self._queue.qsize()
+
+    def _ensure_thread(self):
+        # flush_interval 0: no thread, rows are only written by flush() (tests)
+        if self._thread is not None or self.flush_interval <= 0:
+            return
+        with self._thread_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='chat-log-writer', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        try:
+            while not self._stopping.is_set():
+                deadline = time.monotonic() + self.flush_interval
+                # Sleep until the interval passes or a full batch is waiting
+                while self._queue.qsize() < self.batch_size and not self._stopping.is_set():
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._stopping.wait(min(remaining, 0.05))
+                close_old_connections()
+                self.flush()
+        finally:
+            connection.close()
+
+    def _write_batch(self):
+        with self._flush_lock:
+            batch = []
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            if not batch:
+                return False
+            try:
+                ChatMessage.objects.bulk_create(batch)
+            except Exception:
+                logger.exception("Could not write %d chat log rows", len(batch))
+                connection.close()  # start the next batch on a fresh connection
+            else:
+                self.written += len(batch)
+            return True
+
+
+@lru_cache(maxsize=None)
+def get_chat_log():
+    return ChatLogWriter(
+        max_queue=settings.CHATBOT_LOG_QUEUE_SIZE,
+        batch_size=settings.CHATBOT_LOG_BATCH_SIZE,
+        flush_interval=settings.CHATBOT_LOG_FLUSH_INTERVAL,
+    )
+
+
+@atexit.register
+def _flush_at_exit():
+    if get_chat_log.cache_info().currsize:
+        get_chat_log().close()
+
+
+def log_exchange(user_message, bot_reply=None, latency_ms=None, usage=None):
+    usage = usage or {}
+    get_chat_log().record(
+        user_message=user_message,
+        bot_reply=bot_reply,
+        latency_ms=latency_ms,
+        prompt_tokens=usage.get('prompt_tokens'),
+        completion_tokens=usage.get('completion_tokens'),
+    )
+
+
+@receiver(setting_changed)
+def _reset_writer(setting, **kwargs):
+    if setting.startswith('CHATBOT_LOG_') and get_chat_log.cache_info().currsize:
+        get_chat_log().close()
+        get_chat_log.cache_clear()
@@ -1,9 +1,15 @@
 from django.db import models
+from django.utils import timezone
 
 class ChatMessage(models.Model):
+    """One question/answer exchange (written in batches by chatbot.message_log)."""
     user_message = models.TextField()
     bot_reply = models.TextField(blank=True, null=True)
-    timestamp = models.DateTimeField(auto_now_add=True)
+    # Set when the exchange happens, not when the batch is flushed
+    timestamp = models.DateTimeField(default=timezone.now, db_index=True)
+    latency_ms = models.PositiveIntegerField(null=True, blank=True)
+    prompt_tokens = models.PositiveIntegerField(null=True, blank=True)
+    completion_tokens = models.PositiveIntegerField(null=True, blank=True)
 
     def __str__(self):
         return f"User: {self.user_message[:30]}"
@@ -0,0 +1,444 @@
+"""
+LLM providers behind the chatbot, and the router that picks between them.
+
+``CHATBOT_PROVIDERS`` lists providers in order of preference. For each
+completion the ``ProviderRouter``:
+
+* coalesces identical in-flight requests (singleflight): a burst of the same
+  question makes one upstream call and every caller gets its answer;
+* skips providers whose circuit breaker is open, i.e. that failed
+  ``FAILURE_THRESHOLD`` times in a row in the last ``RESET_TIMEOUT`` seconds,
+  so a degraded provider fails fast instead of costing a full timeout;
+* optionally hedges: if the reply takes longer than the provider's observed
+  p95 (``CHATBOT_HEDGE_AFTER = 'p95'``) or a fixed number of seconds, a
+  second request goes to the next provider and the first answer wins;
+* falls over to the next provider when one errors.
+
+Streams fail over only until their first token has been sent.
+"""
+import asyncio
+import hashlib
+import json
+import math
+import random
+import time
+import weakref
+from collections import deque
+from contextlib import asynccontextmanager
+
+import httpx
+from django.conf import settings
+
+
+class LLMError(Exception):
+    pass
+
+
+class LLMBusy(LLMError):
+    """Every completion slot stayed taken for the provider's queue timeout."""
+
+
+class LLMUnavailable(LLMBusy):
+    """Every provider's circuit breaker is open."""
+
+
+class LLMTimeout(LLMError):
+    pass
+
+
+class CircuitBreaker:
+    """
+    Closed: calls go through. After ``failure_threshold`` consecutive
+    failures it opens and rejects calls for ``reset_timeout`` seconds, then
+    lets a single probe through (half-open): success closes it, failure
+    opens it again.
+    """
+
+    CLOSED, OPEN, HALF_OPEN = 'closed', 'open', 'half-open'
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0, clock=time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.clock = clock
+        self.failures = 0
+        self.opened_at = None
+        self.probe_started = None
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return self.CLOSED
+        if self.clock() - self.opened_at < self.reset_timeout:
+            return self.OPEN
+        return self.HALF_OPEN
+
+    def allow(self):
+        state = self.state
+        if state == self.CLOSED:
+            return True
+        if state == self.OPEN:
+            return False
+        # Half-open: one probe at a time (a probe that never reported back expires)
+        now = self.clock()
+        if self.probe_started is not None and now - self.probe_started < self.reset_timeout:
+            return False
+        self.probe_started = now
+        return True
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = self.probe_started = None
+
+    def record_failure(self):
+        self.failures += 1
+        if self.opened_at is not None or self.failures >= self.failure_threshold:
+            self.opened_at = self.clock()
+            self.probe_started = None
+
+
+class Provider:
+    """A chat completions backend. Subclasses implement ``complete`` and ``stream``."""
+
+    def __init__(self, name, failure_threshold=5, reset_timeout=30.0):
+        self.name = name
+        self.breaker = CircuitBreaker(failure_threshold, reset_timeout)
+        self.latencies = deque(maxlen=200)  # seconds, successful completions only
+
+    async def complete(self, messages, temperature):
+        """``(reply, usage)`` for ``messages``."""
+        raise NotImplementedError
+
+    async def stream(self, messages, temperature, usage):
+        """Async iterator of reply pieces; token counts go into ``usage``."""
+        raise NotImplementedError
+        yield
+
+    def latency_percentile(self, pct, min_samples=20):
+        if len(self.latencies) < min_samples:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[max(1, math.ceil(pct / 100 * len(ordered))) - 1]
+
+    def __repr__(self):
+        return f"<{type(self).__name__} {self.name}>"
+
+
+def _record_usage(usage, data):
+    # OpenAI puts usage at the top level; Groq's stream chunks carry it under x_groq
+    reported = data.get('usage') or (data.get('x_groq') or {}).get('usage')
+    if usage is not None and reported:
+        usage['prompt_tokens'] = reported.get('prompt_tokens')
+        usage['completion_tokens'] = reported.get('completion_tokens')
+
+
+class OpenAICompatibleProvider(Provider):
+    """
+    Any ``/chat/completions`` API (Groq, OpenAI, a local vLLM...). One
+    keep-alive ``httpx.AsyncClient`` per event loop; a semaphore caps the
+    completions in flight, and callers that cannot get a slot within
+    ``queue_timeout`` get ``LLMBusy`` instead of queueing forever.
+    """
+
+    def __init__(self, name, api_base, model, api_key='', timeout=None, max_connections=None,
+                 max_concurrency=None, queue_timeout=None, transport=None, **kwargs):
+        super().__init__(name, **kwargs)
+        self.api_base = api_base
+        self.model = model
+        self.api_key = api_key
+        self.timeout = timeout or settings.CHATBOT_TIMEOUT
+        self.max_connections = max_connections or settings.CHATBOT_MAX_CONNECTIONS
+        self.max_concurrency = max_concurrency or settings.CHATBOT_MAX_CONCURRENCY
+        self.queue_timeout = queue_timeout if queue_timeout is not None else settings.CHATBOT_QUEUE_TIMEOUT
+        self.transport = transport
+        # event loop -> (client, semaphore); both are bound to the loop they were created on
+        self._pools = weakref.WeakKeyDictionary()
+
+    def _pool(self):
+        loop = asyncio.get_running_loop()
+        pool = self._pools.get(loop)
+        if pool is None:
+            client = httpx.AsyncClient(
+                base_url=self.api_base,
+                headers={"Authorization": f"Bearer {self.api_key}"},
+                timeout=httpx.Timeout(self.timeout['read'], connect=self.timeout['connect'], pool=self.timeout['pool']),
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_connections,
+                ),
+                transport=self.transport,
+            )
+            pool = self._pools[loop] = (client, asyncio.Semaphore(self.max_concurrency))
+        return pool
+
+    @asynccontextmanager
+    async def _slot(self):
+        client, slots = self._pool()
+        try:
+            await asyncio.wait_for(slots.acquire(), self.queue_timeout)
+        except asyncio.TimeoutError:
+            raise LLMBusy("The assistant is busy, please try again shortly.")
+        try:
+            yield client
+        finally:
+            slots.release()
+
+    def _payload(self, messages, temperature, stream=False):
+        payload = {"model": self.model, "messages": messages, "temperature": temperature}
+        if stream:
+            payload["stream"] = True
+        return payload
+
+    async def complete(self, messages, temperature):
+        async with self._slot() as client:
+            try:
+                response = await client.post("/chat/completions", json=self._payload(messages, temperature))
+                response.raise_for_status()
+                data = response.json()
+            except httpx.TimeoutException as e:
+                raise LLMTimeout(f"Timed out calling {self.name}: {e!r}") from e
+            except (httpx.HTTPError, ValueError) as e:
+                raise LLMError(f"Error calling {self.name}: {e}") from e
+
+        try:
+            reply = data['choices'][0]['message']['content'].strip()
+        except (KeyError, IndexError, TypeError, AttributeError) as e:
+            raise LLMError(f"Unexpected response from {self.name}") from e
+        usage = {}
+        _record_usage(usage, data)
+        return reply, usage
+
+    async def stream(self, messages, temperature, usage):
+        async with self._slot() as client:
+            payload = self._payload(messages, temperature, stream=True)
+            try:
+                async with client.stream("POST", "/chat/completions", json=payload) as response:
+                    response.raise_for_status()
+                    async for line in response.aiter_lines():
+                        if not line.startswith("data:"):
+                            continue
+                        data = line[5:].strip()
+                        if data == "[DONE]":
+                            return
+                        try:
+                            chunk = json.loads(data)
+                            _record_usage(usage, chunk)
+                            choices = chunk['choices']
+                            delta = choices[0].get('delta', {}).get('content') if choices else None
+                        except (ValueError, KeyError, IndexError, TypeError, AttributeError) as e:
+                            raise LLMError(f"Unexpected chunk from {self.name}") from e
+                        if delta:
+                            yield delta
+            except httpx.TimeoutException as e:
+                raise LLMTimeout(f"Timed out calling {self.name}: {e!r}") from e
+            except httpx.HTTPError as e:
+                raise LLMError(f"Error calling {self.name}: {e}") from e
+
+
+class MockProvider(Provider):
+    """
+    Local provider with scripted behaviour, for tests and benchmarks.
+
+    ``latency`` is seconds per call, or a sequence consumed one call at a time
+    (the last value repeats). ``failures`` is the number of initial calls that
+    fail, or a sequence of booleans per call (the last value repeats);
+    ``failure_rate`` adds seeded random failures. Failing calls raise
+    ``error`` after their latency. Every call's messages are kept in ``calls``.
+    """
+
+    def __init__(self, name='mock', reply="Mock reply.", latency=0.0, failures=0, failure_rate=0.0,
+                 error=LLMError, token_delay=0.0, seed=0, **kwargs):
+        super().__init__(name, **kwargs)
+        self.reply = reply
+        self.latency = latency
+        self.failures = failures
+        self.failure_rate = failure_rate
+        self.error = error
+        self.token_delay = token_delay
+        self.random = random.Random(seed)
+        self.calls = []
+
+    def _next(self, script, default):
+        index = len(self.calls) - 1
+        if isinstance(script, (list, tuple)):
+            return script[min(index, len(script) - 1)] if script else default
+        return script
+
+    def _begin(self, messages):
+        self.calls.append(messages)
+        latency = self._next(self.latency, 0.0)
+        if isinstance(self.failures, (list, tuple)):
+            fail = self._next(self.failures, False)
+        else:
+            fail = len(self.calls) <= self.failures
+        if self.failure_rate and self.random.random() < self.failure_rate:
+            fail = True
+        return latency, fail
+
+    def _reply_for(self, messages):
+        return self.reply(messages) if callable(self.reply) else self.reply
+
+    async def complete(self, messages, temperature):
+        latency, fail = self._begin(messages)
+        await asyncio.sleep(latency)
+        if fail:
+            raise self.error(f"{self.name} failed (injected)")
+        reply = self._reply_for(messages)
+        return reply, {"prompt_tokens": sum(len(m["content"].split()) for m in messages),
+                       "completion_tokens": len(reply.split())}
+
+    async def stream(self, messages, temperature, usage):
+        latency, fail = self._begin(messages)
+        await asyncio.sleep(latency)
+        if fail:
+            raise self.error(f"{self.name} failed (injected)")
+        words = self._reply_for(messages).split(" ")
+        for i, word in enumerate(words):
+            if i and self.token_delay:
+                await asyncio.sleep(self.token_delay)
+            yield word if i == len(words) - 1 else word + " "
+        usage['completion_tokens'] = len(words)
+
+
+class ProviderRouter:
+    def __init__(self, providers, hedge_after=None, hedge_min_delay=0.2):
+        if not providers:
+            raise ValueError("ProviderRouter needs at least one provider")
+        self.providers = list(providers)
+        self.hedge_after = hedge_after
+        self.hedge_min_delay = hedge_min_delay
+        # event loop -> {request fingerprint: task}; tasks belong to the loop that created them
+        self._flights = weakref.WeakKeyDictionary()
+        self.coalesced = self.hedged = self.failovers = 0
+
+    async def complete(self, messages, temperature=0.7, usage=None):
+        """Reply text for ``messages``; token counts go into ``usage``, if given."""
+        key = hashlib.sha256(json.dumps([messages, temperature], sort_keys=True).encode()).hexdigest()
+        flights = self._flights.setdefault(asyncio.get_running_loop(), {})
+        task = flights.get(key)
+        if task is None:
+            # Its own task, so one caller disconnecting doesn't cancel it for the others
+            task = flights[key] = asyncio.ensure_future(self._complete(messages, temperature))
+            task.add_done_callback(lambda done: (flights.pop(key, None), _consume_exception(done)))
+        else:
+            self.coalesced += 1
+        reply, reported = await asyncio.shield(task)
+        if usage is not None:
+            usage.update(reported)
+        return reply
+
+    async def stream(self, messages, temperature=0.7, usage=None):
+        if usage is None:
+            usage = {}
+        last_error = None
+        for provider in self._available():
+            started_output = False
+            try:
+                async for delta in provider.stream(messages, temperature, usage):
+                    started_output = True
+                    yield delta
+            except LLMBusy as e:
+                if started_output:
+                    raise
+                last_error = e
+            except LLMError as e:
+                provider.breaker.record_failure()
+                if started_output:
+                    raise
+                last_error = e
+            else:
+                provider.breaker.record_success()
+                return
+            self.failovers += 1
+        raise last_error or LLMUnavailable("The assistant is unavailable, please try again shortly.")
+
+    def stats(self):
+        return {
+            'coalesced': self.coalesced,
+            'hedged': self.hedged,
+            'failovers': self.failovers,
+            'providers': [
+                {
+                    'name': provider.name,
+                    'circuit': provider.breaker.state,
+                    'p95_ms': _ms(provider.latency_percentile(95)),
+                }
+                for provider in self.providers
+            ],
+        }
+
+    def _available(self):
+        """Providers in order of preference, skipping (and not probing) open circuits."""
+        for provider in self.providers:
+            if provider.breaker.allow():
+                yield provider
+
+    async def _complete(self, messages, temperature):
+        last_error = None
+        candidates = self._available()
+        provider = next(candidates, None)
+        while provider is not None:
+            try:
+                return await self._hedged_call(provider, candidates, messages, temperature)
+            except LLMError as e:
+                last_error = e
+            provider = next(candidates, None)
+            if provider is not None:
+                self.failovers += 1
+        raise last_error or LLMUnavailable("The assistant is unavailable, please try again shortly.")
+
+    def _hedge_delay(self, provider):
+        if self.hedge_after is None:
+            return None
+        if self.hedge_after == 'p95':
+            p95 = provider.latency_percentile(95)
+            return None if p95 is None else max(p95, self.hedge_min_delay)
+        return float(self.hedge_after)
+
+    async def _hedged_call(self, provider, candidates, messages, temperature):
+        primary = asyncio.ensure_future(self._call(provider, messages, temperature))
+        delay = self._hedge_delay(provider)
+        if delay is None:
+            return await primary
+
+        pending = {primary}
+        try:
+            done, _ = await asyncio.wait(pending, timeout=delay)
+            if not done:
+                # Slow: race a copy on the next healthy provider (or the same one if it's the only one)
+                backup = next(candidates, None) or provider
+                self.hedged += 1
+                pending.add(asyncio.ensure_future(self._call(backup, messages, temperature)))
+            error = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def _call(self, provider, messages, temperature):
+        started = time.monotonic()
+        try:
+            result = await provider.complete(messages, temperature)
+        except LLMBusy:
+            raise  # our own concurrency limit, not the provider's health
+        except LLMError:
+            provider.breaker.record_failure()
+            raise
+        provider.breaker.record_success()
+        provider.latencies.append(time.monotonic() - started)
+        return result
+
+
+def _consume_exception(task):
+    # Nobody may be left awaiting a coalesced task; don't warn about its error
+    if not task.cancelled():
+        task.exception()
+
+
+def _ms(seconds):
+    return None if seconds is None else round(seconds * 1000, 1)
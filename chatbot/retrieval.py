@@ -0,0 +1,222 @@
+"""
+In-process BM25 index over announcements, used to ground chatbot answers.
+
+Each ``Announcement`` becomes one document (title, description, location,
+audience and dates), tokenized with the answer cache's normalizer so the
+same English/Tagalog stopwords are ignored, minus the question words it
+keeps. The index is built from the DB on first use, patched on save/delete
+signals in this process, and rebuilt every ``CHATBOT_RETRIEVAL_REBUILD_INTERVAL``
+seconds to pick up changes made by other workers. A search touches only the postings of the query terms.
+
+``context_for(question)`` returns the top ``CHATBOT_RETRIEVAL_TOP_K``
+snippets, cut to ``CHATBOT_RETRIEVAL_MAX_CHARS`` in total, ready to put in
+the prompt.
+"""
+import heapq
+import math
+import threading
+import time
+from collections import Counter
+from functools import lru_cache
+from operator import itemgetter
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+
+from announcements.models import Announcement
+from .answer_cache import INTENT_WORDS, normalize
+
+K1 = 1.5
+B = 0.75
+# Title words count this many times, so a match there outranks a passing mention
+TITLE_WEIGHT = 2
+SNIPPET_MAX_CHARS = 400
+# Part of a cache key, but they say nothing about which announcement is relevant
+QUESTION_TERMS = frozenset(' '.join(INTENT_WORDS.values()).split())
+
+ANNOUNCEMENT_FIELDS = (
+    'id', 'title', 'description', 'location', 'target_audience', 'start_date', 'end_date', 'status',
+)
+
+
+def tokenize(text):
+    return [term for term in normalize(text).split() if term not in QUESTION_TERMS]
+
+
+def announcement_document(row):
+    """``(terms, snippet)`` for an announcement given as a dict of ANNOUNCEMENT_FIELDS."""
+    dates = f"{row['start_date']} to {row['end_date']}"
+    terms = (
+        tokenize(row['title']) * TITLE_WEIGHT
+        + tokenize(row['description'])
+        + tokenize(row['location'])
+        + tokenize(row['target_audience'])
+        + tokenize(dates)
+    )
+    description = ' '.join(row['description'].split())
+    snippet = (
+        f"{row['title']} ({dates}, {row['location']}; for {row['target_audience']}; "
+        f"status: {row['status']}): {description}"
+    )
+    if len(snippet) > SNIPPET_MAX_CHARS:
+        snippet = snippet[:SNIPPET_MAX_CHARS - 1].rstrip() + "…"
+    return terms, snippet
+
+
+class BM25Index:
+    def __init__(self):
+        self._postings = {}  # term -> {doc_id: term frequency}
+        self._terms = {}  # doc_id -> distinct terms (to unindex it)
+        self._lengths = {}  # doc_id -> number of terms
+        self._snippets = {}  # doc_id -> prompt snippet
+        self._total_length = 0
+        self._norms = None  # doc_id -> BM25 length normalization, recomputed after changes
+        self._lock = threading.Lock()
+
+    def add(self, doc_id, terms, snippet):
+        with self._lock:
+            self._add(doc_id, terms, snippet)
+
+    def remove(self, doc_id):
+        with self._lock:
+            self._remove(doc_id)
+
+    def search(self, query_terms, k):
+        """The ``k`` best ``(doc_id, score)`` pairs for ``query_terms``."""
+        with self._lock:
+            count = len(self._lengths)
+            if not count:
+                return []
+            norms = self._norms
+            if norms is None:
+                average_length = self._total_length / count or 1
+                norms = self._norms = {
+                    doc_id: K1 * (1 - B + B * length / average_length)
+                    for doc_id, length in self._lengths.items()
+                }
+            scores = {}
+            for term in set(query_terms):
+                postings = self._postings.get(term)
+                if not postings:
+                    continue
+                idf = math.log(1 + (count - len(postings) + 0.5) / (len(postings) + 0.5)) * (K1 + 1)
+                for doc_id, freq in postings.items():
+                    scores[doc_id] = scores.get(doc_id, 0.0) + idf * freq / (freq + norms[doc_id])
+        return heapq.nlargest(k, scores.items(), key=itemgetter(1))
+
+    def snippet(self, doc_id):
+        return self._snippets.get(doc_id)
+
+    def __len__(self):
+        return len(self._lengths)
+
+    def _add(self, doc_id, terms, snippet):
+        self._remove(doc_id)
+        frequencies = Counter(terms)
+        for term, freq in frequencies.items():
+            self._postings.setdefault(term, {})[doc_id] = freq
+        self._terms[doc_id] = tuple(frequencies)
+        self._lengths[doc_id] = len(terms)
+        self._snippets[doc_id] = snippet
+        self._total_length += len(terms)
+        self._norms = None
+
+    def _remove(self, doc_id):
+        length = self._lengths.pop(doc_id, None)
+        if length is None:
+            return
+        self._total_length -= length
+        self._norms = None
+        self._snippets.pop(doc_id, None)
+        for term in self._terms.pop(doc_id, ()):
+            postings = self._postings[term]
+            del postings[doc_id]
+            if not postings:
+                del self._postings[term]
+
+
+class AnnouncementIndex(BM25Index):
+    def __init__(self, rebuild_interval=600):
+        super().__init__()
+        self.rebuild_interval = rebuild_interval
+        self.built_at = None
+        self._rebuild_lock = threading.Lock()
+        self._changes = None  # (doc_id, terms, snippet) made during a rebuild; terms None: removed
+
+    def is_stale(self):
+        return self.built_at is None or time.monotonic() - self.built_at > self.rebuild_interval
+
+    def rebuild(self):
+        with self._rebuild_lock:
+            with self._lock:
+                self._changes = []
+            fresh = BM25Index()
+            for row in Announcement.objects.values(*ANNOUNCEMENT_FIELDS).iterator():
+                fresh.add(row['id'], *announcement_document(row))
+            with self._lock:
+                self._postings, self._terms, self._lengths = fresh._postings, fresh._terms, fresh._lengths
+                self._snippets, self._total_length = fresh._snippets, fresh._total_length
+                self._norms = None
+                # The snapshot may predate changes signalled meanwhile; replaying is idempotent
+                for doc_id, terms, snippet in self._changes:
+                    if terms is None:
+                        self._remove(doc_id)
+                    else:
+                        self._add(doc_id, terms, snippet)
+                self._changes = None
+            self.built_at = time.monotonic()
+
+    def add(self, doc_id, terms, snippet):
+        with self._lock:
+            self._add(doc_id, terms, snippet)
+            if self._changes is not None:
+                self._changes.append((doc_id, terms, snippet))
+
+    def remove(self, doc_id):
+        with self._lock:
+            self._remove(doc_id)
+            if self._changes is not None:
+                self._changes.append((doc_id, None, None))
+
+    def update(self, announcement):
+        row = {field: getattr(announcement, field) for field in ANNOUNCEMENT_FIELDS}
+        self.add(announcement.pk, *announcement_document(row))
+
+    def context(self, question, k, max_chars):
+        """Top-``k`` snippets for ``question``, at most ``max_chars`` in total."""
+        snippets, used = [], 0
+        for doc_id, _score in self.search(tokenize(question), k):
+            snippet = self.snippet(doc_id)
+            if snippet is None or used + len(snippet) > max_chars:
+                break
+            snippets.append(snippet)
+            used += len(snippet)
+        return snippets
+
+
+@lru_cache(maxsize=None)
+def get_index():
+    return AnnouncementIndex(rebuild_interval=settings.CHATBOT_RETRIEVAL_REBUILD_INTERVAL)
+
+
+def context_for(question):
+    index = get_index()
+    if index.is_stale():
+        index.rebuild()
+    return index.context(question, settings.CHATBOT_RETRIEVAL_TOP_K, settings.CHATBOT_RETRIEVAL_MAX_CHARS)
+
+
+async def acontext_for(question):
+    index = get_index()
+    if index.is_stale():
+        # Only the (re)build touches the DB; searches stay on the event loop
+        await sync_to_async(index.rebuild)()
+    return index.context(question, settings.CHATBOT_RETRIEVAL_TOP_K, settings.CHATBOT_RETRIEVAL_MAX_CHARS)
+
+
+@receiver(setting_changed)
+def _reset_index(setting, **kwargs):
+    if setting.startswith('CHATBOT_RETRIEVAL_'):
+        get_index.cache_clear()
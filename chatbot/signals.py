@@ -0,0 +1,28 @@
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from announcements.models import Announcement
+from .answer_cache import get_answer_cache
+from .retrieval import get_index
+
+
+@receiver(post_save, sender=Announcement)
+@receiver(post_delete, sender=Announcement)
+def invalidate_answers_on_announcement_change(sender, **kwargs):
+    # Cached answers may quote schedules/events that just changed
+    transaction.on_commit(lambda: get_answer_cache().invalidate())
+
+
+@receiver(post_save, sender=Announcement)
+def index_announcement(sender, instance, **kwargs):
+    index = get_index()
+    if index.built_at is not None:  # not built yet: the first search loads everything
+        transaction.on_commit(lambda: index.update(instance))
+
+
+@receiver(post_delete, sender=Announcement)
+def unindex_announcement(sender, instance, **kwargs):
+    index, pk = get_index(), instance.pk
+    if index.built_at is not None:
+        transaction.on_commit(lambda: index.remove(pk))
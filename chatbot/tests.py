@@ -1,3 +1,630 @@
-from django.test import TestCase
+import asyncio
+import json
+from unittest import mock
 
-# Create your tests here.
+import httpx
+from asgiref.sync import sync_to_async
+from django.test import AsyncClient as Client, SimpleTestCase, TestCase, override_settings
+
+from accounts.tokens import ROLE_CLAIM, RefreshToken
+from announcements.models import Announcement
+from backend.testing import make_request, make_user
+from backend.throttling import get_bucket_store
+from blotter.models import BlotterReport
+from complaints.models import Complaint
+from . import intents, llm, memory, retrieval
+from .answer_cache import AnswerCache, get_answer_cache, normalize
+from .fakes import fake_completions_transport
+from .message_log import ChatLogWriter, get_chat_log
+from .providers import CircuitBreaker, MockProvider, ProviderRouter
+from .retrieval import context_for, get_index
+from .models import ChatMessage
+
+
+def completion(content):
+    return httpx.Response(200, json={"choices": [{"message": {"role": "assistant", "content": content}}]})
+
+
+class MockCompletionsMixin:
+    def setUp(self):
+        super().setUp()
+        get_answer_cache.cache_clear()
+        get_bucket_store.cache_clear()
+        # Each test gets an empty exchange log; whatever it queues is discarded
+        get_chat_log.cache_clear()
+        self.addCleanup(get_chat_log.cache_clear)
+
+    async def flush_log(self):
+        await sync_to_async(get_chat_log().flush)()
+
+    def use_completions(self, handler):
+        llm.use_transport(httpx.MockTransport(handler))
+        self.addCleanup(llm.use_transport, None)
+
+
+def parse_sse(body):
+    events = []
+    for block in body.strip().split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in block.splitlines())
+        events.append((lines["event"], json.loads(lines["data"])))
+    return events
+
+
+@override_settings(CHATBOT_LOG_FLUSH_INTERVAL=0)
+class ChatbotQueryTests(MockCompletionsMixin, TestCase):
+    async def test_reply_is_returned_and_logged(self):
+        def handler(request):
+            payload = json.loads(request.content)
+            self.assertEqual(payload["messages"][-1], {"role": "user", "content": "Kailan bukas ang barangay hall?"})
+            return completion("  Lunes hanggang Biyernes, 8AM-5PM.  ")
+
+        self.use_completions(handler)
+
+        response = await self.async_client.post(
+            "/api/chatbot/query/", {"message": "Kailan bukas ang barangay hall?"}, content_type="application/json"
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["reply"], "Lunes hanggang Biyernes, 8AM-5PM.")
+        self.assertEqual(await ChatMessage.objects.acount(), 0)  # not on the response path
+
+        await self.flush_log()
+        saved = await ChatMessage.objects.aget()
+        self.assertEqual(saved.bot_reply, "Lunes hanggang Biyernes, 8AM-5PM.")
+        self.assertIsNotNone(saved.latency_ms)
+
+    async def test_empty_message(self):
+        response = await self.async_client.post("/api/chatbot/query/", {"message": " "}, content_type="application/json")
+
+        self.assertEqual(response.status_code, 400)
+
+    async def test_rate_limited_per_client(self):
+        self.use_completions(lambda request: completion("Okay."))
+        user = await sync_to_async(make_user)("resident")
+        token = str(RefreshToken.for_user(user).access_token)
+
+        with override_settings(THROTTLE_RATES={"chatbot": "1/min"}):
+            guest = [
+                (await self.async_client.post("/api/chatbot/query/", {"message": "hi"}, content_type="application/json"))
+                for _ in range(2)
+            ]
+            signed_in = await self.async_client.post(
+                "/api/chatbot/query/", {"message": "hi"}, content_type="application/json",
+                headers={"Authorization": f"Bearer {token}"},
+            )
+
+        self.assertEqual([response.status_code for response in guest], [200, 429])
+        self.assertIn("Retry-After", guest[1].headers)
+        self.assertEqual(signed_in.status_code, 200)
+
+    async def test_upstream_error(self):
+        self.use_completions(lambda request: httpx.Response(502))
+
+        response = await self.async_client.post("/api/chatbot/query/", {"message": "hi"}, content_type="application/json")
+
+        self.assertEqual(response.status_code, 500)
+
+    @override_settings(CHATBOT_MAX_CONCURRENCY=1, CHATBOT_QUEUE_TIMEOUT=0.05)
+    async def test_busy_when_no_slot_frees_up(self):
+        release = asyncio.Event()
+
+        async def handler(request):
+            await release.wait()
+            return completion("ok")
+
+        self.use_completions(handler)
+        first = asyncio.ensure_future(llm.complete(llm.build_messages("first")))
+        await asyncio.sleep(0.01)
+
+        with self.assertRaises(llm.LLMBusy):
+            await llm.complete(llm.build_messages("second"))
+
+        release.set()
+        self.assertEqual(await first, "ok")
+
+
+@override_settings(CHATBOT_LOG_FLUSH_INTERVAL=0)
+class ChatbotStreamTests(MockCompletionsMixin, TestCase):
+    async def stream(self, message):
+        response = await self.async_client.post(
+            "/api/chatbot/stream/", {"message": message}, content_type="application/json"
+        )
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+        body = b"".join([chunk async for chunk in response.streaming_content])
+        return parse_sse(body.decode())
+
+    async def test_tokens_are_streamed_then_reply_is_saved(self):
+        calls = []
+        llm.use_transport(fake_completions_transport("Bukas po kami 8AM-5PM.", calls=calls))
+        self.addCleanup(llm.use_transport, None)
+
+        events = await self.stream("Anong oras bukas ang hall?")
+
+        self.assertTrue(calls[0]["stream"])
+        self.assertEqual(
+            [data["delta"] for event, data in events if event == "token"],
+            ["Bukas ", "po ", "kami ", "8AM-5PM."],
+        )
+        self.assertEqual(events[-1][1]["reply"], "Bukas po kami 8AM-5PM.")
+        await self.flush_log()
+        saved = await ChatMessage.objects.aget()
+        self.assertEqual(saved.bot_reply, "Bukas po kami 8AM-5PM.")
+        self.assertEqual(saved.completion_tokens, 4)
+        self.assertIsNotNone(saved.prompt_tokens)
+
+    async def test_upstream_error_becomes_error_event(self):
+        self.use_completions(lambda request: httpx.Response(500))
+
+        events = await self.stream("hi")
+
+        self.assertEqual(events[-1][0], "error")
+        await self.flush_log()
+        self.assertIsNone((await ChatMessage.objects.aget()).bot_reply)
+
+
+@override_settings(CHATBOT_LOG_FLUSH_INTERVAL=0)
+class AnswerCacheTests(MockCompletionsMixin, TestCase):
+    def test_normalize_folds_case_punctuation_and_stopwords(self):
+        self.assertEqual(normalize("Ano po ang REQUIREMENTS sa barangay clearance??"), "requirements barangay clearance")
+        self.assertEqual(normalize("What are the requirements for a barangay clearance"), "requirements barangay clearance")
+
+    def test_different_intents_over_the_same_subject_get_different_keys(self):
+        intents = [
+            ("Barangay clearance?", "What is a barangay clearance?"),
+            ("Magkano ang barangay clearance?", "How much is the barangay clearance?"),
+            ("Kailan ang barangay clearance?", "When is the barangay clearance?"),
+            ("Saan ang barangay clearance?", "Where is the barangay clearance?"),
+            ("How do I get a barangay clearance?", "How to get barangay clearance?"),
+            ("Wala bang barangay clearance?",),
+            ("May barangay clearance ba?", "Meron bang barangay clearance?"),
+        ]
+        keys = [{normalize(question) for question in same} for same in intents]
+        self.assertTrue(all(len(same) == 1 for same in keys), keys)  # one question, either language
+        self.assertEqual(len(set.union(*keys)), len(intents))
+        self.assertNotEqual(normalize("Who is the barangay captain?"), normalize("Who was the barangay captain?"))
+        self.assertNotEqual(normalize("Is the hall open?"), normalize("Is the hall not open?"))
+
+        cache = AnswerCache()
+        cache.set("Magkano ang barangay clearance?", "50 pesos")
+        self.assertIsNone(cache.get("Saan ang barangay clearance?"))
+
+    def test_lru_eviction_and_ttl(self):
+        cache = AnswerCache(max_entries=2, ttl=60)
+        cache.set("office hours", "8-5")
+        cache.set("clearance requirements", "ID")
+        cache.get("office hours")
+        cache.set("permit steps", "Apply")
+
+        self.assertIsNone(cache.get("clearance requirements"))
+        self.assertEqual(cache.get("office hours"), "8-5")
+
+        cache.ttl = -1
+        cache.set("office hours", "8-5")
+        self.assertIsNone(cache.get("office hours"))
+
+    def test_fuzzy_match(self):
+        cache = AnswerCache(fuzzy_threshold=0.75)
+        cache.set("Ano po ang requirements sa barangay clearance?", "Valid ID at cedula")
+
+        self.assertEqual(cache.get("requirement ng barangay clearance"), "Valid ID at cedula")
+        self.assertIsNone(cache.get("business permit requirements"))
+        self.assertEqual(cache.stats()["fuzzy_hits"], 1)
+
+    @mock.patch("chatbot.answer_cache.GENERATION_CHECK_INTERVAL", 0)
+    async def test_other_workers_invalidation_is_picked_up_asynchronously(self):
+        mine, other = AnswerCache(), AnswerCache()
+        await mine.arefresh()
+        mine.set("office hours", "8-5")
+
+        await sync_to_async(other.invalidate)()
+        with mock.patch("chatbot.answer_cache.cache.get", side_effect=AssertionError("blocking cache call")):
+            self.assertEqual(mine.get("office hours"), "8-5")  # lookups stay in-process
+        await mine.arefresh()
+
+        self.assertIsNone(mine.get("office hours"))
+
+    async def test_repeat_question_skips_the_api(self):
+        calls = []
+
+        def handler(request):
+            calls.append(request)
+            return completion("Valid ID at cedula.")
+
+        self.use_completions(handler)
+        for message in ("Ano ang requirements sa barangay clearance?", "requirements, barangay clearance"):
+            response = await self.async_client.post(
+                "/api/chatbot/query/", {"message": message}, content_type="application/json"
+            )
+            self.assertEqual(response.json()["reply"], "Valid ID at cedula.")
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(get_answer_cache().stats()["hits"], 1)
+
+    def test_announcement_change_invalidates(self):
+        answers = get_answer_cache()
+        answers.set("office hours", "8-5")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Announcement.objects.create(
+                title="Holiday", description="Closed", status="active", start_date="2025-01-01",
+                end_date="2025-01-01", location="Hall", target_audience="All",
+            )
+
+        self.assertIsNone(answers.get("office hours"))
+
+
+class ChatLogWriterTests(TestCase):
+    def test_batches_rows_and_drops_when_full(self):
+        writer = ChatLogWriter(max_queue=3, batch_size=2, flush_interval=0)
+        for i in range(5):
+            writer.record(user_message=f"q{i}", bot_reply=f"a{i}", latency_ms=i)
+
+        self.assertEqual(ChatMessage.objects.count(), 0)
+        with self.assertNumQueries(2):
+            writer.flush()
+
+        self.assertEqual(list(ChatMessage.objects.order_by("latency_ms").values_list("user_message", flat=True)), ["q0", "q1", "q2"])
+        self.assertEqual((writer.written, writer.dropped), (3, 2))
+
+
+@override_settings(CHATBOT_LOG_FLUSH_INTERVAL=0)
+class IntentTests(MockCompletionsMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.owner = make_user("owner")
+        self.calls = []
+        self.use_completions(lambda request: self.calls.append(request) or completion("LLM"))
+
+    def test_match_normalizes_references(self):
+        self.assertEqual(intents.match("status ng cm-2025-123?").reference, "CM-2025-000123")
+        self.assertEqual(intents.match("approved na ba CR14").reference, "CR-014")
+        self.assertEqual(intents.match("blotter report no. 7").reference, "#7")
+        self.assertIsNone(intents.match("paano kumuha ng clearance"))
+
+    async def ask(self, message, user=None):
+        headers = {}
+        if user is not None:
+            headers["authorization"] = f"Bearer {RefreshToken.for_user(user).access_token}"
+        response = await self.async_client.post(
+            "/api/chatbot/query/", {"message": message}, content_type="application/json", headers=headers
+        )
+        return response.json()
+
+    async def test_owner_gets_status_without_llm(self):
+        request = await sync_to_async(make_request)(user=self.owner, status="approved")
+
+        data = await self.ask(f"Is my {request.request_number} approved?", self.owner)
+
+        self.assertEqual(data["intent"], "certificate")
+        self.assertIn("Approved", data["reply"])
+        self.assertEqual(self.calls, [])
+
+    async def test_complaint_and_blotter_lookups(self):
+        complaint = await sync_to_async(Complaint.objects.create)(
+            user=self.owner, type="noise", fullname="Owner", contact_number="0917", address="Sindalan",
+            email_address="owner@example.com", subject="Karaoke", detailed_description="Late night",
+            respondent_name="Neighbor", respondent_address="Sindalan", latitude=15, longitude=120,
+        )
+        report = await BlotterReport.objects.acreate(
+            filed_by=self.owner, complainant_name="Owner", incident_type="Noise Complaint",
+            incident_date="2025-01-01", incident_time="22:00", location="Purok 1", status="under_investigation",
+        )
+
+        complaint_reply = (await self.ask(f"status of {complaint.reference_number}", self.owner))["reply"]
+        blotter_reply = (await self.ask(f"blotter #{report.pk}", self.owner))["reply"]
+
+        self.assertIn("Karaoke", complaint_reply)
+        self.assertIn("Under Investigation", blotter_reply)
+
+    async def test_other_users_and_anonymous_get_not_found(self):
+        request = await sync_to_async(make_request)(user=self.owner)
+        stranger = await sync_to_async(make_user)("stranger")
+        staff = await sync_to_async(make_user)("staff", role="staff")
+
+        self.assertIn("couldn't find", (await self.ask(f"status {request.request_number}", stranger))["reply"])
+        self.assertIn("couldn't find", (await self.ask(f"status {request.request_number}"))["reply"])
+        self.assertIn("Pending", (await self.ask(f"status {request.request_number}", staff))["reply"])
+        self.assertIn("couldn't find", (await self.ask("status CR-999", self.owner))["reply"])
+        self.assertEqual(self.calls, [])
+
+
+def make_announcement(title, description, **kwargs):
+    fields = dict(
+        status="active", start_date="2025-03-01", end_date="2025-03-01",
+        location="Barangay Hall", target_audience="All residents",
+    )
+    fields.update(kwargs)
+    return Announcement.objects.create(title=title, description=description, **fields)
+
+
+@override_settings(CHATBOT_LOG_FLUSH_INTERVAL=0)
+class RetrievalTests(MockCompletionsMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        get_index.cache_clear()
+        self.addCleanup(get_index.cache_clear)
+
+    def test_best_matches_within_budget(self):
+        make_announcement("Libreng bakuna", "Anti-rabies vaccination para sa mga aso at pusa.")
+        make_announcement("Liga ng basketball", "Registration ng mga team para sa summer league.")
+        make_announcement("Medical mission", "Libreng konsulta at gamot, may bakuna rin para sa bata.")
+
+        context = context_for("Kailan ang libreng bakuna?")
+
+        self.assertEqual(len(context), 2)
+        self.assertTrue(context[0].startswith("Libreng bakuna"))
+        with self.settings(CHATBOT_RETRIEVAL_MAX_CHARS=150):
+            self.assertEqual(len(context_for("Kailan ang libreng bakuna?")), 1)
+
+    def test_index_follows_saves_and_deletes(self):
+        context_for("warmup")  # build
+        with self.captureOnCommitCallbacks(execute=True):
+            clean_up = make_announcement("Clean-up drive", "Linis ng kanal sa Purok 3.")
+        self.assertTrue(context_for("clean-up drive")[0].startswith("Clean-up drive"))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            clean_up.title = "Tree planting"
+            clean_up.save()
+        self.assertTrue(context_for("tree planting")[0].startswith("Tree planting"))
+        self.assertEqual(context_for("drive"), [])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            clean_up.delete()
+        self.assertEqual(context_for("tree planting"), [])
+
+    def test_changes_during_a_rebuild_are_kept(self):
+        index = get_index()
+        index.rebuild()
+        cancelled = make_announcement("Clean-up drive", "Linis ng kanal sa Purok 3.")
+        # Saved after the rows were read: only the signal ever sees it
+        late = Announcement(
+            pk=cancelled.pk + 1, title="Tree planting", description="Pagtatanim sa gilid ng ilog.",
+            status="active", start_date="2025-03-01", end_date="2025-03-01", location="Barangay Hall",
+            target_audience="All residents",
+        )
+        document = retrieval.announcement_document
+
+        def snapshot_then_change(row):
+            if row["id"] == cancelled.pk:
+                # Signals landing after the rows were read, before the swap
+                index.update(late)
+                index.remove(cancelled.pk)
+            return document(row)
+
+        with mock.patch("chatbot.retrieval.announcement_document", side_effect=snapshot_then_change):
+            index.rebuild()
+
+        self.assertEqual(context_for("clean-up drive"), [])
+        self.assertTrue(context_for("tree planting")[0].startswith("Tree planting"))
+
+    async def test_snippets_are_sent_with_the_question(self):
+        await sync_to_async(make_announcement)("Barangay assembly", "Pulong ng lahat ng residente sa covered court.")
+        calls = []
+        llm.use_transport(fake_completions_transport("Sa Sabado po.", calls=calls))
+        self.addCleanup(llm.use_transport, None)
+
+        await self.async_client.post(
+            "/api/chatbot/query/", {"message": "Kailan ang barangay assembly?"}, content_type="application/json"
+        )
+
+        system_messages = [m["content"] for m in calls[0]["messages"] if m["role"] == "system"]
+        self.assertIn("Barangay assembly", system_messages[1])
+
+
+@override_settings(CHATBOT_LOG_FLUSH_INTERVAL=0, CHATBOT_MEMORY_TOKEN_BUDGET=200, CHATBOT_MEMORY_SUMMARY_TOKENS=40)
+class ConversationMemoryTests(MockCompletionsMixin, TestCase):
+    def test_old_turns_fold_into_a_bounded_summary(self):
+        conversation = memory.Conversation("c" * 32, "user:1")
+        for i in range(30):
+            conversation.add_turn(f"Tanong bilang {i}", "Sagot " * 40, token_budget=200, summary_budget=40)
+
+        history_tokens = sum(memory.estimate_tokens(m["content"]) for m in conversation.messages())
+        self.assertLessEqual(history_tokens, 200 + 40)
+        self.assertEqual(conversation.turns[-1][0], "Tanong bilang 29")
+        self.assertIn("Tanong bilang 2", conversation.summary())
+        self.assertNotIn("Tanong bilang 0;", conversation.summary())
+
+    def test_oversized_newest_turn_is_cut_to_the_budget(self):
+        conversation = memory.Conversation("c" * 32, "user:1")
+        conversation.add_turn("Tanong " * 500, "Sagot " * 40, token_budget=200, summary_budget=40)
+
+        question, reply = conversation.turns[-1]
+        self.assertTrue(question.startswith("Tanong Tanong") and question.endswith("…"))
+        self.assertEqual(reply, "Sagot " * 40)  # short replies are kept whole
+        self.assertLessEqual(memory.estimate_tokens(question) + memory.estimate_tokens(reply), 200)
+
+        conversation.add_turn("Isa pa", "Sagot " * 200, token_budget=100, summary_budget=40)
+        self.assertEqual(conversation.turns, [conversation.turns[-1]])
+        self.assertLessEqual(conversation._turn_tokens(), 100)
+
+    async def test_follow_ups_carry_history_but_prompt_stays_bounded(self):
+        calls = []
+        llm.use_transport(fake_completions_transport(lambda payload: "Sagot " * 60, calls=calls))
+        self.addCleanup(llm.use_transport, None)
+
+        first = await self.async_client.post(
+            "/api/chatbot/query/", {"message": "Paano kumuha ng barangay ID?"}, content_type="application/json"
+        )
+        conversation_id = first.json()["conversation_id"]
+        for i in range(20):
+            await self.async_client.post(
+                "/api/chatbot/query/", {"message": f"Magkano po iyon? ({i})", "conversation_id": conversation_id},
+                content_type="application/json",
+            )
+
+        self.assertEqual(calls[1]["messages"][-3]["content"], "Paano kumuha ng barangay ID?")
+        sizes = [sum(len(m["content"]) for m in payload["messages"]) for payload in calls]
+        self.assertLess(max(sizes[5:]) - min(sizes[5:]), 200)  # flat, not growing per turn
+
+    async def test_follow_up_skips_answer_cache(self):
+        calls = []
+        llm.use_transport(fake_completions_transport(calls=calls))
+        self.addCleanup(llm.use_transport, None)
+
+        await self.async_client.post("/api/chatbot/query/", {"message": "Magkano?"}, content_type="application/json")
+        response = await self.async_client.post(
+            "/api/chatbot/query/", {"message": "Paano mag-apply?"}, content_type="application/json"
+        )
+        await self.async_client.post(
+            "/api/chatbot/query/", {"message": "Magkano?", "conversation_id": response.json()["conversation_id"]},
+            content_type="application/json",
+        )
+
+        self.assertEqual(len(calls), 3)
+
+    async def ask(self, client, message, conversation_id=None, **headers):
+        body = {"message": message}
+        if conversation_id:
+            body["conversation_id"] = conversation_id
+        response = await client.post(
+            "/api/chatbot/query/", body, content_type="application/json", headers=headers,
+        )
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    async def test_conversations_belong_to_their_requester(self):
+        calls = []
+        llm.use_transport(fake_completions_transport(calls=calls))
+        self.addCleanup(llm.use_transport, None)
+        owner, stranger = await sync_to_async(make_user)("owner"), await sync_to_async(make_user)("stranger")
+
+        def bearer(user):
+            return {"Authorization": f"Bearer {RefreshToken.for_user(user).access_token}"}
+
+        first = await self.ask(self.async_client, "Paano kumuha ng barangay ID?", **bearer(owner))
+        conversation_id = first.json()["conversation_id"]
+        self.assertNotIn(memory.GUEST_COOKIE, first.cookies)
+
+        await self.ask(Client(), "Saan po iyon?", conversation_id, **bearer(stranger))
+        await self.ask(Client(), "Kailan po iyon bukas?", conversation_id)  # a guest holding the id
+        await self.ask(self.async_client, "Magkano po iyon?", conversation_id, **bearer(owner))
+
+        self.assertEqual(len(calls), 4)
+        histories = [[m["content"] for m in payload["messages"][1:-1]] for payload in calls[1:]]
+        self.assertNotIn("Paano kumuha ng barangay ID?", histories[0])
+        self.assertNotIn("Paano kumuha ng barangay ID?", histories[1])
+        self.assertIn("Paano kumuha ng barangay ID?", histories[2])
+
+    async def test_tokens_without_role_claim_are_resolved_off_the_event_loop(self):
+        llm.use_transport(fake_completions_transport())
+        self.addCleanup(llm.use_transport, None)
+        user = await sync_to_async(make_user)("resident")
+        token = RefreshToken.for_user(user).access_token
+        del token[ROLE_CLAIM]  # issued before the claim existed: authenticating loads the user
+        headers = {"Authorization": f"Bearer {token}"}
+
+        first = await self.ask(self.async_client, "Paano kumuha ng barangay ID?", **headers)
+        streamed = await self.async_client.post(
+            "/api/chatbot/stream/", {"message": "Saan po iyon?", "conversation_id": first.json()["conversation_id"]},
+            content_type="application/json", headers=headers,
+        )
+        body = b"".join([chunk async for chunk in streamed.streaming_content]).decode()
+
+        self.assertIn("event: done", body)
+        conversation = await memory.load(f"user:{user.pk}", first.json()["conversation_id"])
+        self.assertEqual(len(conversation.turns), 2)
+
+    async def test_guests_are_told_apart_by_their_cookie(self):
+        calls = []
+        llm.use_transport(fake_completions_transport(calls=calls))
+        self.addCleanup(llm.use_transport, None)
+
+        first = await self.ask(self.async_client, "Paano kumuha ng cedula?")
+        conversation_id = first.json()["conversation_id"]
+        cookie = first.cookies[memory.GUEST_COOKIE]
+        self.assertTrue(cookie["httponly"])
+
+        forged = Client()
+        forged.cookies[memory.GUEST_COOKIE] = "not-signed-guest-id"
+        await self.ask(forged, "Magkano po iyon?", conversation_id)
+        again = await self.ask(self.async_client, "Magkano po iyon?", conversation_id)
+
+        self.assertNotIn("Paano kumuha ng cedula?", [m["content"] for m in calls[1]["messages"]])
+        self.assertIn("Paano kumuha ng cedula?", [m["content"] for m in calls[2]["messages"]])
+        self.assertNotIn(memory.GUEST_COOKIE, again.cookies)  # only issued once
+
+    async def test_rejects_malformed_conversation_id(self):
+        response = await self.async_client.post(
+            "/api/chatbot/query/", {"message": "hi", "conversation_id": "../../etc"}, content_type="application/json"
+        )
+
+        self.assertEqual(response.status_code, 400)
+
+
+class ProviderRouterTests(SimpleTestCase):
+    messages = [{"role": "user", "content": "Paano kumuha ng cedula?"}]
+
+    async def test_fails_over_in_order(self):
+        broken = MockProvider("primary", failures=1)
+        backup = MockProvider("backup", reply="Sa munisipyo po.")
+        router = ProviderRouter([broken, backup])
+
+        self.assertEqual(await router.complete(self.messages), "Sa munisipyo po.")
+        self.assertEqual((len(broken.calls), len(backup.calls), router.failovers), (1, 1, 1))
+
+    async def test_open_circuit_fails_fast_then_probes(self):
+        now = [0.0]
+        broken = MockProvider("primary", failures=3, reply="Recovered", failure_threshold=2, reset_timeout=30)
+        broken.breaker.clock = lambda: now[0]
+        backup = MockProvider("backup", reply="Backup")
+        router = ProviderRouter([broken, backup])
+
+        for _ in range(4):
+            await router.complete(self.messages + [{"role": "user", "content": str(now[0])}])
+            now[0] += 1
+        self.assertEqual(len(broken.calls), 2)  # skipped once the circuit opened
+        self.assertEqual(broken.breaker.state, CircuitBreaker.OPEN)
+
+        now[0] += 30
+        await router.complete(self.messages)  # half-open probe fails (3rd scripted failure)
+        self.assertEqual(broken.breaker.state, CircuitBreaker.OPEN)
+        now[0] += 31
+        self.assertEqual(await router.complete(self.messages + [{"role": "user", "content": "again"}]), "Recovered")
+        self.assertEqual(broken.breaker.state, CircuitBreaker.CLOSED)
+
+    async def test_all_circuits_open(self):
+        router = ProviderRouter([MockProvider(failures=10, failure_threshold=1)])
+        with self.assertRaises(llm.LLMError):
+            await router.complete(self.messages)
+
+        with self.assertRaises(llm.LLMUnavailable):
+            await router.complete(self.messages)
+
+    async def test_hedges_slow_requests(self):
+        slow = MockProvider("slow", reply="slow", latency=1.0)
+        fast = MockProvider("fast", reply="fast", latency=0.01)
+        router = ProviderRouter([slow, fast], hedge_after=0.05)
+
+        started = asyncio.get_running_loop().time()
+        reply = await router.complete(self.messages)
+
+        self.assertEqual(reply, "fast")
+        self.assertLess(asyncio.get_running_loop().time() - started, 0.5)
+        self.assertEqual(router.hedged, 1)
+
+    async def test_p95_hedging_waits_for_enough_samples(self):
+        provider = MockProvider(latency=[0.001] * 20 + [0.3], reply="ok")
+        router = ProviderRouter([provider], hedge_after="p95", hedge_min_delay=0.02)
+        for i in range(20):
+            await router.complete([{"role": "user", "content": str(i)}])
+        self.assertEqual(router.hedged, 0)
+
+        await router.complete(self.messages)  # 0.3 s, p95 floor 0.02 s: hedged onto itself
+
+        self.assertEqual(router.hedged, 1)
+
+    async def test_identical_inflight_questions_make_one_call(self):
+        provider = MockProvider(reply="8AM-5PM", latency=0.05)
+        router = ProviderRouter([provider])
+
+        replies = await asyncio.gather(*(router.complete(self.messages) for _ in range(50)))
+
+        self.assertEqual(set(replies), {"8AM-5PM"})
+        self.assertEqual((len(provider.calls), router.coalesced), (1, 49))
+
+    async def test_stream_fails_over_before_first_token(self):
+        router = ProviderRouter([MockProvider("a", failures=1), MockProvider("b", reply="Opo, bukas.")])
+
+        pieces = [piece async for piece in router.stream(self.messages)]
+
+        self.assertEqual("".join(pieces), "Opo, bukas.")
@@ -1,6 +1,9 @@
 from django.urls import path
-from .views import chatbot_query
+from .views import chatbot_query, chatbot_stream, answer_cache_view, provider_stats_view
 
 urlpatterns = [
     path('query/', chatbot_query, name='chatbot-query'),
+    path('stream/', chatbot_stream, name='chatbot-stream'),  # POST, replies as Server-Sent Events
+    path('cache/', answer_cache_view, name='chatbot-answer-cache'),
+    path('providers/', provider_stats_view, name='chatbot-provider-stats'),
 ]
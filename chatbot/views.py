@@ -1,72 +1,201 @@
+import json
+import logging
+import time
+
+from asgiref.sync import sync_to_async
+from django.http import JsonResponse, StreamingHttpResponse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST
 from rest_framework.decorators import api_view, permission_classes
+from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
-from rest_framework import status
-from rest_framework.permissions import AllowAny
-from .models import ChatMessage
-import requests
-import os
-
-# Load API key and model from env variables
-GROQ_API_KEY = os.getenv("GROQ_API_KEY", "").strip()
-GROQ_MODEL = "meta-llama/llama-4-scout-17b-16e-instruct"
-
-@api_view(['POST'])
-@permission_classes([AllowAny])
-def chatbot_query(request):
-    user_message = request.data.get('message', '').strip()
+
+from accounts.permissions import IsAdminOrStaff
+from backend.throttling import client_key, throttle
+from . import intents, llm, memory
+from .answer_cache import get_answer_cache
+from .message_log import log_exchange
+from .retrieval import acontext_for
+
+logger = logging.getLogger(__name__)
+
+
+def read_message(request):
+    """
+    ``(message, conversation_id, error_response)`` from a JSON body. A new
+    conversation id is issued when the client sends none.
+    """
+    try:
+        body = json.loads(request.body or b'{}')
+    except ValueError:
+        return None, None, JsonResponse({"error": "Invalid JSON"}, status=400)
+    if not isinstance(body, dict):
+        body = {}
+    user_message = str(body.get('message', '')).strip()
     if not user_message:
-        return Response({"error": "No message provided"}, status=status.HTTP_400_BAD_REQUEST)
-
-    # Save user message
-    ChatMessage.objects.create(user_message=user_message)
-
-    headers = {
-        "Authorization": f"Bearer {GROQ_API_KEY}",
-        "Content-Type": "application/json"
-    }
-
-    # Base system prompt instructing the model
-    system_prompt = (
-       "You are a helpful Barangay Official of Barangay Sindalan. "
-        "If asked about a person or topic you don't have information on, "
-        "please respond politely that you don't have that information instead of guessing."
-        "Answer only about government services, complaints, permits, announcements, and community events."
-    )
-
-    # Build messages payload for the chat completion API
-    messages = [
-        {"role": "system", "content": system_prompt},
-        {"role": "user", "content": user_message},
-    ]
-
-    # Optionally, to add conversation history uncomment below and implement session history retrieval
-    # conversation_history = get_conversation_history_for_session(request)  # Your method here
-    # messages = [ {"role": "system", "content": system_prompt} ] + conversation_history + [ {"role": "user", "content": user_message} ]
-
-    payload = {
-        "model": GROQ_MODEL,
-        "messages": messages,
-        "temperature": 0.7
-    }
+        return None, None, JsonResponse({"error": "No message provided"}, status=400)
+    conversation_id = body.get('conversation_id') or memory.new_conversation_id()
+    if not memory.valid_conversation_id(conversation_id):
+        return None, None, JsonResponse({"error": "Invalid conversation_id"}, status=400)
+    return user_message, conversation_id, None
+
+
+async def build_prompt(user_message, conversation):
+    # The previous question helps retrieval resolve follow-ups like "saan iyon?"
+    context = await acontext_for(f"{conversation.last_question()} {user_message}")
+    return llm.build_messages(user_message, context, conversation.messages())
+
+
+def chatbot_client(request):
+    # Signed-in residents get their own bucket; guests share their IP's
+    return client_key(request, intents.authenticated_user(request))
+
+
+def elapsed_ms(started):
+    return int((time.perf_counter() - started) * 1000)
+
+
+def sse_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+@csrf_exempt
+@require_POST
+@throttle('chatbot', chatbot_client)
+async def chatbot_query(request):
+    # Async view: while waiting on the model this holds a coroutine, not a worker
+    started = time.perf_counter()
+    user_message, conversation_id, error = read_message(request)
+    if error:
+        return error
+
+    # "status of CM-2025-000123": answered from the DB, never cached (per-user)
+    matched = await intents.answer(user_message, request)
+    if matched is not None:
+        kind, reply = matched
+        log_exchange(user_message, reply, elapsed_ms(started))
+        return JsonResponse({"reply": reply, "intent": kind, "conversation_id": conversation_id})
 
+    # Already resolved by the throttle's key function; this only reads it back
+    user = await sync_to_async(intents.authenticated_user)(request)
+    owner, guest_id = memory.owner_for(request, user)
+    conversation = await memory.load(owner, conversation_id)
+    answers = get_answer_cache()
+    await answers.arefresh()
+    # Follow-ups ("magkano iyon?") depend on the history, so only fresh questions use the cache
+    cached = answers.get(user_message) if not conversation else None
+    if cached is not None:
+        await memory.remember(conversation, user_message, cached)
+        log_exchange(user_message, cached, elapsed_ms(started))
+        response = JsonResponse({"reply": cached, "cached": True, "conversation_id": conversation_id})
+        # Guests' memory is keyed on this cookie
+        return memory.set_guest_cookie(response, guest_id)
+
+    usage = {}
     try:
-        response = requests.post(
-            "https://api.groq.com/openai/v1/chat/completions",
-            headers=headers,
-            json=payload,
-            timeout=15
-        )
-        response.raise_for_status()
-        data = response.json()
-
-        reply = data['choices'][0]['message']['content'].strip()
-
-        # Save bot reply
-        ChatMessage.objects.create(user_message=user_message, bot_reply=reply)
-
-        return Response({"reply": reply})
-
-    except requests.exceptions.RequestException as e:
-        # Log error (add your logging here)
-        error_msg = f"Error calling Groq API: {str(e)}"
-        return Response({"error": error_msg}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        messages = await build_prompt(user_message, conversation)
+        reply = await llm.complete(messages, usage=usage)
+    except llm.LLMError as e:
+        # Failed exchanges are logged too, without a reply
+        log_exchange(user_message, None, elapsed_ms(started))
+        if isinstance(e, llm.LLMBusy):
+            return JsonResponse({"error": str(e)}, status=503, headers={"Retry-After": "5"})
+        logger.warning("%s", e)
+        status = 504 if isinstance(e, llm.LLMTimeout) else 500
+        return JsonResponse({"error": str(e)}, status=status)
+
+    if not conversation:
+        answers.set(user_message, reply)
+    await memory.remember(conversation, user_message, reply)
+    # Queued, written by the background flusher
+    log_exchange(user_message, reply, elapsed_ms(started), usage)
+
+    response = JsonResponse({"reply": reply, "conversation_id": conversation_id})
+    return memory.set_guest_cookie(response, guest_id)
+
+
+@csrf_exempt
+@require_POST
+@throttle('chatbot', chatbot_client)
+async def chatbot_stream(request):
+    """
+    Same as chatbot_query, but the reply is sent as Server-Sent Events while
+    the model generates it:
+
+        event: token   data: {"delta": "..."}     (repeated)
+        event: done    data: {"reply": "...", "conversation_id": "..."}
+        event: error   data: {"error": "..."}     (instead of done)
+
+    The exchange is logged once the stream completes.
+    """
+    started = time.perf_counter()
+    user_message, conversation_id, error = read_message(request)
+    if error:
+        return error
+
+    matched = await intents.answer(user_message, request)
+    # Already resolved by the throttle's key function; this only reads it back
+    user = await sync_to_async(intents.authenticated_user)(request)
+    owner, guest_id = memory.owner_for(request, user)
+    conversation = await memory.load(owner, conversation_id)
+    answers = get_answer_cache()
+    await answers.arefresh()
+    cached = answers.get(user_message) if matched is None and not conversation else None
+
+    async def events():
+        if matched is not None:
+            kind, reply = matched
+            log_exchange(user_message, reply, elapsed_ms(started))
+            yield sse_event("token", {"delta": reply})
+            yield sse_event("done", {"reply": reply, "intent": kind, "conversation_id": conversation_id})
+            return
+
+        if cached is not None:
+            await memory.remember(conversation, user_message, cached)
+            log_exchange(user_message, cached, elapsed_ms(started))
+            yield sse_event("token", {"delta": cached})
+            yield sse_event("done", {"reply": cached, "cached": True, "conversation_id": conversation_id})
+            return
+
+        parts = []
+        usage = {}
+        try:
+            messages = await build_prompt(user_message, conversation)
+            async for delta in llm.stream(messages, usage=usage):
+                parts.append(delta)
+                yield sse_event("token", {"delta": delta})
+        except llm.LLMError as e:
+            logger.warning("%s", e)
+            log_exchange(user_message, None, elapsed_ms(started))
+            yield sse_event("error", {"error": str(e)})
+            return
+
+        reply = ''.join(parts).strip()
+        if reply:
+            if not conversation:
+                answers.set(user_message, reply)
+            await memory.remember(conversation, user_message, reply)
+        log_exchange(user_message, reply, elapsed_ms(started), usage)
+        yield sse_event("done", {"reply": reply, "conversation_id": conversation_id})
+
+    response = StreamingHttpResponse(events(), content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"  # don't let a proxy hold tokens back
+    return memory.set_guest_cookie(response, guest_id)
+
+
+@api_view(['GET', 'DELETE'])
+@permission_classes([IsAuthenticated, IsAdminOrStaff])
+def answer_cache_view(request):
+    """GET: hit/miss counters of this worker's answer cache. DELETE: invalidate it in every worker."""
+    answers = get_answer_cache()
+    if request.method == 'DELETE':
+        answers.invalidate()
+    return Response(answers.stats())
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated, IsAdminOrStaff])
+def provider_stats_view(request):
+    """Circuit state, p95 latency and coalesce/hedge/failover counters of this worker's LLM providers."""
+    return Response(llm.get_router().stats())
@@ -4,3 +4,9 @@ from django.apps import AppConfig
 class ComplaintsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'complaints'
+
+    def ready(self):
+        from backend.derivatives import track_image_field
+        from .models import Complaint
+
+        track_image_field(Complaint, 'evidence')
@@ -0,0 +1,16 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('complaints', '0004_complaint_evidence_delete_complaintevidence'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='complaint',
+            name='evidence_derivatives',
+            field=models.BooleanField(default=False, editable=False),
+        ),
+    ]
@@ -22,6 +22,8 @@ class Complaint(models.Model):
     priority = models.CharField(max_length=50, default='medium')
     reference_number = models.CharField(max_length=50, unique=True, blank=True)
     evidence = models.FileField(storage=supabase_storage,upload_to='complaint_evidence/', null=True, blank=True)
+    # Set once evidence's thumbnails are stored (see backend.derivatives)
+    evidence_derivatives = models.BooleanField(default=False, editable=False)
 
     def __str__(self):
         return f"{self.subject} by {self.fullname}"
@@ -1,9 +1,12 @@
 from rest_framework import serializers
+from backend.derivatives import thumbnail_url, srcset
 from .models import Complaint
 
 class ComplaintSerializer(serializers.ModelSerializer):
     evidence = serializers.SerializerMethodField()
     location = serializers.SerializerMethodField()
+    evidence_thumb = serializers.SerializerMethodField()
+    evidence_srcset = serializers.SerializerMethodField()
 
     class Meta:
         model = Complaint
@@ -11,7 +14,7 @@ class ComplaintSerializer(serializers.ModelSerializer):
             'id', 'reference_number', 'type', 'fullname', 'contact_number', 'address',
             'email_address', 'subject', 'detailed_description', 'respondent_name',
             'respondent_address', 'latitude', 'longitude', 'date_filed', 'status',
-            'priority', 'evidence', 'location'
+            'priority', 'evidence', 'evidence_thumb', 'evidence_srcset', 'location'
         ]
         read_only_fields = ['id', 'reference_number', 'date_filed', 'user']
         extra_kwargs = {
@@ -36,6 +39,12 @@ class ComplaintSerializer(serializers.ModelSerializer):
             return {'file_url': request.build_absolute_uri(obj.evidence.url)}
         return None
 
+    def get_evidence_thumb(self, obj):
+        return thumbnail_url(obj.evidence)
+
+    def get_evidence_srcset(self, obj):
+        return srcset(obj.evidence)
+
     def get_location(self, obj):
         return {'lat': float(obj.latitude) if obj.latitude is not None else None, 'lng': float(obj.longitude) if obj.longitude is not None else None}
 
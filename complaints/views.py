@@ -29,7 +29,7 @@ class ComplaintDetailView(generics.RetrieveAPIView):
 
     def get_object(self):
         obj = super().get_object()
-        if obj.user != self.request.user:
+        if obj.user_id != self.request.user.pk:
             raise PermissionDenied("You do not have permission to view this complaint.")
         return obj
 
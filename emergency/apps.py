@@ -4,3 +4,10 @@ from django.apps import AppConfig
 class EmergencyConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'emergency'
+
+    def ready(self):
+        from backend.derivatives import track_image_field
+        from . import signals  # noqa: F401
+        from .models import EmergencyReport
+
+        track_image_field(EmergencyReport, 'media_file')
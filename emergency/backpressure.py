@@ -0,0 +1,88 @@
+"""
+Per-socket outbound queues for ``ws/emergencies/``.
+
+The channel-layer handler only files events into the socket's queue and
+returns; a writer task per socket does the actual sends. A slow or stalled
+client therefore never holds up the consumer's channel-layer reads (which
+is what fills channels_redis's per-channel capacity and drops messages).
+While the writer lags, newer events for a report replace older ones still
+queued. A socket whose queue stays above ``EMERGENCY_SOCKET_MAX_PENDING``
+for ``EMERGENCY_SOCKET_SLOW_GRACE`` seconds, or reaches twice that size, is
+disconnected; it can resume from its last ``seq`` once its network recovers.
+"""
+import asyncio
+import time
+from dataclasses import asdict, dataclass
+
+
+@dataclass
+class SocketStats:
+    """Counters for this worker's sockets."""
+    connections: int = 0
+    sent: int = 0
+    coalesced: int = 0  # queued events replaced by a newer one for the same report
+    dropped: int = 0  # events discarded when a slow socket was disconnected
+    slow_disconnects: int = 0
+
+    def as_dict(self):
+        return asdict(self)
+
+
+stats = SocketStats()
+
+
+class OutboundQueue:
+    def __init__(self, send, on_overflow, max_pending, grace):
+        self._send = send  # async (text) -> None
+        self._on_overflow = on_overflow  # async () -> None
+        self.max_pending = max_pending
+        self.grace = grace
+        self._pending = {}  # report id -> text, oldest first
+        self._wakeup = asyncio.Event()
+        self._over_since = None
+        self._closed = False
+        self._task = asyncio.create_task(self._write())
+
+    def __len__(self):
+        return len(self._pending)
+
+    async def put(self, key, text):
+        if self._closed:
+            return
+        if key in self._pending:
+            stats.coalesced += 1
+            del self._pending[key]  # re-queue at the back, after what was already queued
+        self._pending[key] = text
+        self._wakeup.set()
+        if len(self._pending) <= self.max_pending:
+            self._over_since = None
+            return
+        now = time.monotonic()
+        if self._over_since is None:
+            self._over_since = now
+        if len(self._pending) >= 2 * self.max_pending or now - self._over_since >= self.grace:
+            stats.slow_disconnects += 1
+            stats.dropped += len(self._pending)
+            self.close()
+            await self._on_overflow()
+
+    def close(self):
+        self._closed = True
+        self._pending.clear()
+        self._task.cancel()
+
+    async def _write(self):
+        while True:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+            while self._pending:
+                key = next(iter(self._pending))
+                text = self._pending.pop(key)
+                try:
+                    await self._send(text)
+                except Exception:
+                    # Socket already gone; the consumer's disconnect cleans up
+                    self._closed = True
+                    self._pending.clear()
+                    return
+                stats.sent += 1
@@ -0,0 +1,139 @@
+"""
+Coalesced, batched broadcasts of emergency report changes to ``ws/emergencies/``.
+
+Each committed save queues the report's payloads, one per audience (the full
+report for staff, the public report shape for everyone else), for the groups
+interested in it (see ``emergency.subscriptions``). Further saves of the same
+report within ``EMERGENCY_BROADCAST_WINDOW`` seconds replace the queued
+payloads. When the window closes every event is stamped with a sequence
+number, JSON-encoded once per audience, kept for replay (``emergency.history``),
+and each group gets everything queued for it as a single ``emergency.batch``
+message of ``[seq, report id, text]`` entries. Consumers forward the encoded
+text as-is, so however busy the reports get, the channel layer sees at most
+one message per group per window and no subscriber re-encodes anything.
+"""
+import asyncio
+import atexit
+import json
+import logging
+import threading
+from functools import lru_cache
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+
+from . import history
+from .geo import cell_for
+from .serializers import EmergencyReportPublicSerializer, EmergencyReportSerializer
+from .subscriptions import PUBLIC, STAFF, audience_of, report_groups
+
+logger = logging.getLogger(__name__)
+
+
+SERIALIZERS = {STAFF: EmergencyReportSerializer, PUBLIC: EmergencyReportPublicSerializer}
+
+
+def report_payloads(report):
+    """``{audience: payload}``: what staff and the public sockets get for ``report``."""
+    return {audience: serializer(report).data for audience, serializer in SERIALIZERS.items()}
+
+
+def send_batches(events):
+    """Stamp, encode, record and send ``(report id, groups, payloads)`` events, one message per group."""
+    channel_layer = get_channel_layer()
+    if channel_layer is None:
+        return
+    first = history.reserve(len(events))
+    stamped = [
+        (seq, key, groups, {audience: json.dumps({**payload, "seq": seq}) for audience, payload in payloads.items()})
+        for seq, (key, groups, payloads) in enumerate(events, start=first)
+    ]
+    history.record([(seq, groups, texts) for seq, _, groups, texts in stamped])
+    batches = {}
+    for seq, key, groups, texts in stamped:
+        for group in groups:
+            batches.setdefault(group, []).append([seq, key, texts[audience_of(group)]])
+
+    async def send_all():
+        await asyncio.gather(*(
+            channel_layer.group_send(group, {"type": "emergency.batch", "events": batch})
+            for group, batch in batches.items()
+        ))
+
+    async_to_sync(send_all)()
+
+
+class BroadcastCoalescer:
+    """
+    Collects events keyed by report id (latest wins) and hands them to
+    ``send`` as a list of ``(key, groups, payload)`` once per ``window`` seconds;
+    ``window`` 0 sends immediately.
+    """
+
+    def __init__(self, window, send=send_batches):
+        self.window = window
+        self._send = send
+        self._pending = {}  # report id -> (groups, payload)
+        self._lock = threading.Lock()
+        self._timer = None
+        self.published = 0
+        self.coalesced = 0
+        self.batches = 0
+
+    def publish(self, key, payload, groups):
+        with self._lock:
+            if key in self._pending:
+                self.coalesced += 1
+                # A report that changed type or moved still reaches its old watchers
+                groups = list(dict.fromkeys([*self._pending[key][0], *groups]))
+            self._pending[key] = (groups, payload)
+            self.published += 1
+            if self.window > 0 and self._timer is None:
+                self._timer = threading.Timer(self.window, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+        if self.window <= 0:
+            self.flush()
+
+    def flush(self):
+        """Send whatever is queued now; returns the number of events sent."""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+        if not pending:
+            return 0
+        self.batches += 1
+        try:
+            self._send([(key, groups, payload) for key, (groups, payload) in pending.items()])
+        except Exception:
+            # Clients resync from the REST list; a failed broadcast must not break saves
+            logger.exception("Emergency broadcast of %d events failed", len(pending))
+        return len(pending)
+
+
+@lru_cache(maxsize=None)
+def get_broadcaster():
+    return BroadcastCoalescer(window=settings.EMERGENCY_BROADCAST_WINDOW)
+
+
+@atexit.register
+def _flush_at_exit():
+    if get_broadcaster.cache_info().currsize:
+        get_broadcaster().flush()
+
+
+@receiver(setting_changed)
+def _reset_broadcaster(setting, **kwargs):
+    if setting == 'EMERGENCY_BROADCAST_WINDOW' and get_broadcaster.cache_info().currsize:
+        get_broadcaster().flush()
+        get_broadcaster.cache_clear()
+
+
+def publish_report(report):
+    groups = report_groups(report.incident_type, cell_for(report.latitude, report.longitude))
+    get_broadcaster().publish(report.pk, report_payloads(report), groups)
@@ -1,13 +1,196 @@
+import asyncio
+import time
+from urllib.parse import parse_qs
+
+from asgiref.sync import sync_to_async
+from channels.db import database_sync_to_async
 from channels.generic.websocket import AsyncJsonWebsocketConsumer
+from django.conf import settings
+
+from accounts.permissions import is_admin_or_staff
+from accounts.revocation import get_revocation_store
+from . import backpressure, history
+from .broadcast import SERIALIZERS, get_broadcaster
+from .geo import cell_for
+from .models import EmergencyReport
+from .subscriptions import PUBLIC, STAFF, Subscription
+
+
+def parse_seq(value):
+    try:
+        seq = int(value)
+    except (TypeError, ValueError):
+        raise ValueError("last_seq must be a whole number.")
+    if seq < 0:
+        raise ValueError("last_seq must be a whole number.")
+    return seq
+
 
 class EmergencyConsumer(AsyncJsonWebsocketConsumer):
+    """
+    ``ws/emergencies/`` feed. Staff and admins (by the ``access_token``
+    cookie, see ``CookieJWTAuthMiddleware``) get full reports, everyone else
+    the public report shape. Without a subscription a socket gets every
+    report; narrow it with ``?types=fire,flood&cells=wdtuf`` (or ``near=lat,lon``)
+    on connect, or later with ``{"action": "subscribe", "types": [...], "cells": [...]}``.
+
+    Every event carries a ``seq``. A reconnecting client passes the last one
+    it saw (``?last_seq=N`` or ``{"action": "resume", "last_seq": N}``) and
+    gets the events it missed followed by ``{"type": "resumed", "seq": ...}``,
+    or ``{"type": "snapshot", "seq": ..., "reports": [...]}`` of the active
+    reports when those events are no longer kept. ``last_seq=0`` always
+    gives a snapshot. Events may repeat around a resume; clients keep the
+    highest ``seq`` per report id.
+
+    Live events go through a per-socket ``OutboundQueue``: a lagging client
+    gets only the newest event per report, and one that stays too far behind
+    is closed with code 4008. Staff can read the counters with
+    ``{"action": "ws-stats"}``.
+
+    A staff socket is closed with code 4401 once its access token expires or
+    is revoked (checked every ``EMERGENCY_SOCKET_AUTH_RECHECK`` seconds); the
+    client refreshes its cookie and reconnects with ``last_seq``.
+    """
+
     async def connect(self):
+        user = self.scope.get("user")
+        self.audience = STAFF if is_admin_or_staff(user) else PUBLIC
+        self.outbound = None
+        self.token_watch = None
+        self.groups_joined = []
+        self.subscription = Subscription()
+        self.resumed_through = 0  # live events up to this seq were covered by a resume
+        query = {key: values[-1] for key, values in parse_qs(self.scope["query_string"].decode()).items()}
+        try:
+            subscription = Subscription.parse(query.get("types"), query.get("cells"), query.get("near"))
+            last_seq = parse_seq(query["last_seq"]) if "last_seq" in query else None
+        except ValueError as exc:
+            await self.accept()
+            await self.send_json({"type": "error", "error": str(exc)})
+            await self.close(code=4400)
+            return
+        # Join before accepting so nothing broadcast after the handshake is missed
+        await self.subscribe(subscription)
         await self.accept()
-        await self.channel_layer.group_add("emergencies", self.channel_name)
+        backpressure.stats.connections += 1
+        self.outbound = backpressure.OutboundQueue(
+            send=lambda text: self.send(text_data=text),
+            on_overflow=lambda: self.close(code=4008),
+            max_pending=settings.EMERGENCY_SOCKET_MAX_PENDING,
+            grace=settings.EMERGENCY_SOCKET_SLOW_GRACE,
+        )
+        if self.audience == STAFF and getattr(user, "token_exp", None) is not None:
+            self.token_watch = asyncio.create_task(
+                self.watch_token(user.token_exp, user.token_jti, user.pk, user.token_iat)
+            )
+        if last_seq is not None:
+            # Live events queue up meanwhile and are handled after this; replayed ones are skipped
+            await self.resume(last_seq)
 
     async def disconnect(self, close_code):
-        await self.channel_layer.group_discard("emergencies", self.channel_name)
+        if self.token_watch is not None:
+            self.token_watch.cancel()
+        if self.outbound is not None:
+            self.outbound.close()
+            backpressure.stats.connections -= 1
+        for group in self.groups_joined:
+            await self.channel_layer.group_discard(group, self.channel_name)
+
+    async def receive_json(self, content, **kwargs):
+        action = content.get("action") if isinstance(content, dict) else None
+        if action == "resume":
+            try:
+                last_seq = parse_seq(content.get("last_seq"))
+            except ValueError as exc:
+                await self.send_json({"type": "error", "error": str(exc)})
+                return
+            await self.resume(last_seq)
+            return
+        if action == "ws-stats" and self.audience == STAFF:
+            broadcaster = get_broadcaster()
+            await self.send_json({
+                "type": "ws-stats",
+                **backpressure.stats.as_dict(),
+                "broadcast": {
+                    "published": broadcaster.published,
+                    "coalesced": broadcaster.coalesced,
+                    "batches": broadcaster.batches,
+                },
+            })
+            return
+        if action != "subscribe":
+            await self.send_json({"type": "error", "error": "Unknown action."})
+            return
+        try:
+            subscription = Subscription.parse(content.get("types"), content.get("cells"), content.get("near"))
+        except ValueError as exc:
+            await self.send_json({"type": "error", "error": str(exc)})
+            return
+        await self.subscribe(subscription)
+        await self.send_json({"type": "subscribed", **subscription.as_dict()})
+
+    async def subscribe(self, subscription):
+        # Join the new groups before leaving the old ones: a duplicate beats a gap
+        wanted = subscription.groups(self.audience)
+        for group in set(wanted) - set(self.groups_joined):
+            await self.channel_layer.group_add(group, self.channel_name)
+        for group in set(self.groups_joined) - set(wanted):
+            await self.channel_layer.group_discard(group, self.channel_name)
+        self.groups_joined = wanted
+        self.subscription = subscription
+
+    async def watch_token(self, exp, jti, user_id=None, issued_at=None):
+        is_revoked = sync_to_async(get_revocation_store().is_revoked, thread_sensitive=False)
+        while True:
+            await asyncio.sleep(max(0, min(exp - time.time(), settings.EMERGENCY_SOCKET_AUTH_RECHECK)))
+            if time.time() >= exp or await is_revoked(jti, user_id, issued_at):
+                break
+        # Stop staff payloads right away; disconnect() runs once the client is gone
+        self.outbound.close()
+        for group in self.groups_joined:
+            await self.channel_layer.group_discard(group, self.channel_name)
+        self.groups_joined = []
+        await self.close(code=4401)
+
+    async def resume(self, last_seq):
+        if last_seq == 0:
+            events, latest = None, await sync_to_async(history.current, thread_sensitive=False)()
+        else:
+            events, latest = await sync_to_async(history.since, thread_sensitive=False)(
+                last_seq, self.groups_joined, self.audience
+            )
+        self.resumed_through = max(self.resumed_through, latest)
+        if events is None:
+            await self.send_json({"type": "snapshot", "seq": latest, "reports": await self.active_reports()})
+            return
+        for _, text in events:
+            await self.send(text_data=text)
+        await self.send_json({"type": "resumed", "seq": latest})
+
+    @database_sync_to_async
+    def active_reports(self):
+        reports = EmergencyReport.objects.filter(status__in=history.ACTIVE_STATUSES).order_by('-submitted_at')
+        if self.subscription.types:
+            reports = reports.filter(incident_type__in=self.subscription.types)
+        serializer = SERIALIZERS[self.audience]
+        matching = []
+        for report in reports.iterator():
+            if self.subscription.matches(report.incident_type, cell_for(report.latitude, report.longitude)):
+                matching.append(serializer(report).data)
+                if len(matching) == history.SNAPSHOT_LIMIT:
+                    break
+        return matching
+
+    async def dispatch(self, message):
+        # Fan-out never touches the database: skip Channels' close_old_connections(),
+        # a thread hop per socket per batch
+        if message["type"] == "emergency.batch":
+            await self.emergency_batch(message)
+            return
+        await super().dispatch(message)
 
-    # Custom handler for emergency updates
-    async def emergency_updated(self, event):
-        await self.send_json(event["data"])
+    # Coalesced updates from emergency.broadcast, already JSON-encoded once for every subscriber
+    async def emergency_batch(self, event):
+        for seq, report_id, text in event["events"]:
+            if seq > self.resumed_through:
+                await self.outbound.put(report_id, text)
@@ -0,0 +1,89 @@
+"""
+Geohash cells for area-scoped emergency subscriptions.
+
+A report belongs to the precision-5 cell containing its coordinates (about
+4.9 km x 4.9 km, a few puroks around Sindalan). Clients subscribe to cells
+by geohash, by a shorter prefix (all cells under it) or by a point (its cell
+and the eight around it, so a report just across a cell border still shows).
+"""
+BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+CELL_PRECISION = 5
+
+
+def encode(latitude, longitude, precision=CELL_PRECISION):
+    lat_range, lon_range = [-90.0, 90.0], [-180.0, 180.0]
+    chars, bits, value, even = [], 0, 0, True  # bits alternate, longitude first
+    while len(chars) < precision:
+        interval, coordinate = (lon_range, longitude) if even else (lat_range, latitude)
+        mid = (interval[0] + interval[1]) / 2
+        value <<= 1
+        if coordinate >= mid:
+            value |= 1
+            interval[0] = mid
+        else:
+            interval[1] = mid
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(BASE32[value])
+            bits, value = 0, 0
+    return "".join(chars)
+
+
+def bounds(geohash):
+    """``(lat_min, lat_max, lon_min, lon_max)`` of ``geohash``."""
+    lat_range, lon_range = [-90.0, 90.0], [-180.0, 180.0]
+    even = True
+    for char in geohash:
+        value = BASE32.index(char)
+        for shift in range(4, -1, -1):
+            interval = lon_range if even else lat_range
+            mid = (interval[0] + interval[1]) / 2
+            if value >> shift & 1:
+                interval[0] = mid
+            else:
+                interval[1] = mid
+            even = not even
+    return lat_range[0], lat_range[1], lon_range[0], lon_range[1]
+
+
+def cell_for(latitude, longitude):
+    """The report cell for a coordinate pair, or None when it has no location."""
+    if latitude is None or longitude is None:
+        return None
+    return encode(float(latitude), float(longitude))
+
+
+def around(latitude, longitude):
+    """The cell containing the point and its eight neighbours."""
+    lat_min, lat_max, lon_min, lon_max = bounds(encode(latitude, longitude))
+    height, width = lat_max - lat_min, lon_max - lon_min
+    center_lat, center_lon = (lat_min + lat_max) / 2, (lon_min + lon_max) / 2
+    cells = []
+    for dlat in (0, height, -height):
+        for dlon in (0, width, -width):
+            lat = center_lat + dlat
+            if -90 <= lat <= 90:
+                lon = (center_lon + dlon + 180) % 360 - 180
+                cell = encode(lat, lon)
+                if cell not in cells:
+                    cells.append(cell)
+    return cells
+
+
+def is_geohash(value):
+    return isinstance(value, str) and bool(value) and all(char in BASE32 for char in value)
+
+
+def expand(prefix, limit):
+    """
+    Report cells covered by ``prefix``: longer hashes are cut to cell size,
+    shorter ones expanded. ValueError if that is more than ``limit`` cells.
+    """
+    prefix = prefix[:CELL_PRECISION]
+    if len(BASE32) ** (CELL_PRECISION - len(prefix)) > limit:
+        raise ValueError(f"Geohash prefix {prefix!r} covers too large an area.")
+    cells = [prefix]
+    for _ in range(CELL_PRECISION - len(prefix)):
+        cells = [cell + char for cell in cells for char in BASE32]
+    return cells
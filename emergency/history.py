@@ -0,0 +1,67 @@
+"""
+Sequence numbers and a replay buffer for ``ws/emergencies/`` events.
+
+Every broadcast event gets the next number from a counter in Django's cache
+(Redis in prod, so shared by all workers) and is kept, already encoded, in a
+ring of ``EMERGENCY_HISTORY_SIZE`` cache slots. A reconnecting client sends
+the last sequence number it saw and is replayed just the events it missed.
+When those are gone (overwritten, expired, or the counter was reset) it gets
+a snapshot of the active reports instead.
+"""
+from django.conf import settings
+from django.core.cache import cache
+
+SEQ_KEY = 'emergency-events:seq'
+SLOT_PREFIX = 'emergency-events:slot:'
+ACTIVE_STATUSES = ('pending', 'in_progress')
+SNAPSHOT_LIMIT = 500
+
+
+def reserve(count):
+    """Reserve ``count`` consecutive sequence numbers; returns the first."""
+    try:
+        last = cache.incr(SEQ_KEY, count)
+    except ValueError:
+        cache.add(SEQ_KEY, 0, timeout=None)
+        last = cache.incr(SEQ_KEY, count)
+    return last - count + 1
+
+
+def current():
+    return cache.get(SEQ_KEY, 0)
+
+
+def slot_key(seq):
+    return f"{SLOT_PREFIX}{seq % settings.EMERGENCY_HISTORY_SIZE}"
+
+
+def record(events):
+    """Keep ``(seq, groups, {audience: text})`` events for replay, overwriting the oldest slots."""
+    cache.set_many(
+        {slot_key(seq): (seq, groups, texts) for seq, groups, texts in events},
+        timeout=settings.EMERGENCY_HISTORY_TTL,
+    )
+
+
+def since(last_seq, groups, audience):
+    """
+    ``(seq, text)`` of the events after ``last_seq`` sent to any of ``groups``,
+    encoded for ``audience``, oldest first, plus the current sequence number.
+    The events are None when some of them are no longer kept.
+    """
+    latest = current()
+    if last_seq > latest or latest - last_seq > settings.EMERGENCY_HISTORY_SIZE:
+        return None, latest
+    if last_seq == latest:
+        return [], latest
+    wanted = range(last_seq + 1, latest + 1)
+    slots = cache.get_many([slot_key(seq) for seq in wanted])
+    groups = set(groups)
+    events = []
+    for seq in wanted:
+        slot = slots.get(slot_key(seq))
+        if slot is None or slot[0] != seq:
+            return None, latest
+        if groups.intersection(slot[1]):
+            events.append((seq, slot[2][audience]))
+    return events, latest
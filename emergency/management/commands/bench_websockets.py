@@ -0,0 +1,226 @@
+import asyncio
+import gc
+import json
+import socket
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+from django.utils import timezone
+
+from backend.benchmarks import format_mb, format_ms, percentile, rss_bytes
+from emergency.broadcast import get_broadcaster
+from emergency.models import EmergencyReport
+from emergency.utils import notify_emergency_update
+
+PATH = "/ws/emergencies/"
+
+
+def origin():
+    # Sockets are refused without one of the frontend's origins
+    return settings.CORS_ALLOWED_ORIGINS[0]
+
+
+class Command(BaseCommand):
+    help = (
+        "Open many ws/emergencies/ sockets against the project's ASGI application, "
+        "broadcast reports through notify_emergency_update and measure connect rate, "
+        "fan-out latency and memory. Uses the in-memory channel layer unless --redis is given."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--clients', type=int, default=2000)
+        parser.add_argument('--broadcasts', type=int, default=50)
+        parser.add_argument('--interval', type=float, default=0.05, help="Seconds between broadcasts")
+        parser.add_argument('--connect-concurrency', type=int, default=200)
+        parser.add_argument('--window', type=float, default=0, help="EMERGENCY_BROADCAST_WINDOW to use")
+        parser.add_argument('--redis', metavar='URL', help="Use channels_redis on this URL instead of memory")
+        parser.add_argument(
+            '--transport', choices=['uvicorn', 'asgi'], default='uvicorn',
+            help="uvicorn: real sockets to an in-process server; asgi: call the app directly (no network)",
+        )
+        parser.add_argument('--deflate', action='store_true', help="Negotiate permessage-deflate (uvicorn)")
+
+    def handle(self, *args, **options):
+        if options['redis']:
+            layer = {"BACKEND": "channels_redis.core.RedisChannelLayer", "CONFIG": {"hosts": [options['redis']]}}
+        else:
+            layer = {"BACKEND": "channels.layers.InMemoryChannelLayer"}
+        if options['transport'] == 'uvicorn':
+            try:
+                import uvicorn  # noqa: F401
+                import websockets  # noqa: F401
+            except ImportError as exc:
+                raise CommandError(f"{exc.name} is not installed; use --transport asgi") from exc
+
+        # No database: the broadcast reports are unsaved instances
+        with override_settings(CHANNEL_LAYERS={"default": layer}, EMERGENCY_BROADCAST_WINDOW=options['window']):
+            get_broadcaster.cache_clear()
+            result = asyncio.run(self.run(options))
+            get_broadcaster.cache_clear()
+        self.report(options, layer, **result)
+
+    async def run(self, options):
+        from backend.asgi import application
+
+        if options['transport'] == 'uvicorn':
+            server, url = await start_server(application, options['deflate'])
+            open_socket = lambda: UvicornClient.open(url, options['deflate'])  # noqa: E731
+        else:
+            server = None
+            open_socket = lambda: AsgiClient.open(application)  # noqa: E731
+
+        try:
+            gc.collect()
+            rss_before = rss_bytes()
+            gate = asyncio.Semaphore(options['connect_concurrency'])
+
+            async def connect():
+                async with gate:
+                    return await open_socket()
+
+            started = time.perf_counter()
+            clients = await asyncio.gather(*(connect() for _ in range(options['clients'])))
+            connect_time = time.perf_counter() - started
+            gc.collect()
+            rss_connected = rss_bytes()
+
+            sent_at = {}
+            latencies = []  # per delivery
+            spreads = {}  # report id -> time the last socket got it
+            readers = [asyncio.create_task(read(client, sent_at, latencies, spreads)) for client in clients]
+
+            broadcast = sync_to_async(notify_emergency_update)
+            started = time.perf_counter()
+            for i in range(1, options['broadcasts'] + 1):
+                sent_at[i] = time.perf_counter()
+                await broadcast(fake_report(i))
+                await asyncio.sleep(options['interval'])
+            expected = options['clients'] * options['broadcasts']
+            deadline = time.monotonic() + 30
+            while len(latencies) < expected and time.monotonic() < deadline:
+                await asyncio.sleep(0.05)
+            fanout_time = time.perf_counter() - started
+            rss_after = rss_bytes()
+
+            for reader in readers:
+                reader.cancel()
+            await asyncio.gather(*(client.close() for client in clients), return_exceptions=True)
+        finally:
+            if server is not None:
+                server.should_exit = True
+                await server.main_task
+        return {
+            "connect_time": connect_time, "fanout_time": fanout_time, "latencies": latencies,
+            "spreads": list(spreads.values()), "expected": expected,
+            "rss": (rss_before, rss_connected, rss_after),
+        }
+
+    def report(self, options, layer, connect_time, fanout_time, latencies, spreads, expected, rss):
+        clients = options['clients']
+        rss_before, rss_connected, rss_after = rss
+        self.stdout.write(
+            f"{clients} sockets over {options['transport']}, {layer['BACKEND'].rsplit('.', 1)[-1]}, "
+            f"window {options['window']} s\n"
+            f"  connect   {connect_time:.2f} s, {clients / connect_time:.0f} sockets/s\n"
+            f"  fan-out   {len(latencies)}/{expected} deliveries in {fanout_time:.2f} s "
+            f"({len(latencies) / fanout_time:.0f}/s)\n"
+            f"  latency   p50 {format_ms(percentile(latencies, 50))}, p95 {format_ms(percentile(latencies, 95))}, "
+            f"p99 {format_ms(percentile(latencies, 99))}, max {format_ms(max(latencies, default=0))}\n"
+            f"  last socket per broadcast p50 {format_ms(percentile(spreads, 50))}, "
+            f"p95 {format_ms(percentile(spreads, 95))}\n"
+            f"  RSS       {format_mb(rss_before)} idle, {format_mb(rss_connected)} connected "
+            f"(~{(rss_connected - rss_before) / clients / 1024:.1f} KB/socket incl. client side), "
+            f"{format_mb(rss_after)} after broadcasts"
+        )
+
+
+def fake_report(report_id):
+    # Unsaved: serializing it needs no database, and the id keys the latency maps
+    return EmergencyReport(
+        id=report_id, name="Bench", incident_type="flood", description="Water rising on the main road",
+        latitude=15.0, longitude=120.65, location_text="Sindalan", contact_number="09170000000",
+        submitted_at=timezone.now(),
+    )
+
+
+async def read(client, sent_at, latencies, spreads):
+    while True:
+        frame = json.loads(await client.receive())
+        report_id = frame.get("id")
+        if report_id in sent_at:
+            delay = time.perf_counter() - sent_at[report_id]
+            latencies.append(delay)
+            spreads[report_id] = max(spreads.get(report_id, 0), delay)
+
+
+async def start_server(application, deflate):
+    import uvicorn
+
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        port = probe.getsockname()[1]
+    config = uvicorn.Config(
+        application, host="127.0.0.1", port=port, ws="websockets", ws_per_message_deflate=deflate,
+        lifespan="off", log_level="warning", backlog=4096,
+    )
+    server = uvicorn.Server(config)
+    server.main_task = asyncio.create_task(server.serve())
+    while not server.started:
+        if server.main_task.done():
+            server.main_task.result()  # raises the startup error
+        await asyncio.sleep(0.01)
+    return server, f"ws://127.0.0.1:{port}{PATH}"
+
+
+class UvicornClient:
+    def __init__(self, connection):
+        self.connection = connection
+
+    @classmethod
+    async def open(cls, url, deflate):
+        from websockets.asyncio.client import connect
+
+        return cls(await connect(
+            url, origin=origin(), compression="deflate" if deflate else None, open_timeout=30,
+        ))
+
+    async def receive(self):
+        return await self.connection.recv()
+
+    async def close(self):
+        await self.connection.close()
+
+
+class AsgiClient:
+    """A websocket driven straight through the ASGI app, the way a server would."""
+
+    def __init__(self, application):
+        self.inbound = asyncio.Queue()
+        self.outbound = asyncio.Queue()
+        scope = {
+            "type": "websocket", "asgi": {"version": "3.0"}, "scheme": "ws", "path": PATH,
+            "raw_path": PATH.encode(), "query_string": b"",
+            "headers": [(b"host", b"localhost"), (b"origin", origin().encode())],
+            "subprotocols": [], "client": ("127.0.0.1", 0), "server": ("localhost", 80),
+        }
+        self.task = asyncio.create_task(application(scope, self.inbound.get, self.outbound.put))
+
+    @classmethod
+    async def open(cls, application):
+        client = cls(application)
+        await client.inbound.put({"type": "websocket.connect"})
+        message = await client.outbound.get()
+        if message["type"] != "websocket.accept":
+            raise CommandError(f"Socket refused: {message}")
+        return client
+
+    async def receive(self):
+        message = await self.outbound.get()
+        return message["text"]
+
+    async def close(self):
+        await self.inbound.put({"type": "websocket.disconnect", "code": 1000})
+        await asyncio.wait_for(self.task, 5)
@@ -0,0 +1,16 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('emergency', '0021_alter_emergencyreport_media_file'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='emergencyreport',
+            name='media_file_derivatives',
+            field=models.BooleanField(default=False, editable=False),
+        ),
+    ]
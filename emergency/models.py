@@ -34,6 +34,8 @@ class EmergencyReport(models.Model):
         null=True,
         blank=True
     )
+    # Set once media_file's thumbnails are stored (see backend.derivatives)
+    media_file_derivatives = models.BooleanField(default=False, editable=False)
 
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
 
@@ -1,14 +1,23 @@
 from rest_framework import serializers
 from .models import EmergencyAlert, EmergencyReport
+from backend.derivatives import thumbnail_url, srcset
 
 class EmergencyReportSerializer(serializers.ModelSerializer):
     media_file = serializers.FileField(required=False, allow_null=True)
     latitude = serializers.FloatField()
     longitude = serializers.FloatField()
+    media_thumb = serializers.SerializerMethodField()
+    media_srcset = serializers.SerializerMethodField()
 
     class Meta:
         model = EmergencyReport
-        fields = '__all__'
+        exclude = ['media_file_derivatives']
+
+    def get_media_thumb(self, obj):
+        return thumbnail_url(obj.media_file)
+
+    def get_media_srcset(self, obj):
+        return srcset(obj.media_file)
 
     def create(self, validated_data):
         # If location_text is not a model field, pop it
@@ -32,6 +41,7 @@ class EmergencyReportSerializer(serializers.ModelSerializer):
 class EmergencyReportPublicSerializer(serializers.ModelSerializer):
     alert_message = serializers.SerializerMethodField()
     media_url = serializers.SerializerMethodField()
+    media_thumb = serializers.SerializerMethodField()
 
     INCIDENT_ALERTS = {
         "medical": "Medical emergency reported. Seek help immediately.",
@@ -54,6 +64,7 @@ class EmergencyReportPublicSerializer(serializers.ModelSerializer):
             'alert_message',
             'media_file',
             'media_url',
+            'media_thumb',
         ]
 
     def get_alert_message(self, obj):
@@ -63,4 +74,7 @@ class EmergencyReportPublicSerializer(serializers.ModelSerializer):
         request = self.context.get('request')
         if obj.media_file:
             return request.build_absolute_uri(obj.media_file.url) if request else obj.media_file.url
-        return None
\ No newline at end of file
+        return None
+
+    def get_media_thumb(self, obj):
+        return thumbnail_url(obj.media_file)
@@ -0,0 +1,12 @@
+from django.db import transaction
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from .models import EmergencyReport
+from .utils import notify_emergency_update
+
+
+@receiver(post_save, sender=EmergencyReport)
+def broadcast_report_change(sender, instance, **kwargs):
+    # After commit: subscribers must never see a report that was rolled back
+    transaction.on_commit(lambda: notify_emergency_update(instance))
@@ -53,21 +53,38 @@ class SupabaseStorage(Storage):
         if not mime_type:
             mime_type = "application/octet-stream"
 
+        self._upload(final_name, data, mime_type)
+
+        # Return stored path that Django will save on the model
+        return final_name
+
+    def save_derivative(self, name, data, content_type):
+        """
+        Upload ``data`` under exactly ``name`` (no uuid renaming), replacing
+        any previous file. Used for thumbnails stored next to an original.
+        """
+        self._upload(name, data, content_type, upsert=True)
+        return name
+
+    def _upload(self, final_name, data, mime_type, upsert=False):
         # Upload to Supabase; pass content_type so Supabase stores correct MIME
+        bucket = supabase.storage.from_(self.bucket_name)
         try:
-            # Many supabase-python wrappers accept content_type kwarg.
-            # If yours uses a different signature, adapt this call accordingly.
-            supabase.storage.from_(self.bucket_name).upload(final_name, data, content_type=mime_type)
-        except TypeError:
-            # fallback if the client expects a dict of options or a different kwarg name
-            supabase.storage.from_(self.bucket_name).upload(final_name, data, {"content-type": mime_type})
+            if upsert:
+                # Overwriting is only expressible through the options dict
+                bucket.upload(final_name, data, {"content-type": mime_type, "upsert": "true"})
+            else:
+                try:
+                    # Many supabase-python wrappers accept content_type kwarg.
+                    # If yours uses a different signature, adapt this call accordingly.
+                    bucket.upload(final_name, data, content_type=mime_type)
+                except TypeError:
+                    # fallback if the client expects a dict of options or a different kwarg name
+                    bucket.upload(final_name, data, {"content-type": mime_type})
         except Exception as e:
             # bubble up a helpful error for debugging
             raise RuntimeError(f"Supabase upload failed for {final_name}: {e}") from e
 
-        # Return stored path that Django will save on the model
-        return final_name
-
     def exists(self, name):
         try:
             files = supabase.storage.from_(self.bucket_name).list()
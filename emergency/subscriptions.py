@@ -0,0 +1,117 @@
+"""
+What a ``ws/emergencies/`` socket wants to hear about, and the channel groups
+that deliver it.
+
+Sockets belong to an audience: ``staff`` (admin/staff tokens, full reports)
+or ``public`` (everyone else, the public report shape). For each audience a
+report event is sent to four groups: all reports, its incident type, its
+cell, and its type within its cell (see ``emergency.geo``). A socket joins
+only its audience's groups matching its own subscription, so an event
+reaches each interested socket once and costs nothing for the others.
+"""
+from dataclasses import dataclass
+
+from . import geo
+from .models import EmergencyReport
+
+STAFF = "staff"
+PUBLIC = "public"
+AUDIENCES = (STAFF, PUBLIC)
+INCIDENT_TYPES = [value for value, _ in EmergencyReport.INCIDENT_TYPES]
+MAX_GROUPS = 64  # per socket; bounds group_add/discard work per (re)subscribe
+
+
+def all_group(audience):
+    return f"emergencies.{audience}"
+
+
+def type_group(audience, incident_type):
+    return f"emergencies.{audience}.{incident_type}"
+
+
+def cell_group(audience, cell):
+    return f"emergencies.{audience}.cell.{cell}"
+
+
+def type_cell_group(audience, incident_type, cell):
+    return f"emergencies.{audience}.{incident_type}.{cell}"
+
+
+def audience_of(group):
+    return group.split(".")[1]
+
+
+def report_groups(incident_type, cell):
+    """Groups, of every audience, an event for a report of ``incident_type`` in ``cell`` (or None) goes to."""
+    groups = []
+    for audience in AUDIENCES:
+        groups += [all_group(audience), type_group(audience, incident_type)]
+        if cell:
+            groups += [cell_group(audience, cell), type_cell_group(audience, incident_type, cell)]
+    return groups
+
+
+def as_list(value):
+    # Query strings give "a,b", JSON messages give ["a", "b"]
+    if value is None or value == "":
+        return []
+    if isinstance(value, str):
+        return [part.strip() for part in value.split(",") if part.strip()]
+    if isinstance(value, (list, tuple)):
+        return list(value)
+    raise ValueError("Expected a list or a comma-separated string.")
+
+
+def as_point(value):
+    if isinstance(value, dict):
+        value = [value.get("latitude"), value.get("longitude")]
+    try:
+        latitude, longitude = (float(part) for part in as_list(value))
+    except (TypeError, ValueError):
+        raise ValueError("near must be latitude,longitude.")
+    if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+        raise ValueError("near is outside valid coordinates.")
+    return latitude, longitude
+
+
+@dataclass(frozen=True)
+class Subscription:
+    types: tuple = ()  # empty: every incident type
+    cells: tuple = ()  # empty: every area
+
+    @classmethod
+    def parse(cls, types=None, cells=None, near=None):
+        """Build from client input (query string values or a JSON message); ValueError if invalid."""
+        types = as_list(types)
+        unknown = [value for value in types if value not in INCIDENT_TYPES]
+        if unknown:
+            raise ValueError(f"Unknown incident type(s): {', '.join(map(str, unknown))}.")
+
+        found = []
+        for prefix in as_list(cells):
+            if not geo.is_geohash(prefix):
+                raise ValueError(f"Invalid geohash {prefix!r}.")
+            found += geo.expand(prefix, MAX_GROUPS)
+        if near:
+            found += geo.around(*as_point(near))
+
+        subscription = cls(tuple(dict.fromkeys(types)), tuple(dict.fromkeys(found)))
+        if len(subscription.groups(PUBLIC)) > MAX_GROUPS:
+            raise ValueError("Subscription is too broad; pick fewer types or a smaller area.")
+        return subscription
+
+    def groups(self, audience):
+        if not self.cells:
+            return [type_group(audience, value) for value in self.types] or [all_group(audience)]
+        if not self.types:
+            return [cell_group(audience, cell) for cell in self.cells]
+        return [type_cell_group(audience, value, cell) for value in self.types for cell in self.cells]
+
+    def matches(self, incident_type, cell):
+        return (
+            (not self.types or incident_type in self.types)
+            and (not self.cells or cell in self.cells)
+        )
+
+    def as_dict(self):
+        return {"types": list(self.types), "cells": list(self.cells)}
@@ -1,3 +1,376 @@
-from django.test import TestCase
+import asyncio
+import json
+from datetime import timedelta
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from asgiref.testing import ApplicationCommunicator
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from accounts.authentication import principal_from_access_token
+from accounts.middleware import CookieJWTAuthMiddleware
+from accounts.tokens import RefreshToken
+from backend.asgi import application
+from backend.testing import make_report, make_user
+from . import backpressure, geo
+from .backpressure import OutboundQueue
+from .broadcast import BroadcastCoalescer, get_broadcaster
+from .consumers import EmergencyConsumer
+from .subscriptions import Subscription
+
+IN_MEMORY_LAYER = {"default": {"BACKEND": "channels.layers.InMemoryChannelLayer"}}
+
+
+class BroadcastCoalescerTests(SimpleTestCase):
+    def test_saves_within_window_go_out_as_one_batch(self):
+        batches = []
+        coalescer = BroadcastCoalescer(window=60, send=batches.append)
+
+        coalescer.publish(1, {"status": "pending"}, ["emergencies", "emergencies.fire"])
+        coalescer.publish(2, {"status": "pending"}, ["emergencies", "emergencies.flood"])
+        coalescer.publish(1, {"status": "resolved"}, ["emergencies", "emergencies.medical"])
+        self.assertEqual(batches, [])  # waiting for the window to close
+
+        self.assertEqual(coalescer.flush(), 2)
+        self.assertEqual(batches, [[
+            # its old watchers see the change too
+            (1, ["emergencies", "emergencies.fire", "emergencies.medical"], {"status": "resolved"}),
+            (2, ["emergencies", "emergencies.flood"], {"status": "pending"}),
+        ]])
+        self.assertEqual((coalescer.published, coalescer.coalesced, coalescer.batches), (3, 1, 1))
+        self.assertEqual(coalescer.flush(), 0)
+
+    def test_window_closes_on_its_own(self):
+        sent = []
+        coalescer = BroadcastCoalescer(window=0.01, send=sent.append)
+
+        coalescer.publish(1, "a", ["emergencies"])
+        coalescer._timer.join(1)
+
+        self.assertEqual(sent, [[(1, ["emergencies"], "a")]])
+
+    def test_zero_window_sends_inline(self):
+        batches = []
+        coalescer = BroadcastCoalescer(window=0, send=batches.append)
+
+        coalescer.publish(1, "a", ["emergencies"])
+        coalescer.publish(1, "b", ["emergencies"])
+
+        self.assertEqual(batches, [[(1, ["emergencies"], "a")], [(1, ["emergencies"], "b")]])
+
+
+@override_settings(CHANNEL_LAYERS=IN_MEMORY_LAYER, EMERGENCY_BROADCAST_WINDOW=0)
+class EmergencyBroadcastTests(TestCase):
+    def setUp(self):
+        get_broadcaster.cache_clear()
+        cache.clear()
+        self.sockets = []
+
+    def save_and_commit(self, **kwargs):
+        with self.captureOnCommitCallbacks(execute=True):
+            return make_report(**kwargs)
+
+    async def connect(self, query="", token=None):
+        headers = [(b"cookie", f"theme=dark; access_token={token}".encode())] if token else []
+        socket = ApplicationCommunicator(CookieJWTAuthMiddleware(EmergencyConsumer.as_asgi()), {
+            "type": "websocket", "path": "/ws/emergencies/", "query_string": query.encode(),
+            "headers": headers, "subprotocols": [],
+        })
+        await socket.send_input({"type": "websocket.connect"})
+        self.assertEqual((await socket.receive_output(1))["type"], "websocket.accept")
+        self.sockets.append(socket)
+        return socket
+
+    async def disconnect_all(self):
+        for socket in self.sockets:
+            await socket.send_input({"type": "websocket.disconnect", "code": 1000})
+            await socket.wait(1)
+
+    async def received(self, socket):
+        return [json.loads((await socket.receive_output(1))["text"]) for _ in range(await self.pending(socket))]
+
+    async def pending(self, socket):
+        await asyncio.sleep(0.05)
+        return socket.output_queue.qsize()
+
+    async def test_committed_save_reaches_subscribers(self):
+        socket = await self.connect()
+
+        report = await sync_to_async(self.save_and_commit)(latitude="14.900000", contact_number="09170000000")
+        frame = json.loads((await socket.receive_output(1))["text"])
+
+        # Anonymous sockets get the public report shape: no contact details or coordinates
+        self.assertEqual(set(frame), {
+            "seq", "id", "incident_type", "location_text", "name", "status", "submitted_at",
+            "alert_message", "media_file", "media_url", "media_thumb",
+        })
+        self.assertEqual((frame["seq"], frame["id"], frame["status"]), (1, report.id, "pending"))
+        await self.disconnect_all()
+
+    def tokens(self):
+        staff = make_user("staff", role="staff")
+        expired = RefreshToken.for_user(staff).access_token
+        expired.set_exp(lifetime=timedelta(seconds=-1))
+        resident = make_user("resident")
+        return RefreshToken.for_user(staff).access_token, RefreshToken.for_user(resident).access_token, expired
+
+    def test_socket_authentication_needs_no_queries(self):
+        staff_token, _, expired_token = self.tokens()
+
+        with self.assertNumQueries(0):
+            principal = principal_from_access_token(str(staff_token))
+            self.assertIsNone(principal_from_access_token(str(expired_token)))
+            self.assertIsNone(principal_from_access_token("not-a-token"))
+
+        self.assertEqual(principal.role, "staff")
+
+    async def test_ws_stats_are_staff_only(self):
+        staff_token, resident_token, _ = await sync_to_async(self.tokens)()
+        staff_socket = await self.connect(token=staff_token)
+        resident_socket = await self.connect(token=resident_token)
+        await sync_to_async(self.save_and_commit)()
+        for socket in (staff_socket, resident_socket):
+            await self.received(socket)
+
+        for socket in (staff_socket, resident_socket):
+            await socket.send_input({"type": "websocket.receive", "text": json.dumps({"action": "ws-stats"})})
+        [stats] = await self.received(staff_socket)
+        [refused] = await self.received(resident_socket)
+
+        self.assertEqual(stats["type"], "ws-stats")
+        self.assertGreaterEqual(stats["connections"], 2)
+        self.assertEqual(stats["broadcast"]["published"], 1)
+        self.assertEqual(refused["type"], "error")
+        await self.disconnect_all()
+
+    async def test_staff_sockets_get_full_reports(self):
+        staff_token, resident_token, expired_token = await sync_to_async(self.tokens)()
+        staff_socket = await self.connect(token=staff_token)
+        resident_socket = await self.connect(token=resident_token)
+        expired_socket = await self.connect(token=expired_token)
+
+        await sync_to_async(self.save_and_commit)(contact_number="09170000000", latitude=14.9)
+        [full] = await self.received(staff_socket)
+        [public] = await self.received(resident_socket)
+        [also_public] = await self.received(expired_socket)
+
+        self.assertEqual((full["contact_number"], full["latitude"], full["seq"]), ("09170000000", 14.9, 1))
+        self.assertNotIn("contact_number", public)
+        self.assertEqual(public, also_public)
+        await self.disconnect_all()
+
+    def staff_token(self, lifetime=None):
+        token = RefreshToken.for_user(make_user("watched", role="staff")).access_token
+        if lifetime is not None:
+            token.set_exp(lifetime=lifetime)
+        return token
+
+    async def test_staff_socket_closes_when_its_token_expires(self):
+        socket = await self.connect(token=await sync_to_async(self.staff_token)(timedelta(seconds=1)))
+
+        self.assertEqual((await socket.receive_output(3))["code"], 4401)
+        await sync_to_async(self.save_and_commit)()
+        self.assertEqual(await self.pending(socket), 0)  # nothing more after the close
+        await self.disconnect_all()
+
+    @override_settings(EMERGENCY_SOCKET_AUTH_RECHECK=0.05)
+    async def test_staff_socket_closes_when_its_token_is_revoked(self):
+        token = await sync_to_async(self.staff_token)()
+        socket = await self.connect(token=token)
+        await self.connect()  # anonymous sockets have no token to watch
+        self.assertEqual(await self.pending(socket), 0)
+
+        await sync_to_async(token.blacklist)()
+
+        self.assertEqual((await socket.receive_output(1))["code"], 4401)
+        await self.disconnect_all()
+
+    async def test_sockets_from_other_origins_are_refused(self):
+        for origin, expected in [
+            (b"http://localhost:5173", "websocket.accept"),
+            (b"https://attacker.example", "websocket.close"),
+            (None, "websocket.close"),
+        ]:
+            headers = [(b"origin", origin)] if origin else []
+            socket = ApplicationCommunicator(application, {
+                "type": "websocket", "path": "/ws/emergencies/", "query_string": b"",
+                "headers": headers, "subprotocols": [],
+            })
+            await socket.send_input({"type": "websocket.connect"})
+            self.assertEqual((await socket.receive_output(1))["type"], expected, origin)
+            await socket.send_input({"type": "websocket.disconnect", "code": 1000})
+            await socket.wait(1)
+
+    async def test_sockets_only_get_their_types_and_areas(self):
+        sindalan = geo.encode(15.0, 120.65)
+        fire_here = await self.connect(f"types=fire&cells={sindalan}")
+        floods = await self.connect("types=flood")
+        nearby = await self.connect("near=15.0,120.65")
+        everything = await self.connect()
+
+        for incident_type, place, latitude, longitude in [
+            ("fire", "here", 15.0, 120.65), ("fire", "away", 14.5, 121.0), ("flood", "here", 15.0, 120.65),
+        ]:
+            await sync_to_async(self.save_and_commit)(
+                incident_type=incident_type, location_text=place, latitude=latitude, longitude=longitude,
+            )
+
+        def seen(events):
+            return [(event["incident_type"], event["location_text"]) for event in events]
+
+        self.assertEqual(seen(await self.received(fire_here)), [("fire", "here")])
+        self.assertEqual(seen(await self.received(floods)), [("flood", "here")])
+        self.assertEqual(seen(await self.received(nearby)), [("fire", "here"), ("flood", "here")])
+        self.assertEqual(len(await self.received(everything)), 3)
+        await self.disconnect_all()
+
+    async def test_resubscribe_by_message(self):
+        socket = await self.connect("types=flood")
+
+        await socket.send_input({"type": "websocket.receive", "text": json.dumps(
+            {"action": "subscribe", "types": ["fire"]}
+        )})
+        reply = json.loads((await socket.receive_output(1))["text"])
+        await sync_to_async(self.save_and_commit)(incident_type="fire")
+
+        self.assertEqual(reply, {"type": "subscribed", "types": ["fire"], "cells": []})
+        self.assertEqual([event["incident_type"] for event in await self.received(socket)], ["fire"])
+        await self.disconnect_all()
+
+    async def test_resume_replays_missed_events(self):
+        await sync_to_async(self.save_and_commit)(incident_type="fire")
+        await sync_to_async(self.save_and_commit)(incident_type="flood")
+        third = await sync_to_async(self.save_and_commit)(incident_type="fire")
+
+        socket = await self.connect("types=fire&last_seq=1")
+        frames = await self.received(socket)
+
+        self.assertEqual(len(frames), 2)  # the flood event is not for this socket
+        self.assertEqual((frames[0]["seq"], frames[0]["id"]), (3, third.id))
+        self.assertEqual(frames[1], {"type": "resumed", "seq": 3})
+
+        await socket.send_input({"type": "websocket.receive", "text": json.dumps({"action": "resume", "last_seq": 3})})
+        self.assertEqual(await self.received(socket), [{"type": "resumed", "seq": 3}])
+        await self.disconnect_all()
+
+    @override_settings(EMERGENCY_HISTORY_SIZE=2)
+    async def test_gap_too_old_gets_snapshot(self):
+        for incident_type in ("fire", "flood", "fire"):
+            await sync_to_async(self.save_and_commit)(incident_type=incident_type)
+        resolved = await sync_to_async(self.save_and_commit)(incident_type="fire", status="resolved")
+
+        socket = await self.connect("types=fire&last_seq=1")
+        [snapshot] = await self.received(socket)
+
+        self.assertEqual(snapshot["type"], "snapshot")
+        self.assertEqual(snapshot["seq"], 4)
+        self.assertEqual([report["incident_type"] for report in snapshot["reports"]], ["fire", "fire"])
+        self.assertNotIn(resolved.id, [report["id"] for report in snapshot["reports"]])
+
+        # Live events after the snapshot still arrive, once
+        await sync_to_async(self.save_and_commit)(incident_type="fire")
+        self.assertEqual([frame["seq"] for frame in await self.received(socket)], [5])
+        await self.disconnect_all()
+
+    async def test_invalid_subscription_is_rejected(self):
+        socket = ApplicationCommunicator(EmergencyConsumer.as_asgi(), {
+            "type": "websocket", "path": "/ws/emergencies/", "query_string": b"types=tsunami",
+            "headers": [], "subprotocols": [],
+        })
+        await socket.send_input({"type": "websocket.connect"})
+
+        self.assertEqual((await socket.receive_output(1))["type"], "websocket.accept")
+        self.assertIn("tsunami", json.loads((await socket.receive_output(1))["text"])["error"])
+        self.assertEqual((await socket.receive_output(1))["code"], 4400)
+
+    def test_rolled_back_save_is_not_broadcast(self):
+        with self.captureOnCommitCallbacks(execute=False) as callbacks:
+            make_report()
+
+        self.assertEqual(len(callbacks), 1)  # queued for commit, never sent in the save itself
+        self.assertEqual(get_broadcaster().published, 0)
+
+
+class SubscriptionTests(SimpleTestCase):
+    def test_geohash(self):
+        self.assertEqual(geo.encode(57.64911, 10.40744, precision=11), "u4pruydqqvj")
+        lat_min, lat_max, lon_min, lon_max = geo.bounds("u4pru")
+        self.assertTrue(lat_min <= 57.64911 <= lat_max and lon_min <= 10.40744 <= lon_max)
+
+    def test_near_covers_the_cell_and_its_neighbours(self):
+        cells = geo.around(15.0, 120.65)
+
+        self.assertEqual(len(cells), 9)
+        self.assertEqual(cells[0], geo.encode(15.0, 120.65))
+        # A point just past the cell's edge is still covered
+        lat_min, lat_max, lon_min, lon_max = geo.bounds(cells[0])
+        self.assertIn(geo.encode(lat_max + 0.001, lon_max + 0.001), cells)
+
+    def test_groups(self):
+        self.assertEqual(Subscription.parse().groups("public"), ["emergencies.public"])
+        self.assertEqual(
+            Subscription.parse("fire,flood").groups("staff"), ["emergencies.staff.fire", "emergencies.staff.flood"]
+        )
+        self.assertEqual(Subscription.parse(cells=["wdtuf"]).groups("public"), ["emergencies.public.cell.wdtuf"])
+        self.assertEqual(Subscription.parse(["fire"], "wdtufxyz").groups("public"), ["emergencies.public.fire.wdtuf"])
+        self.assertEqual(len(Subscription.parse(cells="wdtu").groups("public")), 32)
+
+    def test_invalid(self):
+        for kwargs in ({"types": "tsunami"}, {"cells": "wdt"}, {"cells": "ai"}, {"near": "north"},
+                       {"types": "fire,flood,medical", "cells": "wdtu"}):
+            with self.subTest(kwargs), self.assertRaises(ValueError):
+                Subscription.parse(**kwargs)
+
+
+class OutboundQueueTests(SimpleTestCase):
+    async def slow_socket(self, max_pending=3, grace=60):
+        self.sent, self.closed, self.unblock = [], [], asyncio.Event()
+
+        async def send(text):
+            await self.unblock.wait()  # a client that is not reading
+            self.sent.append(text)
+
+        async def close():
+            self.closed.append(True)
+
+        queue = OutboundQueue(send, close, max_pending=max_pending, grace=grace)
+        self.addCleanup(queue.close)
+        return queue
+
+    async def test_lagging_socket_gets_newest_event_per_report(self):
+        queue = await self.slow_socket()
+        coalesced = backpressure.stats.coalesced
+
+        await queue.put(1, "report 1 v1")
+        await asyncio.sleep(0)  # the writer takes it and blocks on the socket
+        for text in ("report 2 v1", "report 1 v2", "report 2 v2", "report 1 v3"):
+            await queue.put(int(text[7]), text)
+        self.unblock.set()
+        await asyncio.sleep(0.01)
+
+        self.assertEqual(self.sent, ["report 1 v1", "report 2 v2", "report 1 v3"])
+        self.assertEqual(backpressure.stats.coalesced - coalesced, 2)
+        self.assertEqual(self.closed, [])
+
+    async def test_socket_far_behind_is_disconnected(self):
+        queue = await self.slow_socket(max_pending=2)
+        dropped = backpressure.stats.dropped
+
+        for report_id in range(6):
+            await queue.put(report_id, "event")
+            await asyncio.sleep(0)
+
+        self.assertEqual(self.closed, [True])
+        self.assertEqual(len(queue), 0)
+        self.assertEqual(backpressure.stats.dropped - dropped, 4)
+        await queue.put(99, "event")  # ignored once closed
+        self.assertEqual(len(queue), 0)
+
+    async def test_socket_over_threshold_past_grace_is_disconnected(self):
+        queue = await self.slow_socket(max_pending=2, grace=0)
+
+        for report_id in range(4):
+            await queue.put(report_id, "event")
+            await asyncio.sleep(0)
+
+        self.assertEqual(self.closed, [True])
@@ -1,11 +1,18 @@
 from rest_framework import viewsets, permissions
 from rest_framework.parsers import MultiPartParser, FormParser, JSONParser
+from backend.throttling import TokenBucketThrottle
 from .models import EmergencyReport
 from .serializers import EmergencyReportSerializer, EmergencyReportPublicSerializer
 
 class EmergencyReportViewSet(viewsets.ModelViewSet):
     queryset = EmergencyReport.objects.all().order_by('-submitted_at')
     parser_classes = [MultiPartParser, FormParser, JSONParser]  # ✅ Use list instead of tuple
+    throttle_scope = 'emergency'  # own bucket: other endpoints' traffic never starves reports
+
+    def get_throttles(self):
+        if self.action == 'create':
+            return [TokenBucketThrottle()]
+        return []
 
     def get_permissions(self):
         if self.action in ['create', 'list']:
@@ -0,0 +1,57 @@
+import hashlib
+import json
+import uuid
+
+from django.contrib.auth.models import User
+from django.db import models
+from django.db.models import Q
+from emergency.storages import SupabaseStorage
+
+
+class ExportJob(models.Model):
+    STATUS_PENDING = 'pending'
+    STATUS_RUNNING = 'running'
+    STATUS_COMPLETED = 'completed'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_PENDING, 'Pending'),
+        (STATUS_RUNNING, 'Running'),
+        (STATUS_COMPLETED, 'Completed'),
+        (STATUS_FAILED, 'Failed'),
+    ]
+    ACTIVE_STATUSES = (STATUS_PENDING, STATUS_RUNNING)
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    requested_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='export_jobs')
+    sheets = models.JSONField(default=list)
+    date_from = models.DateField(null=True, blank=True)
+    date_to = models.DateField(null=True, blank=True)
+    # Hash of (sheets, date range); identical active requests share one job
+    fingerprint = models.CharField(max_length=64, db_index=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=STATUS_PENDING)
+    file = models.FileField(storage=SupabaseStorage, upload_to='exports/', null=True, blank=True)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['fingerprint'],
+                condition=Q(status__in=['pending', 'running']),
+                name='unique_active_export_job',
+            ),
+        ]
+
+    def __str__(self):
+        return f"Export {self.id} ({self.status})"
+
+    @staticmethod
+    def make_fingerprint(sheets, date_from, date_to):
+        params = {
+            'sheets': sorted(sheets),
+            'date_from': date_from.isoformat() if date_from else None,
+            'date_to': date_to.isoformat() if date_to else None,
+        }
+        return hashlib.sha256(json.dumps(params, sort_keys=True).encode()).hexdigest()
@@ -0,0 +1,77 @@
+"""
+Local runner for export jobs: a small thread pool inside the web process, so
+exports work without a broker. Jobs are claimed with a conditional UPDATE,
+so a job is never generated twice.
+"""
+import logging
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files import File
+from django.db import connection, transaction
+from django.utils import timezone
+
+from backend.exports import SHEETS_BY_KEY, write_workbook, export_filename
+from .models import ExportJob
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=settings.EXPORT_JOB_WORKERS, thread_name_prefix='export-job'
+        )
+    return _executor
+
+
+def enqueue(job_id):
+    """Start the job once the transaction that created it commits."""
+    if settings.EXPORT_JOB_WORKERS <= 0:
+        transaction.on_commit(lambda: run_job(job_id))
+    else:
+        transaction.on_commit(lambda: get_executor().submit(_run_in_worker, job_id))
+
+
+def _run_in_worker(job_id):
+    try:
+        run_job(job_id)
+    finally:
+        # Worker threads own their connection; don't leak it between jobs
+        connection.close()
+
+
+def run_job(job_id):
+    claimed = ExportJob.objects.filter(pk=job_id, status=ExportJob.STATUS_PENDING).update(
+        status=ExportJob.STATUS_RUNNING, started_at=timezone.now()
+    )
+    if not claimed:
+        return
+
+    job = ExportJob.objects.get(pk=job_id)
+    try:
+        sheets = [SHEETS_BY_KEY[key] for key in job.sheets]
+        with tempfile.TemporaryFile(suffix='.xlsx') as tmp:
+            write_workbook(tmp, sheets, job.date_from, job.date_to)
+            tmp.seek(0)
+            job.file.save(export_filename(), File(tmp), save=False)
+    except Exception as e:
+        logger.exception("Export job %s failed", job_id)
+        running(job_id).update(status=ExportJob.STATUS_FAILED, error=str(e), finished_at=timezone.now())
+        return
+
+    # Only a job still running may finish: one expired meanwhile stays failed
+    finished = running(job_id).update(
+        file=job.file.name, status=ExportJob.STATUS_COMPLETED, finished_at=timezone.now()
+    )
+    if not finished:
+        logger.warning("Export job %s expired before it finished, discarding its file", job_id)
+        job.file.delete(save=False)
+
+
+def running(job_id):
+    return ExportJob.objects.filter(pk=job_id, status=ExportJob.STATUS_RUNNING)
@@ -0,0 +1,46 @@
+from django.urls import reverse
+from rest_framework import serializers
+
+from backend.exports import SHEETS_BY_KEY
+from .models import ExportJob
+
+
+class ExportJobRequestSerializer(serializers.Serializer):
+    sheets = serializers.ListField(
+        child=serializers.ChoiceField(choices=list(SHEETS_BY_KEY)),
+        required=False,
+        allow_empty=False,
+    )
+    date_from = serializers.DateField(required=False, allow_null=True)
+    date_to = serializers.DateField(required=False, allow_null=True)
+
+    def validate(self, data):
+        # Default to every sheet, in the workbook's usual order
+        requested = set(data.get('sheets') or SHEETS_BY_KEY)
+        data['sheets'] = [key for key in SHEETS_BY_KEY if key in requested]
+
+        date_from, date_to = data.get('date_from'), data.get('date_to')
+        if date_from and date_to and date_from > date_to:
+            raise serializers.ValidationError({"date_to": "Must be on or after date_from."})
+        return data
+
+
+class ExportJobSerializer(serializers.ModelSerializer):
+    download_url = serializers.SerializerMethodField()
+
+    class Meta:
+        model = ExportJob
+        fields = [
+            'id', 'status', 'sheets', 'date_from', 'date_to', 'error',
+            'created_at', 'started_at', 'finished_at', 'download_url',
+        ]
+        read_only_fields = fields
+
+    def get_download_url(self, obj):
+        # Not the storage URL: the workbook holds residents' details, so it is
+        # only served through the staff-only download view
+        if obj.status == ExportJob.STATUS_COMPLETED and obj.file:
+            url = reverse('export-job-download', args=[obj.pk])
+            request = self.context.get('request')
+            return request.build_absolute_uri(url) if request else url
+        return None
@@ -0,0 +1,203 @@
+import tempfile
+from datetime import date, datetime, time, timedelta
+from io import BytesIO
+from unittest import mock
+
+import openpyxl
+from django.core.files.storage import FileSystemStorage
+from django.db import IntegrityError
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from backend.testing import api_client_for, make_complaint, make_user
+from complaints.models import Complaint
+from .models import ExportJob
+from .runner import run_job
+from .views import ExportJobCreateView
+
+
+class LocalStorageMixin:
+    """Keep export files in a temporary directory instead of Supabase."""
+
+    def setUp(self):
+        super().setUp()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.storage = FileSystemStorage(location=directory.name)
+        patcher = mock.patch.object(ExportJob._meta.get_field('file'), 'storage', self.storage)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+
+class ExportJobApiTests(LocalStorageMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.client = api_client_for(make_user("admin", role="admin"))
+
+    def test_identical_requests_share_one_job(self):
+        payload = {"sheets": ["complaints", "certificates"], "date_from": "2025-01-01", "date_to": "2025-01-31"}
+
+        first = self.client.post(reverse("export-job-create"), payload, format="json")
+        second = self.client.post(reverse("export-job-create"), payload, format="json")
+
+        self.assertEqual(first.status_code, 202)
+        self.assertEqual(first.data["id"], second.data["id"])
+        self.assertEqual(first.data["sheets"], ["certificates", "complaints"])
+        self.assertEqual(ExportJob.objects.count(), 1)
+
+    def test_finished_job_does_not_block_a_new_one(self):
+        first = self.client.post(reverse("export-job-create"), {}, format="json")
+        ExportJob.objects.filter(pk=first.data["id"]).update(status=ExportJob.STATUS_FAILED)
+
+        second = self.client.post(reverse("export-job-create"), {}, format="json")
+
+        self.assertNotEqual(first.data["id"], second.data["id"])
+
+    def test_poll_status(self):
+        job_id = self.client.post(reverse("export-job-create"), {}, format="json").data["id"]
+
+        response = self.client.get(reverse("export-job-detail", args=[job_id]))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["status"], "pending")
+        self.assertIsNone(response.data["download_url"])
+
+    def test_rejects_inverted_date_range(self):
+        response = self.client.post(
+            reverse("export-job-create"), {"date_from": "2025-02-01", "date_to": "2025-01-01"}, format="json"
+        )
+
+        self.assertEqual(response.status_code, 400)
+
+    def test_staff_only(self):
+        client = api_client_for(make_user("resident"))
+
+        self.assertEqual(client.post(reverse("export-job-create"), {}, format="json").status_code, 403)
+
+    def test_conflicting_job_that_finished_meanwhile_is_retried(self):
+        payload = {"sheets": ["complaints"]}
+        create = ExportJob.objects.create
+        calls = []
+
+        def lose_the_race_once(**fields):
+            calls.append(fields)
+            if len(calls) == 1:
+                # Another request's job took the fingerprint and finished before our lookup
+                create(**fields, status=ExportJob.STATUS_COMPLETED)
+                raise IntegrityError("unique_active_export_job")
+            return create(**fields)
+
+        with mock.patch.object(ExportJob.objects, 'create', side_effect=lose_the_race_once):
+            response = self.client.post(reverse("export-job-create"), payload, format="json")
+
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.data["status"], "pending")
+        self.assertEqual(len(calls), 2)
+
+    def test_falls_back_to_latest_job_while_racing(self):
+        done = ExportJob.objects.create(sheets=["complaints"], fingerprint="f", status=ExportJob.STATUS_COMPLETED)
+
+        with mock.patch.object(ExportJob.objects, 'create', side_effect=IntegrityError):
+            job = ExportJobCreateView.create_or_join(None, {"sheets": ["complaints"]}, "f")
+
+        self.assertEqual(job, done)
+
+
+@override_settings(EXPORT_JOB_WORKERS=0)
+class ExportJobRunTests(LocalStorageMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.client = api_client_for(make_user("admin", role="admin"))
+        self.owner = make_user("resident")
+
+    def complaint_filed_on(self, day, subject):
+        complaint = make_complaint(self.owner)
+        filed = timezone.make_aware(datetime.combine(day, time(12)))
+        Complaint.objects.filter(pk=complaint.pk).update(date_filed=filed, subject=subject)
+
+    def request_export(self, payload):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse("export-job-create"), payload, format="json")
+        self.assertEqual(response.status_code, 202)
+        return ExportJob.objects.get(pk=response.data["id"])
+
+    def test_job_runs_to_completion_within_date_range(self):
+        self.complaint_filed_on(date(2024, 12, 31), "Before")
+        self.complaint_filed_on(date(2025, 1, 1), "First day")
+        self.complaint_filed_on(date(2025, 1, 31), "Last day")
+        self.complaint_filed_on(date(2025, 2, 1), "After")
+
+        job = self.request_export({"sheets": ["complaints"], "date_from": "2025-01-01", "date_to": "2025-01-31"})
+
+        self.assertEqual(job.status, ExportJob.STATUS_COMPLETED)
+        self.assertLessEqual(job.created_at, job.started_at)
+        self.assertLessEqual(job.started_at, job.finished_at)
+        self.assertEqual(job.error, "")
+        with job.file.open("rb") as f:
+            workbook = openpyxl.load_workbook(f)
+        self.assertEqual(workbook.sheetnames, ["Complaints"])
+        rows = list(workbook["Complaints"].iter_rows(values_only=True))
+        self.assertEqual(rows[0][:7], ("Reference Number", "Type", "Full Name", "Contact Number", "Address", "Email", "Subject"))
+        self.assertEqual([row[6] for row in rows[1:]], ["First day", "Last day"])
+
+    def test_download_is_staff_only_and_not_a_storage_url(self):
+        self.complaint_filed_on(date(2025, 1, 1), "Only")
+        job = self.request_export({"sheets": ["complaints"]})
+
+        detail = self.client.get(reverse("export-job-detail", args=[job.pk]))
+        url = detail.data["download_url"]
+        self.assertEqual(url, f"http://localhost/api/exports/{job.pk}/download/")
+
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Cache-Control"], "private, no-store")
+        self.assertIn("attachment", response["Content-Disposition"])
+        rows = list(openpyxl.load_workbook(BytesIO(b"".join(response.streaming_content))).active.values)
+        self.assertEqual(rows[1][6], "Only")
+
+        self.assertEqual(api_client_for(self.owner).get(url).status_code, 403)
+        self.assertEqual(self.client_class().get(url).status_code, 401)
+
+    def test_unfinished_job_has_no_download(self):
+        job = ExportJob.objects.create(sheets=["complaints"], fingerprint="f")
+
+        self.assertEqual(self.client.get(reverse("export-job-download", args=[job.pk])).status_code, 404)
+
+    def test_failed_job_records_the_error(self):
+        job = ExportJob.objects.create(sheets=["nope"], fingerprint="f")
+
+        with self.assertLogs("exports.runner", "ERROR"):
+            run_job(job.pk)
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, ExportJob.STATUS_FAILED)
+        self.assertIn("nope", job.error)
+        self.assertIsNotNone(job.finished_at)
+        self.assertFalse(job.file)
+
+    def test_job_expired_while_running_stays_failed(self):
+        job = ExportJob.objects.create(sheets=["complaints"], fingerprint="f")
+
+        def write_then_expire(fileobj, *args):
+            fileobj.write(b"xlsx")
+            ExportJobCreateView.expire_stale_jobs("f")
+
+        with override_settings(EXPORT_JOB_TIMEOUT=timedelta(0)), \
+                mock.patch("exports.runner.write_workbook", write_then_expire), \
+                self.assertLogs("exports.runner", "WARNING"):
+            run_job(job.pk)
+
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.error), (ExportJob.STATUS_FAILED, "Timed out"))
+        self.assertFalse(job.file)
+        self.assertEqual(self.storage.listdir("exports")[1], [])  # the file was written, then discarded
+
+    def test_job_is_claimed_once(self):
+        job = ExportJob.objects.create(sheets=["complaints"], fingerprint="f", status=ExportJob.STATUS_RUNNING)
+
+        run_job(job.pk)
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, ExportJob.STATUS_RUNNING)
+        self.assertFalse(job.file)
@@ -0,0 +1,8 @@
+from django.urls import path
+from .views import ExportJobCreateView, ExportJobDetailView, ExportJobDownloadView
+
+urlpatterns = [
+    path('', ExportJobCreateView.as_view(), name='export-job-create'),  # POST /api/exports/
+    path('<uuid:id>/', ExportJobDetailView.as_view(), name='export-job-detail'),  # GET /api/exports/<id>/
+    path('<uuid:id>/download/', ExportJobDownloadView.as_view(), name='export-job-download'),
+]
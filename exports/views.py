@@ -0,0 +1,90 @@
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.http import FileResponse, Http404
+from django.shortcuts import get_object_or_404
+from django.utils import timezone
+from rest_framework import generics, permissions, status
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from accounts.permissions import IsAdminOrStaff
+from backend.exports import XLSX_CONTENT_TYPE, export_filename
+from .models import ExportJob
+from .runner import enqueue
+from .serializers import ExportJobRequestSerializer, ExportJobSerializer
+
+
+class ExportJobCreateView(APIView):
+    """
+    POST /api/exports/ {sheets, date_from, date_to}
+    Returns 202 with the job; an identical job that is still pending or
+    running is returned instead of starting a new one.
+    """
+    permission_classes = [permissions.IsAuthenticated, IsAdminOrStaff]
+
+    def post(self, request):
+        serializer = ExportJobRequestSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        params = serializer.validated_data
+        fingerprint = ExportJob.make_fingerprint(params['sheets'], params.get('date_from'), params.get('date_to'))
+
+        self.expire_stale_jobs(fingerprint)
+        job = self.create_or_join(request.user, params, fingerprint)
+        return Response(ExportJobSerializer(job, context={'request': request}).data, status=status.HTTP_202_ACCEPTED)
+
+    @staticmethod
+    def create_or_join(user, params, fingerprint, attempts=3):
+        for _ in range(attempts):
+            try:
+                with transaction.atomic():
+                    job = ExportJob.objects.create(
+                        requested_by=user,
+                        sheets=params['sheets'],
+                        date_from=params.get('date_from'),
+                        date_to=params.get('date_to'),
+                        fingerprint=fingerprint,
+                    )
+                    enqueue(job.pk)
+                return job
+            except IntegrityError:
+                # unique_active_export_job: join the job already in flight...
+                job = ExportJob.objects.filter(fingerprint=fingerprint, status__in=ExportJob.ACTIVE_STATUSES).first()
+                if job is not None:
+                    return job
+                # ...unless it finished in between, then try again
+        # Still racing other requests: the newest identical job is as good an answer
+        return ExportJob.objects.filter(fingerprint=fingerprint).latest('created_at')
+
+    @staticmethod
+    def expire_stale_jobs(fingerprint):
+        # Jobs orphaned by a restarted worker would otherwise block this fingerprint forever
+        cutoff = timezone.now() - settings.EXPORT_JOB_TIMEOUT
+        ExportJob.objects.filter(
+            fingerprint=fingerprint, status__in=ExportJob.ACTIVE_STATUSES, created_at__lt=cutoff,
+        ).update(status=ExportJob.STATUS_FAILED, error="Timed out", finished_at=timezone.now())
+
+
+class ExportJobDetailView(generics.RetrieveAPIView):
+    """GET /api/exports/<id>/ to poll status; download_url is set once completed."""
+    queryset = ExportJob.objects.all()
+    serializer_class = ExportJobSerializer
+    permission_classes = [permissions.IsAuthenticated, IsAdminOrStaff]
+    lookup_field = 'id'
+
+
+class ExportJobDownloadView(APIView):
+    """GET /api/exports/<id>/download/ streams a completed job's workbook to admin/staff."""
+    permission_classes = [permissions.IsAuthenticated, IsAdminOrStaff]
+
+    def get(self, request, id):
+        job = get_object_or_404(ExportJob, id=id, status=ExportJob.STATUS_COMPLETED)
+        if not job.file:
+            raise Http404
+        response = FileResponse(
+            job.file.open('rb'),
+            as_attachment=True,
+            filename=export_filename(job.finished_at),
+            content_type=XLSX_CONTENT_TYPE,
+        )
+        response['Cache-Control'] = 'private, no-store'
+        return response